@@ -11,6 +11,8 @@ OPTIONS = ["bounce", "Red", "Blue", "Green", "Gold", "Disappear A", "Disappear B
 CANVAS_WIDTH = 800
 CANVAS_HEIGHT = 600
 STATUS_HEIGHT = 30
+MAX_TOI_EVENTS = 32  # cap on contact events resolved inside one step
+CONTINUOUS_STEP_DT = 2.0  # frames of motion per physics step when continuous (it cannot tunnel)
 
 # --- Polygon Class ---
 class Polygon:
@@ -22,30 +24,50 @@ class Polygon:
         self.color = color
         self.dx, self.dy = velocity
 
-    def draw(self, canvas, show_circle):
+    def draw(self, canvas, show_circle, ahead=0.0):
+        # ahead: frames of motion past the last physics step, drawn extrapolated
+        x = self.x + self.dx * ahead
+        y = self.y + self.dy * ahead
         coords = []
         for i in range(self.sides):
             angle = 2 * math.pi * i / self.sides
-            xi = self.x + self.radius * math.cos(angle)
-            yi = self.y + self.radius * math.sin(angle)
+            xi = x + self.radius * math.cos(angle)
+            yi = y + self.radius * math.sin(angle)
             coords.extend([xi, yi])
         canvas.create_polygon(coords, fill=self.color, outline="white", width=2, tags="shape")
         if show_circle:
             canvas.create_oval(
-                self.x - self.radius, self.y - self.radius,
-                self.x + self.radius, self.y + self.radius,
+                x - self.radius, y - self.radius,
+                x + self.radius, y + self.radius,
                 outline="gray", dash=(4,4), width=1.5, tags="circle"
             )
 
     def area(self):
         return 0.5 * self.sides * (self.radius ** 2) * math.sin(2 * math.pi / self.sides)
 
-    def collide(self, other, use_area_mass, rule_table, shapes, canvas_host=None):
+    def time_of_impact(self, other, dt):
+        # Swept-circle test: earliest t in [0, dt] where the bounding circles touch
+        px = other.x - self.x
+        py = other.y - self.y
+        vx = other.dx - self.dx
+        vy = other.dy - self.dy
+        r = self.radius + other.radius
+        b = px*vx + py*vy
+        if b >= 0: return None  # separating or relatively at rest
+        c = px*px + py*py - r*r
+        if c <= 0: return 0.0  # already overlapping and approaching
+        a = vx*vx + vy*vy
+        disc = b*b - a*c
+        if disc < 0: return None
+        t = (-b - math.sqrt(disc)) / a
+        return t if t <= dt else None
+
+    def collide(self, other, use_area_mass, rule_table, shapes, canvas_host=None, slop=0.0):
         dx = other.x - self.x
         dy = other.y - self.y
         dist = math.hypot(dx, dy)
         if dist == 0: return
-        if dist < self.radius + other.radius:
+        if dist < self.radius + other.radius + slop:
             # Apply color rule first
             outcome = rule_table.get((self.color, other.color), "bounce")
             if outcome in COLOR_NAMES:
@@ -95,9 +117,9 @@ class Polygon:
 class Triangle(Polygon):
     def __init__(self, x, y, velocity):
         super().__init__(x, y, 3, 40, "#FF6347", velocity)
-    def move(self, width, height):
-        self.x += self.dx
-        self.y += self.dy
+    def move(self, width, height, dt=1.0):
+        self.x += self.dx * dt
+        self.y += self.dy * dt
         if self.x < 0 - self.radius: self.x = width + self.radius
         elif self.x > width + self.radius: self.x = 0 - self.radius
         if self.y < STATUS_HEIGHT - self.radius: self.y = height + self.radius
@@ -106,9 +128,9 @@ class Triangle(Polygon):
 class Pentagon(Polygon):
     def __init__(self, x, y, velocity):
         super().__init__(x, y, 5, 38, "#32CD32", velocity)
-    def move(self, width, height):
-        self.x += self.dx
-        self.y += self.dy
+    def move(self, width, height, dt=1.0):
+        self.x += self.dx * dt
+        self.y += self.dy * dt
         if self.x < 0 - self.radius: self.x = width + self.radius
         elif self.x > width + self.radius: self.x = 0 - self.radius
         if self.y < STATUS_HEIGHT - self.radius: self.y = height + self.radius
@@ -117,9 +139,9 @@ class Pentagon(Polygon):
 class Square(Polygon):
     def __init__(self, x, y, velocity):
         super().__init__(x, y, 4, 35, "#1E90FF", velocity)
-    def move(self, width, height):
-        self.x += self.dx
-        self.y += self.dy
+    def move(self, width, height, dt=1.0):
+        self.x += self.dx * dt
+        self.y += self.dy * dt
         min_y = STATUS_HEIGHT + self.radius
         max_y = height - self.radius
         min_x = self.radius
@@ -132,9 +154,9 @@ class Square(Polygon):
 class Hexagon(Polygon):
     def __init__(self, x, y, velocity):
         super().__init__(x, y, 6, 45, "#FFD700", velocity)
-    def move(self, width, height):
-        self.x += self.dx
-        self.y += self.dy
+    def move(self, width, height, dt=1.0):
+        self.x += self.dx * dt
+        self.y += self.dy * dt
         min_y = STATUS_HEIGHT + self.radius
         max_y = height - self.radius
         min_x = self.radius
@@ -144,6 +166,52 @@ class Hexagon(Polygon):
         if self.y < min_y: self.y = min_y; self.dy *= -1
         elif self.y > max_y: self.y = max_y; self.dy *= -1
 
+# --- Physics Step ---
+def step_discrete(shapes, use_area_mass, rule_table, dt=1.0, canvas_host=None, width=CANVAS_WIDTH, height=CANVAS_HEIGHT):
+    # Original method: move, then check overlap at the end of the step only
+    for shape in shapes:
+        shape.move(width, height, dt)
+    shapes_copy = shapes.copy()
+    for i in range(len(shapes_copy)):
+        for j in range(i+1, len(shapes_copy)):
+            shapes_copy[i].collide(shapes_copy[j], use_area_mass, rule_table, shapes, canvas_host=canvas_host)
+
+def _pair_hits(shape, others, now, dt, hits):
+    # Record every contact of `shape` with `others` before the end of the step
+    for other in others:
+        if other is shape: continue
+        t = shape.time_of_impact(other, dt - now)
+        if t is not None: hits[(shape, other)] = now + t
+
+def step_continuous(shapes, use_area_mass, rule_table, dt=1.0, canvas_host=None, width=CANVAS_WIDTH, height=CANVAS_HEIGHT):
+    # Advance to each contact time inside the step and resolve it there, so fast shapes cannot tunnel.
+    # Contact times are found for all pairs once; after an event only the pairs of shapes whose
+    # motion changed (the colliding two, and any that hit a wall or wrapped) are recomputed.
+    hits = {}
+    for i in range(len(shapes)):
+        _pair_hits(shapes[i], shapes[i+1:], 0.0, dt, hits)
+    now = 0.0
+    for _ in range(MAX_TOI_EVENTS):
+        if not hits: break
+        (hit_a, hit_b), hit_t = min(hits.items(), key=lambda item: item[1])
+        changed = {hit_a, hit_b}
+        if hit_t > now:
+            for shape in shapes:
+                before = (shape.dx, shape.dy, shape.x + shape.dx * (hit_t - now), shape.y + shape.dy * (hit_t - now))
+                shape.move(width, height, hit_t - now)
+                if (shape.dx, shape.dy, shape.x, shape.y) != before: changed.add(shape)
+            now = hit_t
+        hit_a.collide(hit_b, use_area_mass, rule_table, shapes, canvas_host=canvas_host, slop=1e-6)
+        for pair in [pair for pair in hits if pair[0] in changed or pair[1] in changed]:
+            del hits[pair]
+        done = []
+        for shape in changed:
+            if shape in shapes: _pair_hits(shape, [o for o in shapes if o not in done], now, dt, hits)
+            done.append(shape)
+    if dt > now:
+        for shape in shapes:
+            shape.move(width, height, dt - now)
+
 # --- Simulation Host ---
 class CanvasHost:
     def __init__(self, width, height):
@@ -159,10 +227,14 @@ class CanvasHost:
 
         self.show_circles = False
         self.use_area_mass = False
+        self.continuous = True
+        self.step_dt = CONTINUOUS_STEP_DT
+        self.sim_lag = 0.0  # frames of motion not yet stepped
         self.speed_fps = 50
         self.speed_delay_ms = int(1000/self.speed_fps)
         self.canvas.bind("<Button-1>", self.toggle_circles)
         self.root.bind("m", self.toggle_mass_mode)
+        self.root.bind("c", self.toggle_collision_mode)
         self.root.bind("b", lambda e: self.spawn_polygon("blue"))
         self.root.bind("g", lambda e: self.spawn_polygon("green"))
         self.root.bind("r", lambda e: self.spawn_polygon("red"))
@@ -198,6 +270,10 @@ class CanvasHost:
     def toggle_mass_mode(self, event=None):
         self.use_area_mass = not self.use_area_mass
 
+    def toggle_collision_mode(self, event=None):
+        self.continuous = not self.continuous
+        self.step_dt = CONTINUOUS_STEP_DT if self.continuous else 1.0
+
     def quit_game(self):
         self.root.destroy()
 
@@ -282,20 +358,21 @@ class CanvasHost:
             self.canvas.create_text(x, y, text=msg, fill="white", font=("Arial",10), tags="message")
         self.messages = []
 
-        for shape in self.shapes:
-            shape.move(self.width,self.height)
-
-        shapes_copy = self.shapes.copy()
-        for i in range(len(shapes_copy)):
-            for j in range(i+1,len(shapes_copy)):
-                shapes_copy[i].collide(shapes_copy[j], self.use_area_mass, self.rule_table, self.shapes, canvas_host=self)
+        # Physics runs on its own timestep: every frame adds one frame of motion
+        # and a step of step_dt frames runs once enough has built up
+        step = step_continuous if self.continuous else step_discrete
+        self.sim_lag += 1.0
+        while self.sim_lag >= self.step_dt:
+            step(self.shapes, self.use_area_mass, self.rule_table, self.step_dt, canvas_host=self, width=self.width, height=self.height)
+            self.sim_lag -= self.step_dt
 
         for shape in self.shapes:
-            shape.draw(self.canvas, self.show_circles)
+            shape.draw(self.canvas, self.show_circles, self.sim_lag)
 
         mode = "Area Mass" if self.use_area_mass else "Equal Mass"
+        collision = "Continuous" if self.continuous else "Discrete"
         self.canvas.delete("status")
-        self.canvas.create_text(10,10, anchor="nw", text=f"Mass Mode: {mode}", fill="white", font=("Arial",12,"bold"), tags="status")
+        self.canvas.create_text(10,10, anchor="nw", text=f"Mass Mode: {mode} | Collision: {collision} (dt {self.step_dt:g})", fill="white", font=("Arial",12,"bold"), tags="status")
         self.root.after(self.speed_delay_ms, self.update)
 
     def run(self):
@@ -0,0 +1,76 @@
+#ME461 Assignment 2 - headless collision benchmark
+# Compares the discrete overlap test against swept-circle time of impact.
+# Run: python poly2_benchmark.py
+import random
+import math
+import time
+
+from poly2 import Square, Hexagon, step_discrete, step_continuous, CANVAS_WIDTH, CANVAS_HEIGHT, STATUS_HEIGHT, CONTINUOUS_STEP_DT
+
+TRIALS = 500
+SPEEDS = [15, 30, 60, 90, 120, 180]
+COST_SHAPES = 20
+COST_FRAMES = 300  # frames of simulated motion per cost measurement
+RULES = {}  # empty table -> every pair bounces
+
+def head_on_pair(speed, rng):
+    # Two shapes on a collision course across the middle of the canvas
+    cy = (STATUS_HEIGHT + CANVAS_HEIGHT) / 2
+    offset = rng.uniform(-30, 30)
+    gap = rng.uniform(150, 250)
+    a = Square(CANVAS_WIDTH/2 - gap, cy, (speed, 0))
+    b = Hexagon(CANVAS_WIDTH/2 + gap, cy + offset, (-speed, 0))
+    return a, b
+
+def count_misses(step, speed, dt, substeps=1):
+    rng = random.Random(461)
+    misses = 0
+    for _ in range(TRIALS):
+        a, b = head_on_pair(speed, rng)
+        shapes = [a, b]
+        # Walls are out of reach until the shapes have passed each other
+        while a.x < b.x and a.dx == speed:
+            for _ in range(substeps):
+                step(shapes, False, RULES, dt / substeps)
+        if a.dx == speed: misses += 1
+    return misses
+
+def random_shapes(rng, n, speed):
+    shapes = []
+    for _ in range(n):
+        angle = rng.uniform(0, 2*math.pi)
+        cls = rng.choice([Square, Hexagon])
+        x = rng.uniform(60, CANVAS_WIDTH-60)
+        y = rng.uniform(STATUS_HEIGHT+60, CANVAS_HEIGHT-60)
+        shapes.append(cls(x, y, (math.cos(angle)*speed, math.sin(angle)*speed)))
+    return shapes
+
+def step_cost_us(step, speed, dt, substeps=1):
+    # Every method simulates the same COST_FRAMES frames of motion, in steps of dt
+    shapes = random_shapes(random.Random(7), COST_SHAPES, speed)
+    steps = round(COST_FRAMES / dt)
+    start = time.perf_counter()
+    for _ in range(steps):
+        for _ in range(substeps):
+            step(shapes, False, RULES, dt / substeps)
+    return (time.perf_counter() - start) / COST_FRAMES * 1e6
+
+def main():
+    big = CONTINUOUS_STEP_DT
+    print(f"Missed head-on collisions out of {TRIALS} (dt = 1 frame unless shown)")
+    print(f"{'speed':>6} {'discrete':>9} {'continuous':>11} {f'cont. dt={big:g}':>13}")
+    for speed in SPEEDS:
+        print(f"{speed:>6} {count_misses(step_discrete, speed, 1.0):>9} {count_misses(step_continuous, speed, 1.0):>11}"
+              f" {count_misses(step_continuous, speed, big):>13}")
+
+    # Discrete needs roughly one substep per shape radius travelled to stop tunnelling
+    print(f"\nPhysics cost with {COST_SHAPES} shapes over {COST_FRAMES} frames of motion (us per frame)")
+    print(f"{'speed':>6} {'discrete':>9} {'substeps':>9} {'discrete+sub':>13} {'continuous':>11} {f'cont. dt={big:g}':>13}")
+    for speed in SPEEDS:
+        substeps = max(1, math.ceil(2*speed / 35))
+        print(f"{speed:>6} {step_cost_us(step_discrete, speed, 1.0):>9.0f} {substeps:>9}"
+              f" {step_cost_us(step_discrete, speed, 1.0, substeps):>13.0f} {step_cost_us(step_continuous, speed, 1.0):>11.0f}"
+              f" {step_cost_us(step_continuous, speed, big):>13.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Host-side (CPython) timing measurement for GameSystem.run
+# Compares the old ticks_ms polling loop with sleep(0.01) against the
+# deadline-based FrameScheduler. Both loops run on the host emulator's
+# virtual clock (pico/host_emu): the FrameScheduler is the class from
+# pico_game_with_brightness_adjusted.py, arming the emulated one-shot
+# machine.Timer and sleeping in machine.idle(), next to a 10 ms periodic
+# timer like the game's PotFilter. A last run changes the frame delay the
+# way GunGame's slowdown does (set_frame_delay() between frames) and checks
+# each frame lands on the period asked for.
+# Run: python frame_timing_sim.py
+import ast
+import os
+import random
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "..", "pico"))
+import host_emu
+host_emu.install(seed=1)
+from host_emu import board
+import machine
+import utime
+
+GAME = os.path.join(HERE, "pico_game_with_brightness_adjusted.py")
+FRAME_DELAY_MS = 40
+FRAMES = 5000
+WORK_US = (4000, 12000)     # GunGame.update() cost range on the Pico
+POT_PERIOD_MS = 10          # PotFilter's sampling timer also wakes idle()
+SLOWDOWN = (1.0, 2.0, 3.0, 1.5, 1.0)  # slowdown_factor per stretch of FRAMES // 5 frames
+
+def load_scheduler():
+    # The game runs at import, so only its imports and FrameScheduler are executed
+    tree = ast.parse(open(GAME).read())
+    body = [node for node in tree.body
+            if isinstance(node, (ast.Import, ast.ImportFrom)) and "max7219" not in ast.dump(node)
+            or isinstance(node, ast.ClassDef) and node.name == "FrameScheduler"]
+    namespace = {}
+    exec(compile(ast.Module(body, []), GAME, "exec"), namespace)
+    return namespace
+
+def work(rng):
+    board.clock.advance(rng.randint(*WORK_US))
+
+def simulate_polling(rng):
+    # while running: if ticks_diff(now, last) >= delay: update(); sleep(0.01)
+    last_update = utime.ticks_ms()
+    starts = []
+    wakeups = 0
+    while len(starts) < FRAMES:
+        wakeups += 1
+        now = utime.ticks_ms()
+        if utime.ticks_diff(now, last_update) >= FRAME_DELAY_MS:
+            last_update = now
+            starts.append(utime.ticks_us())
+            work(rng)
+        utime.sleep(0.01)
+    return starts, wakeups
+
+def make_scheduler():
+    namespace = load_scheduler()
+    wakeups = [0]
+    def idle():
+        wakeups[0] += 1
+        machine.idle()
+    namespace["idle"] = idle
+    return namespace["FrameScheduler"](FRAME_DELAY_MS), wakeups
+
+def simulate_deadline(rng):
+    pots = machine.Timer(period=POT_PERIOD_MS, mode=machine.Timer.PERIODIC, callback=lambda t: None)
+    scheduler, wakeups = make_scheduler()
+    starts = []
+    while len(starts) < FRAMES:
+        scheduler.wait()
+        starts.append(utime.ticks_us())
+        work(rng)
+    pots.deinit()
+    scheduler.report()
+    return starts, wakeups[0]
+
+def simulate_slowdown(rng):
+    # GunGame.update_game: frame delay = base * slowdown_factor, set between frames
+    scheduler, _ = make_scheduler()
+    stretch = FRAMES // len(SLOWDOWN)
+    print(f"{'slowdown':<10} {'delay':>6} {'fps':>6} {'off period avg':>15} {'max':>6}")
+    for factor in SLOWDOWN:
+        delay = int(FRAME_DELAY_MS * factor)
+        scheduler.set_frame_delay(delay)
+        starts = []
+        for _ in range(stretch):
+            scheduler.wait()
+            starts.append(utime.ticks_us())
+            work(rng)
+        errors = [abs(utime.ticks_diff(b, a) - delay * 1000) for a, b in zip(starts, starts[1:])]
+        fps = (len(starts) - 1) / (utime.ticks_diff(starts[-1], starts[0]) / 1e6)
+        print(f"{factor:<10} {delay:>4}ms {fps:>6.2f} {sum(errors) / len(errors):>13.0f}us {max(errors):>4}us")
+    print(f"overruns={scheduler.overruns}")
+
+def report(name, starts, wakeups):
+    period = FRAME_DELAY_MS * 1000
+    errors = [abs(utime.ticks_diff(b, a) - period) for a, b in zip(starts, starts[1:])]
+    fps = (len(starts) - 1) / (utime.ticks_diff(starts[-1], starts[0]) / 1e6)
+    print(f"{name:<10} fps={fps:6.2f}  jitter avg={sum(errors) / len(errors):7.0f}us"
+          f"  max={max(errors):6d}us  wakeups/frame={wakeups / len(starts):.2f}")
+
+def main():
+    print(f"Target: {1000 / FRAME_DELAY_MS:.2f} fps ({FRAME_DELAY_MS} ms), {FRAMES} frames")
+    print(f"Virtual clock: every ticks_*() read costs {board.tick_cost_us} us; timer IRQ latency is not modelled")
+    report("polling", *simulate_polling(random.Random(1)))
+    report("deadline", *simulate_deadline(random.Random(1)))
+    print()
+    simulate_slowdown(random.Random(1))
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,319 @@
 #***WOKWI PROJECT LINK***
 #https://wokwi.com/projects/446337631218931713
   
-from machine import Pin, ADC, SPI
-from utime import sleep, ticks_ms, ticks_diff
+from machine import Pin, ADC, SPI, Timer, idle
+from utime import ticks_ms, ticks_us, ticks_add, ticks_diff
 from max7219 import Matrix8x8
+from collections import OrderedDict
+from array import array
+import framebuf
 import urandom
+import micropython
+import gc
+
+# Set bits in a byte, used to count hits in a target's hit mask
+POPCOUNT = bytes(bin(i).count('1') for i in range(256))
+
+class EntityPool:
+    # Fixed-capacity struct-of-arrays storage. Live entities stay packed in
+    # slots [0, count) and the tail [count, capacity) is the free list, so
+    # spawning, killing and compacting never touch the heap.
+    def __init__(self, capacity, fields):
+        self.capacity = capacity
+        self.count = 0
+        self.dead = bytearray(capacity)
+        arrays = []
+        for name, typecode in fields:
+            arr = array(typecode, [0] * capacity)
+            setattr(self, name, arr)
+            arrays.append(arr)
+        self._arrays = tuple(arrays)
+
+    def clear(self):
+        self.count = 0
+
+    def alloc(self):
+        # Returns the new slot index, or -1 when the pool is full
+        if self.count >= self.capacity:
+            return -1
+        i = self.count
+        self.dead[i] = 0
+        self.count = i + 1
+        return i
+
+    def kill(self, i):
+        self.dead[i] = 1
+
+    def compact(self):
+        # Slide live entities down over killed ones, keeping their order
+        dead = self.dead
+        w = 0
+        for r in range(self.count):
+            if dead[r]:
+                dead[r] = 0
+                continue
+            if w != r:
+                for arr in self._arrays:
+                    arr[w] = arr[r]
+            w += 1
+        self.count = w
+
+# Button and pot ids used by the input subsystem
+BTN_LEFT = 0
+BTN_DOWN = 1
+BTN_RIGHT = 2
+BTN_UP = 3
+POT_LEFT = 0
+POT_RIGHT = 1
+
+class InputQueue:
+    # Buttons raise pin IRQs on both edges. The handler debounces, keeps a
+    # held bit mask and pushes timestamped edge events into a preallocated
+    # ring buffer, so presses shorter than a frame are never lost.
+    # Event code: (button << 1) | pressed
+    def __init__(self, pins, size=32, debounce_ms=20):
+        self.pins = pins # Active-low (pull-up) buttons, index = button id
+        self.size = size # Power of two
+        self.codes = bytearray(size)
+        self.times = array('l', [0] * size)
+        self.head = 0 # Next slot to write (IRQ side)
+        self.tail = 0 # Next slot to read (game side)
+        self.dropped = 0
+        self.held = 0
+        self.debounce_ms = debounce_ms
+        self.last_edge = array('l', [ticks_ms()] * len(pins))
+        self.bounced = 0 # Buttons with an edge ignored as bounce since their last event
+        self.bounced_at = array('l', [0] * len(pins))
+        self.last_time = 0 # Timestamp of the event returned by the last pop()
+        for button, pin in enumerate(pins):
+            pin.irq(lambda p, b=button: self._on_edge(b, p), Pin.IRQ_FALLING | Pin.IRQ_RISING)
+
+    def _on_edge(self, button, pin):
+        now = ticks_ms()
+        if ticks_diff(now, self.last_edge[button]) < self.debounce_ms:
+            # Contact bounce, or a quick tap right after the last edge: sync() re-samples
+            self.bounced |= 1 << button
+            self.bounced_at[button] = now
+            return
+        bit = 1 << button
+        pressed = not pin.value()
+        if self.bounced & bit and pressed == bool(self.held & bit):
+            # Only the opposite edge can have come in between: queue the tap it hid
+            self._edge(button, not pressed, self.bounced_at[button])
+        self._edge(button, pressed, now)
+
+    def _edge(self, button, pressed, now):
+        bit = 1 << button
+        self.bounced &= ~bit
+        if pressed == bool(self.held & bit):
+            return # Level did not change
+        self.last_edge[button] = now
+        if pressed:
+            self.held |= bit
+        else:
+            self.held &= ~bit
+        head = self.head
+        nxt = (head + 1) & (self.size - 1)
+        if nxt == self.tail:
+            self.dropped += 1 # Queue full, game is not draining
+            return
+        self.codes[head] = (button << 1) | pressed
+        self.times[head] = now
+        self.head = nxt
+
+    def sync(self):
+        # A bounce can hide the final edge, and a press right after a release
+        # lands inside the debounce window. Once held or bounced buttons
+        # settle, re-sample them and queue any level the queue has not seen.
+        check = self.held | self.bounced
+        if not check:
+            return
+        now = ticks_ms()
+        for button in range(len(self.pins)):
+            bit = 1 << button
+            if check & bit and ticks_diff(now, self.last_edge[button]) >= self.debounce_ms:
+                pressed = not self.pins[button].value()
+                if pressed != bool(self.held & bit):
+                    self._edge(button, pressed, self.bounced_at[button] if self.bounced & bit else now)
+                else:
+                    self.bounced &= ~bit
+
+    def pop(self):
+        # Returns the next event code, or -1 when the queue is empty
+        tail = self.tail
+        if tail == self.head:
+            return -1
+        self.last_time = self.times[tail]
+        code = self.codes[tail]
+        self.tail = (tail + 1) & (self.size - 1)
+        return code
+
+class PotFilter:
+    # Samples the ADCs from a timer and keeps an exponential running
+    # average (alpha = 1 / 2**shift), so reads cost no ADC conversion.
+    def __init__(self, adcs, period_ms=10, shift=2):
+        self.adcs = adcs
+        self.shift = shift
+        self.values = array('l', [adc.read_u16() for adc in adcs])
+        self.timer = Timer(period=period_ms, mode=Timer.PERIODIC, callback=self._sample)
+
+    def _sample(self, timer):
+        values = self.values
+        for i in range(len(self.adcs)):
+            v = values[i]
+            values[i] = v + ((self.adcs[i].read_u16() - v) >> self.shift)
+
+class FrameScheduler:
+    # Wakes the main loop at exact frame deadlines from a one-shot
+    # machine.Timer; the CPU idles between frames instead of polling.
+    # Deadlines advance by a fixed period so timing does not drift.
+    def __init__(self, frame_delay_ms):
+        self.period_us = frame_delay_ms * 1000
+        self.timer = Timer()
+        self._due = False
+        self._fire_cb = self._fire # Bound once, re-arming must not allocate
+        self.deadline = ticks_us()
+        self.frame_start = self.deadline
+        self.reset_stats()
+
+    def reset_stats(self):
+        # All times in microseconds
+        self.frames = 0
+        self.overruns = 0
+        self.late_total = 0
+        self.late_max = 0
+        self.work_total = 0
+        self.work_max = 0
+
+    def set_frame_delay(self, frame_delay_ms):
+        # Takes effect from the next deadline, no restart needed
+        self.period_us = int(frame_delay_ms * 1000)
+
+    def _fire(self, timer):
+        self._due = True
+
+    def wait(self):
+        # Sleep until the next deadline, then record how late we woke up
+        now = ticks_us()
+        work = ticks_diff(now, self.frame_start)
+        self.deadline = ticks_add(self.deadline, self.period_us)
+        remaining = ticks_diff(self.deadline, now)
+        if remaining <= 0:
+            # Frame overran its slot: start the next one now instead of bursting to catch up
+            self.overruns += 1
+            self.deadline = now
+        else:
+            self._due = False
+            self.timer.init(mode=Timer.ONE_SHOT, period=remaining, tick_hz=1_000_000, callback=self._fire_cb)
+            while not self._due:
+                idle()
+        self.frame_start = ticks_us()
+        late = ticks_diff(self.frame_start, self.deadline)
+        self.frames += 1
+        self.late_total += late
+        self.work_total += work
+        if late > self.late_max:
+            self.late_max = late
+        if work > self.work_max:
+            self.work_max = work
+
+    def report(self):
+        n = max(1, self.frames)
+        print(f"frames={self.frames} overruns={self.overruns} "
+              f"jitter avg={self.late_total // n}us max={self.late_max}us "
+              f"work avg={self.work_total // n}us max={self.work_max}us")
+
+class GrayscaleDisplay:
+    # Grayscale on on/off LEDs by binary-code modulation. Every pixel has a
+    # level 0..2**bits-1 and bit k of the levels forms bit-plane k. A
+    # one-shot timer keeps plane k on the matrix for 2**k slots, so a pixel
+    # of level L is lit for L of the 2**bits-1 slots in each cycle, no
+    # matter how often the game draws.
+    def __init__(self, display, width, lut, bits=2, slot_us=1000):
+        self.display = display
+        self.lut = lut # Logical column -> display.buffer index, see GameSystem
+        self.bits = bits
+        self.max_level = (1 << bits) - 1
+        self.slot_us = slot_us
+        # Draw side: logical MONO_VLSB planes, one per level bit
+        self.planes = [bytearray(width) for _ in range(bits)]
+        self.plane_fbs = [framebuf.FrameBuffer(plane, width, 8, framebuf.MONO_VLSB) for plane in self.planes]
+        # Refresh side: composed planes in display.buffer layout. publish()
+        # fills `back` and swaps, the timer only ever reads `front`.
+        size = len(display.buffer)
+        self.front = [bytearray(size) for _ in range(bits)]
+        self.back = [bytearray(size) for _ in range(bits)]
+        self.plane = 0
+        self.timer = Timer()
+        self._refresh_cb = self._refresh # Bound once, re-arming must not allocate
+        self._show_cb = self._show
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.refreshes = 0
+        self.skipped = 0
+        self.busy_us = 0
+        self.busy_max = 0
+        self.stats_start = ticks_us()
+
+    def start(self):
+        self.plane = 0
+        self.timer.init(mode=Timer.ONE_SHOT, period=self.slot_us, tick_hz=1_000_000, callback=self._refresh_cb)
+
+    def stop(self):
+        self.timer.deinit()
+
+    def pixel(self, x, y, level):
+        for k in range(self.bits):
+            self.plane_fbs[k].pixel(x, y, (level >> k) & 1)
+
+    def clear(self):
+        for fb in self.plane_fbs:
+            fb.fill(0)
+
+    def publish(self, mono):
+        # Lit pixels of the mono frame are full brightness, i.e. on in every
+        # plane. Rotation into the display layout happens here, once per frame.
+        lut = self.lut
+        back = self.back
+        for k in range(self.bits):
+            dst = back[k]
+            src = self.planes[k]
+            for i in range(len(lut)):
+                j = lut[i]
+                dst[i] = mono[j] | src[j]
+        self.front, self.back = back, self.front
+
+    def _refresh(self, timer):
+        # Timer callback, possibly in IRQ context: only re-arm for the next
+        # plane and hand the SPI work to the scheduler.
+        k = self.plane
+        self.timer.init(mode=Timer.ONE_SHOT, period=self.slot_us << k, tick_hz=1_000_000, callback=self._refresh_cb)
+        self.plane = k + 1 if k + 1 < self.bits else 0
+        try:
+            micropython.schedule(self._show_cb, k)
+        except RuntimeError:
+            self.skipped += 1 # Schedule queue full: this plane is not shown
+
+    def _show(self, k):
+        # Scheduled: put plane k on the matrix. Only rows that differ from
+        # the previous plane go out over SPI.
+        start = ticks_us()
+        self.display.buffer[:] = self.front[k]
+        self.display.show()
+        cost = ticks_diff(ticks_us(), start)
+        self.refreshes += 1
+        self.busy_us += cost
+        if cost > self.busy_max:
+            self.busy_max = cost
+
+    def report(self):
+        elapsed = max(1, ticks_diff(ticks_us(), self.stats_start))
+        print(f"gray refreshes={self.refreshes} skipped={self.skipped} cpu={self.busy_us * 100 // elapsed}% "
+              f"avg={self.busy_us // max(1, self.refreshes)}us max={self.busy_max}us")
 
 class GameSystem:
-    # (Hardware Abstraction - This class is unchanged)
+    # Hardware layer: logical framebuf, IRQ input queue, pot filter, frame scheduler and grayscale display
     def __init__(self,
                  num_displays=4,
                  button_pin_left=13,
@@ -16,7 +322,8 @@ class GameSystem:
                  button_pin_up=10,
                  pot_pin_left=26,
                  pot_pin_right=27,
-                 cs_pin=5, clk_pin=2, din_pin=3):
+                 cs_pin=5, clk_pin=2, din_pin=3,
+                 gray_bits=2):
         self.cs = Pin(cs_pin, Pin.OUT)
         self.spi = SPI(0, baudrate=10_000_000, sck=Pin(clk_pin), mosi=Pin(din_pin))
         self.display = Matrix8x8(self.spi, self.cs, num_displays, orientation=1)
@@ -29,63 +336,75 @@ class GameSystem:
         self.button_up = Pin(button_pin_up, Pin.IN, Pin.PULL_UP)
         self.pot_left = ADC(Pin(pot_pin_left))
         self.pot_right = ADC(Pin(pot_pin_right))
-        self.last_update = ticks_ms()
-        self.frame_delay = 40 #80
+        # Ids follow BTN_* / POT_*
+        self.input = InputQueue((self.button_left, self.button_down, self.button_right, self.button_up))
+        self.pots = PotFilter((self.pot_left, self.pot_right))
+        self.base_frame_delay = 40 #80
+        self.frame_delay = self.base_frame_delay # Current tick, slowdown stretches it
+        self.scheduler = FrameScheduler(self.frame_delay)
+        self.stats_every = 0 # Frames between timing reports, 0 = off
         self.running = True
 
-    def clear(self):
-        self.display.fill(0)
-
-    def draw_pixel(self, x, y, val=1):
-        # Check if the game's coordinates are valid
-        if not (0 <= x < self.display_width and 0 <= y < self.display_height):
-            return
-
-        # --- Coordinate Translation for 90-degree Rotated Modules ---
-        # This translates the game's (x, y) to the library's (x_new, y_new)
-        # to account for the physical ^ ^ ^ ^ layout.
-
-        module_index = x // 8      # Which module (0, 1, 2, or 3)
-        x_on_module = x % 8        # The "column" on that module (0-7)
+        # --- Logical framebuffer in natural game orientation ---
+        # MONO_VLSB: byte x holds column x, bit y is row y. Each game column
+        # is exactly one row byte of the 90-degree rotated module, so the
+        # rotation is a byte permutation precomputed once here.
+        self.frame = bytearray(self.display_width)
+        self.fb = framebuf.FrameBuffer(self.frame, self.display_width, self.display_height, framebuf.MONO_VLSB)
+        self.draw_pixel = self.fb.pixel  # (x, y[, c]) - framebuf clips off-screen pixels
+        self.fill_rect = self.fb.fill_rect  # (x, y, w, h, col)
+        self.blit = self.fb.blit  # (fbuf, x, y[, key])
+        # display.buffer[row * num + module] <- frame[module * 8 + row]
+        self.rotate_lut = bytes((i % num_displays) * 8 + i // num_displays for i in range(self.display_width))
+
+        # Grayscale overlay refreshed from a timer; it owns the SPI bus from
+        # run() on, frames are only handed over in show()
+        self.gray = GrayscaleDisplay(self.display, self.display_width, self.rotate_lut, bits=gray_bits)
+        self.draw_gray = self.gray.pixel  # (x, y, level) - level 0..gray.max_level
 
-        # Apply 90-degree CW rotation: (x, y) -> (7 - y, x)
-        x_new_on_module = 7 - y
-        y_new_on_module = x_on_module
-
-        # Re-calculate the final (x, y) for the library
-        x_new = (module_index * 8) + x_new_on_module
-        y_new = y_new_on_module
-        # --- End of Translation ---
-
-        self.display.pixel(x_new, y_new, val)
+    def clear(self):
+        self.fb.fill(0)
+        self.gray.clear()
 
     def show(self):
-        self.display.show()
+        # Rotate mono frame and gray planes into the display layout for the refresh timer
+        self.gray.publish(self.frame)
 
     def read_buttons(self):
-        return {
-            "left":  not self.button_left.value(),
-            "down":  not self.button_down.value(),
-            "right": not self.button_right.value(),
-            "up":    not self.button_up.value()
-        }
+        # Drain queued edge events; returns a bit mask of buttons pressed since last frame
+        inp = self.input
+        inp.sync()
+        pressed = 0
+        code = inp.pop()
+        while code >= 0:
+            if code & 1:
+                pressed |= 1 << (code >> 1)
+            code = inp.pop()
+        return pressed
 
     def read_pots(self):
-        return {
-            "left": self.pot_left.read_u16(),
-            "right": self.pot_right.read_u16()
-        }
+        # Filtered values indexed by POT_*
+        return self.pots.values
 
     def update(self):
         pass # This will be overridden by GunGame
 
+    def set_frame_delay(self, frame_delay_ms):
+        self.frame_delay = frame_delay_ms
+        self.scheduler.set_frame_delay(frame_delay_ms)
+
     def run(self):
+        scheduler = self.scheduler
+        self.gray.start()
         while self.running:
-            now = ticks_ms()
-            if ticks_diff(now, self.last_update) >= self.frame_delay:
-                self.last_update = now
-                self.update()
-            sleep(0.01)
+            scheduler.wait()
+            self.update()
+            if self.stats_every and scheduler.frames % self.stats_every == 0:
+                scheduler.report()
+                scheduler.reset_stats()
+                self.gray.report()
+                self.gray.reset_stats()
+        self.gray.stop()
 
 
 class GunGame(GameSystem):
@@ -133,23 +452,22 @@ class GunGame(GameSystem):
         }
         
         # Button debouncing
-        self.button_last_time = {"left":0,"right":0,"up":0,"down":0}
+        self.button_last_time = array('l', [0] * 4) # Indexed by BTN_*
         self.button_debounce = 200 # Longer debounce for menu
         
         # End screen timer
         self.end_screen_start = 0
         self.end_screen_delay = 3000 # 3 seconds
         
-        # --- NEW ---
-        self.frame_counter = 0 # Global counter for animation
-        
         # Placeholder for game vars
         self.player_x = 0
         self.player_y = 0
         self.bullets_in_mag = 0
         self.magazines_left = 0
-        self.bullets = []
-        self.targets = []
+        # Entity pools (allocated once; sized for the busiest difficulty)
+        self.bullets = EntityPool(16, (("x", "b"), ("y", "b")))
+        self.targets = EntityPool(10, (("x", "b"), ("top", "b"), ("dir", "b"), ("hits", "B"),
+                                       ("last_move_h", "l"), ("last_move_v", "l")))
         self.targets_spawned_count = 0
         self.targets_destroyed_count = 0
         self._last_target_spawn = 0
@@ -164,6 +482,14 @@ class GunGame(GameSystem):
         self.win = False 
         self.lose_message = ""
         self.target_hits_to_kill = 1 # Placeholder
+        self.entity_allocs = 0 # Heap bytes allocated by entity updates last frame
+        self.debug_allocs = False
+
+        # Pre-rendered fonts and a small LRU of rendered strings
+        self.glyphs = self._compile_font(self.FONT)
+        self.big_glyphs = self._compile_font(self.BIG_FONT)
+        self.text_cache = OrderedDict()
+        self.text_cache_size = 16
         
     def _start_new_game(self, difficulty_choice_str):
         print(f"Starting game with difficulty: {difficulty_choice_str}")
@@ -189,15 +515,14 @@ class GunGame(GameSystem):
         # Calculate how many hits kill a target. (e.g., height 5 needs 3 hits)
         # (height + 1) // 2 is a way to do ceiling division for integers
         self.target_hits_to_kill = (self.target_height + 1) // 2
-        self.frame_counter = 0 # Reset animation counter
         
         # === Initialize game state ===
         self.player_x = 8 
         self.player_y = self.display_height // 2
         self.bullets_in_mag = self.mag_capacity
         self.magazines_left = self.magazines_total - 1
-        self.bullets = []
-        self.targets = []
+        self.bullets.clear()
+        self.targets.clear()
         self.targets_spawned_count = 0
         self.targets_destroyed_count = 0
         self._last_target_spawn = ticks_ms()
@@ -215,9 +540,8 @@ class GunGame(GameSystem):
         self.game_state = "GAME"
         self.button_debounce = 150 # Faster debounce for gameplay
 
-    # === Drawing Helpers ===
     def get_char_width(self, font=None):
-        return 5 if font == self.BIG_FONT else 3
+        return 5 if font is self.BIG_FONT else 3
 
     def get_text_width(self, text, font=None):
         if not text:
@@ -226,41 +550,76 @@ class GunGame(GameSystem):
         spacing = 1
         return (len(text) * char_width) + (len(text) - 1) * spacing
 
-    def draw_char(self, char, x_offset, y_offset, font=None):
+    # === Glyph Cache ===
+    def _compile_font(self, font):
+        # Turn every bitmap into a framebuf glyph once, at startup
+        char_width = self.get_char_width(font)
+        glyphs = {}
+        for char, bitmap in font.items():
+            buf = bytearray(char_width)  # MONO_VLSB: one byte per column (height <= 8)
+            glyph = framebuf.FrameBuffer(buf, char_width, len(bitmap), framebuf.MONO_VLSB)
+            for y, row in enumerate(bitmap):
+                for x in range(char_width):
+                    if (row >> (char_width - 1 - x)) & 1:
+                        glyph.pixel(x, y, 1)
+            glyphs[char] = glyph
+        return glyphs
+
+    def _glyph(self, char, font):
+        glyphs = self.big_glyphs if font is self.BIG_FONT else self.glyphs
+        glyph = glyphs.get(char.upper())
+        if glyph is None:
+            glyph = glyphs.get('?')
+        return glyph
+
+    def render_text(self, text, font=None):
+        # Returns (framebuf, width) for text, reusing recently rendered strings
         if font is None:
             font = self.FONT
-        bitmap = font.get(char.upper(), font.get('?', [7, 5, 7, 5, 7]))
-        
-        char_width = self.get_char_width(font)
+        key = (text, font is self.BIG_FONT)
+        cached = self.text_cache.pop(key, None)
+        if cached is None:
+            width = self.get_text_width(text, font)
+            height = 8 if font is self.BIG_FONT else 5
+            buf = bytearray(max(width, 1))
+            fb = framebuf.FrameBuffer(buf, max(width, 1), height, framebuf.MONO_VLSB)
+            x = 0
+            step = self.get_char_width(font) + 1
+            for char in text:
+                fb.blit(self._glyph(char, font), x, 0)
+                x += step
+            cached = (fb, width)
+            if len(self.text_cache) >= self.text_cache_size:
+                del self.text_cache[next(iter(self.text_cache))]  # drop least recently used
+        self.text_cache[key] = cached  # (re)insert as most recently used
+        return cached
 
-        for y, row in enumerate(bitmap):
-            for x in range(char_width):
-                if (row >> (char_width - 1 - x)) & 1:
-                    self.draw_pixel(x_offset + x, y_offset + y, 1)
-        return char_width
+    # === Drawing Helpers ===
+    def draw_char(self, char, x_offset, y_offset, font=None):
+        if font is None:
+            font = self.FONT
+        self.blit(self._glyph(char, font), x_offset, y_offset, 0)
+        return self.get_char_width(font)
 
     def draw_text(self, text, x_offset, y_offset, font=None):
-        x = x_offset
-        char_width = self.get_char_width(font)
-        spacing = 1
-        for char in text:
-            self.draw_char(char, x, y_offset, font)
-            x += char_width + spacing
-            
+        fb, width = self.render_text(text, font)
+        if width:
+            self.blit(fb, x_offset, y_offset, 0)  # key 0: unlit glyph pixels stay transparent
+
     def draw_centered_text(self, text, y_offset, font=None):
-        width = self.get_text_width(text, font)
-        x_start = (self.display_width - width) // 2
-        self.draw_text(text, x_start, y_offset, font)
+        fb, width = self.render_text(text, font)
+        if width:
+            self.blit(fb, (self.display_width - width) // 2, y_offset, 0)
 
     # === State: MENU ===
     def update_menu(self, buttons):
-        if self.button_pressed("up", buttons['up']):
+        if self.button_pressed(BTN_UP, buttons):
             self.menu_selection = (self.menu_selection - 1) % len(self.difficulty_levels)
         
-        if self.button_pressed("down", buttons['down']):
+        if self.button_pressed(BTN_DOWN, buttons):
             self.menu_selection = (self.menu_selection + 1) % len(self.difficulty_levels)
             
-        if self.button_pressed("right", buttons['right']):
+        if self.button_pressed(BTN_RIGHT, buttons):
             selected_diff_key = self.difficulty_levels[self.menu_selection]
             self._start_new_game(self.difficulty_map[selected_diff_key])
             
@@ -280,7 +639,7 @@ class GunGame(GameSystem):
         # --- Check Lose Condition (Out of Ammo) ---
         no_bullets = self.bullets_in_mag == 0
         no_mags = self.magazines_left == 0
-        targets_remain = len(self.targets) > 0
+        targets_remain = self.targets.count > 0
         # if no_bullets and no_mags and targets_remain and not self.is_reloading:
         #     self.game_state = "GAME_OVER"
         #     self.lose_message = "NO AMMO"
@@ -289,16 +648,16 @@ class GunGame(GameSystem):
         
         # --- Handle Spawning ---
         time_to_spawn = ticks_diff(now, self._last_target_spawn) >= self.target_spawn_delay
-        screen_is_clear = len(self.targets) == 0
+        screen_is_clear = self.targets.count == 0
         more_targets_to_spawn = self.targets_spawned_count < self.total_targets_to_spawn
         if more_targets_to_spawn and (time_to_spawn or screen_is_clear):
             self.spawn_new_target()
 
         # --- Handle Inputs ---
-        raw_y = pots_raw['left']
+        raw_y = pots_raw[POT_LEFT]
         self.player_y = int((raw_y / 65535) * (self.display_height - 1))
 
-        pot_val = pots_raw['right']
+        pot_val = pots_raw[POT_RIGHT]
         desired_factor = 1.0 + ((pot_val) / 65535) * 2.0
         
         if self.slowdown_budget <= 0 and desired_factor > 1.0:
@@ -314,12 +673,18 @@ class GunGame(GameSystem):
             recharge = self.frame_delay * self.slowdown_recharge_rate
             self.slowdown_budget = min(self.slowdown_budget_max, self.slowdown_budget + recharge)
 
-        if self.button_pressed("left", buttons['left']):
+        # Slowdown also stretches the tick: the scheduler idles longer
+        # between frames instead of the loop spinning on the same ones
+        frame_delay = int(self.base_frame_delay * self.slowdown_factor)
+        if frame_delay != self.frame_delay:
+            self.set_frame_delay(frame_delay)
+
+        if self.button_pressed(BTN_LEFT, buttons):
             self.player_x = max(8, self.player_x - 1) 
-        elif self.button_pressed("right", buttons['right']):
+        elif self.button_pressed(BTN_RIGHT, buttons):
             self.player_x = min(15, self.player_x + 1)
 
-        if self.button_pressed("up", buttons['up']):
+        if self.button_pressed(BTN_UP, buttons):
             if not self.is_reloading and self.magazines_left > 0:
                 self.is_reloading = True
                 self.reload_start_time = ticks_ms()
@@ -331,7 +696,7 @@ class GunGame(GameSystem):
             else:
                 print("No spare magazines.")
 
-        if self.button_pressed("down", buttons['down']):
+        if self.button_pressed(BTN_DOWN, buttons):
             if self.is_reloading:
                 print("Reloading! Can't shoot.")
             elif self.bullets_in_mag > 0:
@@ -341,8 +706,14 @@ class GunGame(GameSystem):
                 print("No bullets left.")
 
         # --- Update Game State ---
-        self.update_targets(self.slowdown_factor) 
+        h_delay = int(self.target_move_delay_h * self.slowdown_factor)
+        v_delay = int(self.target_move_delay_v * self.slowdown_factor)
+        alloc_before = gc.mem_alloc()
+        self.update_targets(h_delay, v_delay)
         self.update_bullets()
+        self.entity_allocs = gc.mem_alloc() - alloc_before
+        if self.debug_allocs and self.entity_allocs:
+            print("Entity update allocated", self.entity_allocs, "bytes")
         self.update_reload_status(self.slowdown_factor)
         
     def draw_game(self, now):
@@ -360,8 +731,9 @@ class GunGame(GameSystem):
         if draw_player:
             self.draw_pixel(self.player_x, self.player_y, 1)
         
-        for b in self.bullets:
-            self.draw_pixel(b['x'], b['y'], 1) 
+        bullets = self.bullets
+        for i in range(bullets.count):
+            self.draw_pixel(bullets.x[i], bullets.y[i], 1)
             
         # --- MODIFIED ---
         self.draw_targets() # Call the new brightness-aware function
@@ -386,12 +758,14 @@ class GunGame(GameSystem):
     # === Main Game Loop (Router) ===
     def update(self):
         now = ticks_ms()
-        self.frame_counter += 1 # --- NEW --- Increment global frame counter
         
         self.clear()
         buttons = self.read_buttons()
         pots_raw = self.read_pots()
 
+        if self.game_state != "GAME" and self.frame_delay != self.base_frame_delay:
+            self.set_frame_delay(self.base_frame_delay) # No slowdown outside a game
+
         if self.game_state == "MENU":
             self.update_menu(buttons)
             self.draw_menu()
@@ -411,27 +785,26 @@ class GunGame(GameSystem):
         self.show()
         
     # === Button Debouncer ===
-    def button_pressed(self, name, state):
+    def button_pressed(self, button, pressed_mask):
+        # A fresh press always counts; holding repeats every button_debounce ms
         now = ticks_ms()
-        if not state:
-            return False
-        if ticks_diff(now, self.button_last_time[name]) > self.button_debounce:
-            self.button_last_time[name] = now
-            return True
-        return False
+        bit = 1 << button
+        if not pressed_mask & bit:
+            if not self.input.held & bit:
+                return False
+            if ticks_diff(now, self.button_last_time[button]) <= self.button_debounce:
+                return False
+        self.button_last_time[button] = now
+        return True
         
     # === Game Logic Helpers ===
     def draw_ammo_numerical(self):
-        for x in range(8):
-            for y in range(8):
-                self.draw_pixel(x, y, 0)
+        self.fill_rect(0, 0, 8, 8, 0)
         self.draw_char(str(self.magazines_left), 0, 2)
         self.draw_char(str(self.bullets_in_mag), 4, 2)
             
     def draw_reloading_numerical(self):
-        for x in range(8):
-            for y in range(8):
-                self.draw_pixel(x, y, 0)
+        self.fill_rect(0, 0, 8, 8, 0)
         now = ticks_ms()
         elapsed = ticks_diff(now, self.reload_start_time)
         if (elapsed // 100) % 2 == 0:
@@ -443,98 +816,113 @@ class GunGame(GameSystem):
         if self.target_hits_to_kill <= 0: # Prevent division by zero
             return 
 
-        for t in self.targets:
-            current_hits = sum(t['hits'])
+        targets = self.targets
+        height = self.target_height
+        max_level = self.gray.max_level
+        for i in range(targets.count):
+            hits = targets.hits[i]
+            current_hits = POPCOUNT[hits]
             # brightness_level will be (e.g.) 2, 1, 0
             brightness_level = self.target_hits_to_kill - current_hits
-            
-            # This determines if the target should be "on" or "off" this frame
-            # e.g., max_hits=2. frame_counter % 2 cycles 0, 1, 0, 1...
-            # level=2 (0 hits): (0 < 2)=T, (1 < 2)=T. -> Always ON
-            # level=1 (1 hit):  (0 < 1)=T, (1 < 1)=F. -> 50% ON (blinking)
-            should_draw_this_frame = (self.frame_counter % self.target_hits_to_kill) < brightness_level
-
-            if should_draw_this_frame:
-                for seg_index in range(t['height']):
-                    y = t['top'] + seg_index
-                    is_segment_alive = not t['hits'][seg_index]
-                    
-                    if is_segment_alive: # Only draw segments that haven't been hit
-                        self.draw_pixel(t['x'], y, 1)
-            # On frames where should_draw_this_frame is False, we just don't draw.
-            # self.clear() at the start of update() handles erasing.
+            # Scaled to a gray level: full brightness when untouched,
+            # dimmer with every hit (3 hits to kill -> levels 3, 2, 1)
+            level = brightness_level * max_level // self.target_hits_to_kill
+            x = targets.x[i]
+            top = targets.top[i]
+            for seg_index in range(height):
+                is_segment_alive = not (hits >> seg_index) & 1
+                
+                if is_segment_alive: # Only draw segments that haven't been hit
+                    self.draw_gray(x, top + seg_index, level)
 
     def spawn_new_target(self):
         if self.targets_spawned_count >= self.total_targets_to_spawn:
             return 
-        spawn_y = urandom.randint(0, self.display_height - self.target_height)
-        new_target = {
-            "x": self.display_width, "top": spawn_y, "height": self.target_height,
-            "hits": [False] * self.target_height, "dir": 1,
-            "_last_move_h": ticks_ms(), "_last_move_v": ticks_ms(), "destroyed": False
-        }
-        self.targets.append(new_target)
+        targets = self.targets
+        i = targets.alloc()
+        if i < 0:
+            return
+        now = ticks_ms()
+        targets.x[i] = self.display_width
+        targets.top[i] = urandom.randint(0, self.display_height - self.target_height)
+        targets.dir[i] = 1
+        targets.hits[i] = 0 # Bit n set = segment n has been hit
+        targets.last_move_h[i] = now
+        targets.last_move_v[i] = now
         self.targets_spawned_count += 1
-        self._last_target_spawn = ticks_ms()
+        self._last_target_spawn = now
         print(f"New target spawned! ({self.targets_spawned_count}/{self.total_targets_to_spawn})")
 
     def spawn_bullet(self, x, y):
-        self.bullets.append({"x": x, "y": y})
+        bullets = self.bullets
+        i = bullets.alloc()
+        if i >= 0:
+            bullets.x[i] = x
+            bullets.y[i] = y
 
     def update_bullets(self):
-        new_bullets = []
-        for b in self.bullets:
-            b['x'] += 1
+        bullets = self.bullets
+        targets = self.targets
+        height = self.target_height
+        for b in range(bullets.count):
+            bx = bullets.x[b] + 1
+            bullets.x[b] = bx
+            by = bullets.y[b]
             hit_a_target = False
-            for t in self.targets:
-                if b['x'] == t['x']:
-                    rel = b['y'] - t['top']
-                    if 0 <= rel < t['height'] and not t['hits'][rel]:
-                        t['hits'][rel] = True
-                        hit_a_target = True 
-                        num_hits = sum(t['hits'])
-                        # Check if target is destroyed
-                        if num_hits >= self.target_hits_to_kill:
-                            t['destroyed'] = True
-                            self.targets_destroyed_count += 1
-                            print("Target destroyed!")
-                        else:
-                            print(f"Target hit! Health: {self.target_hits_to_kill - num_hits}/{self.target_hits_to_kill}")
-                        break 
-            if hit_a_target:
-                continue 
-            if b['x'] < self.display_width:
-                new_bullets.append(b)
-        self.bullets = new_bullets
-        self.targets = [t for t in self.targets if not t['destroyed']]
-
-    def update_targets(self, current_slowdown_factor):
+            for t in range(targets.count):
+                if targets.dead[t] or bx != targets.x[t]:
+                    continue
+                rel = by - targets.top[t]
+                bit = 1 << rel if 0 <= rel < height else 0
+                if bit and not targets.hits[t] & bit:
+                    hits = targets.hits[t] | bit
+                    targets.hits[t] = hits
+                    hit_a_target = True 
+                    num_hits = POPCOUNT[hits]
+                    # Check if target is destroyed
+                    if num_hits >= self.target_hits_to_kill:
+                        targets.kill(t)
+                        self.targets_destroyed_count += 1
+                        print("Target destroyed!")
+                    else:
+                        print(f"Target hit! Health: {self.target_hits_to_kill - num_hits}/{self.target_hits_to_kill}")
+                    break 
+            if hit_a_target or bx >= self.display_width:
+                bullets.kill(b)
+        bullets.compact()
+        targets.compact()
+
+    def update_targets(self, effective_h_delay, effective_v_delay):
         now = ticks_ms()
-        effective_h_delay = self.target_move_delay_h * current_slowdown_factor
-        effective_v_delay = self.target_move_delay_v * current_slowdown_factor
-
-        for t in self.targets:
-            if ticks_diff(now, t['_last_move_h']) >= effective_h_delay:
-                t['_last_move_h'] = now
-                t['x'] -= 1
-                if t['x'] < 8:
+        targets = self.targets
+        height = self.target_height
+
+        for t in range(targets.count):
+            if ticks_diff(now, targets.last_move_h[t]) >= effective_h_delay:
+                targets.last_move_h[t] = now
+                x = targets.x[t] - 1
+                targets.x[t] = x
+                if x < 8:
                     self.game_state = "GAME_OVER"
                     self.lose_message = "BREACH"
                     self.end_screen_start = now # Start timer
                     return
-                player_collides_y = t['top'] <= self.player_y < (t['top'] + t['height'])
-                if t['x'] == self.player_x and player_collides_y:
+                top = targets.top[t]
+                player_collides_y = top <= self.player_y < (top + height)
+                if x == self.player_x and player_collides_y:
                     self.game_state = "GAME_OVER"
                     self.lose_message = "HIT"
                     self.end_screen_start = now # Start timer
                     return
-            if ticks_diff(now, t['_last_move_v']) >= effective_v_delay:
-                t['_last_move_v'] = now
-                next_top = t['top'] + t['dir']
-                if next_top < 0 or next_top + t['height'] > self.display_height:
-                    t['dir'] *= -1
-                    next_top = t['top'] + t['dir']
-                t['top'] = next_top
+            if ticks_diff(now, targets.last_move_v[t]) >= effective_v_delay:
+                targets.last_move_v[t] = now
+                direction = targets.dir[t]
+                next_top = targets.top[t] + direction
+                if next_top < 0 or next_top + height > self.display_height:
+                    direction = -direction
+                    targets.dir[t] = direction
+                    next_top = targets.top[t] + direction
+                targets.top[t] = next_top
 
     def update_reload_status(self, current_slowdown_factor):
         if not self.is_reloading:
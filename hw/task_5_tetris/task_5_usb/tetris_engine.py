@@ -0,0 +1,438 @@
+# tetris_engine.py
+# Two-player Tetris game logic on a bitboard. Shared by the Pico firmware
+# and the PC tools; runs unchanged on MicroPython and CPython.
+#
+# Board: one int per row, bit (WIDTH - 1 - x) set when cell x holds a
+# placed block. The high byte of a row is therefore the left 8 columns as a
+# MONO_HLSB display byte, the low byte the right 8.
+# Pieces: for each rotation a stack of row masks, left-aligned at column 0,
+# so a piece at column c is `mask >> c` and collision is an AND per row.
+#
+# A game is deterministic given its seed and the order of inputs and
+# gravity steps: pieces come from ShapeRng, not from `random` (which gives
+# different sequences on MicroPython and CPython). run_log() replays such
+# a log, e.g. on the PC to follow or check the Pico.
+
+import random
+from array import array
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+# ---------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------
+
+WIDTH = 16
+HEIGHT = 32
+FULL_ROW = (1 << WIDTH) - 1
+
+PLAYER_1_COLOR = 1  # 1 represents Player 1's piece
+PLAYER_2_COLOR = 2  # 2 represents Player 2's piece
+STATIC_COLOR = 3  # Represents a placed piece
+
+# Tetromino shapes (O, I, S, Z, L, J, T) as spawned, inside their SRS
+# bounding box (2x2 for O, 4x4 for I, 3x3 for the rest)
+TETROMINOES = {
+    'O': [(0, 0), (1, 0), (0, 1), (1, 1)],
+    'I': [(0, 1), (1, 1), (2, 1), (3, 1)],
+    'S': [(1, 0), (2, 0), (0, 1), (1, 1)],
+    'Z': [(0, 0), (1, 0), (1, 1), (2, 1)],
+    'L': [(0, 1), (1, 1), (2, 1), (2, 0)],
+    'J': [(0, 1), (1, 1), (2, 1), (0, 0)],
+    'T': [(1, 1), (0, 1), (2, 1), (1, 0)]
+}
+TETROMINO_KEYS = list(TETROMINOES.keys())
+BOX_SIZE = {'O': 2, 'I': 4, 'S': 3, 'Z': 3, 'L': 3, 'J': 3, 'T': 3}
+
+# SRS wall kicks for a clockwise turn out of rotation 0, 1 (R), 2, 3 (L):
+# five (dx, dy) probes each, tried in order. Screen coordinates, so +dy is
+# down (the SRS tables are written with +y up).
+_KICKS_JLSTZ = (
+    ((0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)),    # 0 -> R
+    ((0, 0), (1, 0), (1, 1), (0, -2), (1, -2)),      # R -> 2
+    ((0, 0), (1, 0), (1, -1), (0, 2), (1, 2)),       # 2 -> L
+    ((0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)),   # L -> 0
+)
+_KICKS_I = (
+    ((0, 0), (-2, 0), (1, 0), (-2, 1), (1, -2)),     # 0 -> R
+    ((0, 0), (-1, 0), (2, 0), (-1, -2), (2, 1)),     # R -> 2
+    ((0, 0), (2, 0), (-1, 0), (2, -1), (-1, 2)),     # 2 -> L
+    ((0, 0), (1, 0), (-2, 0), (1, 2), (-2, -1)),     # L -> 0
+)
+KICK_PROBES = 5
+
+# ---------------------------------------------------------------
+# Piece Tables (built once at import)
+# ---------------------------------------------------------------
+
+def _rotate_cells(cells, size):
+    # Quarter turn clockwise inside the size x size bounding box
+    return [(size - 1 - py, px) for (px, py) in cells]
+
+def _piece_state(cells):
+    # (left, top, width, height, row masks, cells) relative to the piece origin
+    left = min(px for px, _ in cells)
+    top = min(py for _, py in cells)
+    width = max(px for px, _ in cells) - left + 1
+    height = max(py for _, py in cells) - top + 1
+    masks = [0] * height
+    for (px, py) in cells:
+        masks[py - top] |= 1 << (WIDTH - 1 - (px - left))
+    return (left, top, width, height, tuple(masks), tuple(cells))
+
+def _build_pieces():
+    pieces = {}
+    for key in TETROMINO_KEYS:
+        cells = TETROMINOES[key]
+        states = []
+        for _ in range(4):
+            states.append(_piece_state(cells))
+            cells = _rotate_cells(cells, BOX_SIZE[key])
+        pieces[key] = tuple(states)
+    return pieces
+
+def _build_kicks():
+    # Flat (dx, dy, dx, dy, ...) per piece: offset (rotation * 5 + probe) * 2
+    kicks = {}
+    for key in TETROMINO_KEYS:
+        if key == 'O':
+            table = (((0, 0),) * KICK_PROBES,) * 4 # The O never moves when turning
+        else:
+            table = _KICKS_I if key == 'I' else _KICKS_JLSTZ
+        kicks[key] = tuple(v for probes in table for probe in probes for v in probe)
+    return kicks
+
+PIECES = _build_pieces()  # key -> 4 rotation states
+KICKS = _build_kicks()  # key -> flat kick offsets for clockwise turns
+
+# ---------------------------------------------------------------
+# Piece Randomizer
+# ---------------------------------------------------------------
+
+class ShapeRng:
+    """xorshift32 piece picker, same sequence on every port for a seed."""
+    def __init__(self, seed):
+        self.state = (seed & 0xFFFFFFFF) or 0x2545F491  # 0 would stick at 0
+
+    def next_shape(self):
+        x = self.state
+        x ^= (x << 13) & 0xFFFFFFFF
+        x ^= x >> 17
+        x ^= (x << 5) & 0xFFFFFFFF
+        self.state = x
+        return TETROMINO_KEYS[x % len(TETROMINO_KEYS)]
+
+# ---------------------------------------------------------------
+# Game Logic
+# ---------------------------------------------------------------
+
+class TetrisGame:
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        self.rng = ShapeRng(seed)
+        self.width = WIDTH
+        self.height = HEIGHT
+        self.rows = array('H' if WIDTH <= 16 else 'L', [0] * HEIGHT)
+        self.score = 0
+        self.game_over = False
+
+        self.p1 = self.Player(self, PLAYER_1_COLOR, self.width // 2 - 4)
+        self.p2 = self.Player(self, PLAYER_2_COLOR, self.width // 2 + 1)
+        self.p1.other = self.p2
+        self.p2.other = self.p1
+
+        self.p1.next_shape = self.get_random_shape()
+        self.p2.next_shape = self.get_random_shape()
+
+        self.spawn_new_pieces()
+
+    def get_random_shape(self):
+        return self.rng.next_shape()
+
+    def spawn_new_pieces(self):
+        self.p1.spawn(self.p1.next_shape)
+        self.p2.spawn(self.p2.next_shape)
+
+        self.p1.next_shape = self.get_random_shape()
+        self.p2.next_shape = self.get_random_shape()
+
+        # Check for immediate game over
+        if not self.p1.is_valid_position() or not self.p2.is_valid_position():
+            self.game_over = True
+
+    class Player:
+        def __init__(self, game, color, start_x):
+            self.game = game
+            self.other = None
+            self.color = color
+            self.start_x = start_x
+            self.states = None
+            self.kicks = None
+            self.rotation = 0
+            self.shape_key = ''
+            self.x = 0
+            self.y = 0
+            self.next_shape = ''
+            self.is_placed = False
+
+        @property
+        def shape(self):
+            """Cell offsets of the current rotation."""
+            return self.states[self.rotation][5]
+
+        def spawn(self, shape_key):
+            self.shape_key = shape_key
+            self.states = PIECES[shape_key]
+            self.kicks = KICKS[shape_key]
+            self.rotation = 0
+            self.x = self.start_x
+            self.y = 0 # Spawn at top
+            self.is_placed = False
+
+        def row_mask(self, row):
+            """Bits this (active) piece occupies in board row `row`."""
+            left, top, _, height, masks, _ = self.states[self.rotation]
+            i = row - (self.y + top)
+            if 0 <= i < height:
+                return masks[i] >> (self.x + left)
+            return 0
+
+        def is_valid_position(self, rotation=None, x=None, y=None):
+            rotation = rotation if rotation is not None else self.rotation
+            x = x if x is not None else self.x
+            y = y if y is not None else self.y
+
+            left, top, width, height, masks, _ = self.states[rotation]
+            left += x
+            top += y
+            # Check bounds
+            if left < 0 or left + width > WIDTH or top < 0 or top + height > HEIGHT:
+                return False
+            rows = self.game.rows
+            # Only check the *other* player's piece while it is still active
+            other = self.other if not self.other.is_placed else None
+            for i in range(height):
+                bits = masks[i] >> left
+                # Check for collision with static pieces
+                if rows[top + i] & bits:
+                    return False
+                if other is not None and other.row_mask(top + i) & bits:
+                    return False
+            return True
+
+        def move(self, dx, dy):
+            if self.is_placed:
+                return False
+            if self.is_valid_position(x=self.x + dx, y=self.y + dy):
+                self.x += dx
+                self.y += dy
+                return True
+            return False
+
+        def rotate(self):
+            """Turn clockwise, trying the SRS kicks in order."""
+            if self.is_placed or self.shape_key == 'O':
+                return False
+
+            rotation = (self.rotation + 1) & 3
+            kicks = self.kicks
+            i = self.rotation * KICK_PROBES * 2
+            for _ in range(KICK_PROBES):
+                x = self.x + kicks[i]
+                y = self.y + kicks[i + 1]
+                if self.is_valid_position(rotation=rotation, x=x, y=y):
+                    self.rotation = rotation
+                    self.x = x
+                    self.y = y
+                    return True
+                i += 2
+            return False
+
+    def step_gravity(self):
+        """Apply gravity to both players. Returns the full lines, if any."""
+        if self.game_over:
+            return 0
+
+        p1_can_move = True
+        p2_can_move = True
+
+        if not self.p1.is_placed:
+            if not self.p1.move(0, 1):
+                p1_can_move = False
+
+        if not self.p2.is_placed:
+            if not self.p2.move(0, 1):
+                p2_can_move = False
+
+        if not p1_can_move and not self.p1.is_placed:
+            self.place_piece(self.p1)
+
+        if not p2_can_move and not self.p2.is_placed:
+            self.place_piece(self.p2)
+
+        # Check if both players have placed their pieces
+        if self.p1.is_placed and self.p2.is_placed:
+            cleared_lines = self.check_for_lines()
+            if cleared_lines == 0:
+                self.spawn_new_pieces()
+            # If lines were cleared, finish_line_clear() spawns after the flicker
+            return cleared_lines
+        return 0
+
+    def place_piece(self, player):
+        """Lock a player's piece into the board."""
+        if player.is_placed:
+            return
+        player.is_placed = True
+        left, top, _, height, masks, _ = player.states[player.rotation]
+        left += player.x
+        top += player.y
+        for i in range(height):
+            self.rows[top + i] |= masks[i] >> left
+
+    def check_for_lines(self):
+        """Return the completed lines (top to bottom), or 0."""
+        rows = self.rows
+        lines_to_clear = [y for y in range(self.height) if rows[y] == FULL_ROW]
+        return lines_to_clear or 0
+
+    def finish_line_clear(self, cleared_lines):
+        """Called after flicker, to remove lines and shift the board down."""
+        self.score += len(cleared_lines) ** 2 # Bonus
+        rows = self.rows
+        for y_to_clear in cleared_lines:
+            # Shift everything above down by one row, empty row on top
+            for y in range(y_to_clear, 0, -1):
+                rows[y] = rows[y - 1]
+            rows[0] = 0
+
+        # After clearing, spawn new pieces
+        self.spawn_new_pieces()
+
+    def handle_input(self, player_num, action):
+        if self.game_over:
+            return
+
+        player = self.p1 if player_num == 1 else self.p2
+
+        if player.is_placed: # Don't accept input if piece is placed
+            return
+
+        if action == 'left':
+            player.move(-1, 0)
+        elif action == 'right':
+            player.move(1, 0)
+        elif action == 'down':
+            # Move down until it can't, then place
+            while player.move(0, 1):
+                pass
+            self.place_piece(player)
+        elif action == 'rotate':
+            player.rotate()
+
+    def piece_states(self):
+        """(shape, rotation, x, y) of each player's active piece, None once
+        placed. Enough, with the board, to go on predicting moves."""
+        return tuple(None if p.is_placed else (p.shape_key, p.rotation, p.x, p.y)
+                     for p in (self.p1, self.p2))
+
+    def set_piece(self, player_num, piece):
+        """Put a player's piece into a piece_states() entry (None = placed)."""
+        player = self.p1 if player_num == 1 else self.p2
+        if piece is None:
+            player.is_placed = True
+            return
+        player.spawn(piece[0])
+        player.rotation, player.x, player.y = piece[1], piece[2], piece[3]
+
+    def display_rows(self, out=None):
+        """Board rows with both active pieces drawn in (for the LED matrix)."""
+        if out is None:
+            out = array('H' if WIDTH <= 16 else 'L', [0] * HEIGHT)
+        rows = self.rows
+        for y in range(self.height):
+            out[y] = rows[y]
+        for player in (self.p1, self.p2):
+            if not player.is_placed:
+                left, top, _, height, masks, _ = player.states[player.rotation]
+                left += player.x
+                top += player.y
+                for i in range(height):
+                    out[top + i] |= masks[i] >> left
+        return out
+
+    def color_planes(self, lo, hi):
+        """Rows as two bit planes of the 2-bit cell colors (see tetris_proto).
+
+        lo = placed | player 1, hi = placed | player 2; pieces are drawn
+        over the board like cell_grid() does.
+        """
+        rows = self.rows
+        for y in range(self.height):
+            lo[y] = hi[y] = rows[y]
+        for player, plane, other in ((self.p1, lo, hi), (self.p2, hi, lo)):
+            if not player.is_placed:
+                left, top, _, height, masks, _ = player.states[player.rotation]
+                left += player.x
+                top += player.y
+                for i in range(height):
+                    bits = masks[i] >> left
+                    plane[top + i] |= bits
+                    other[top + i] &= ~bits
+        return lo, hi
+
+    def cell_grid(self):
+        """Flat row-major list of colors, active pieces drawn on top."""
+        grid = [0] * (self.width * self.height)
+        rows = self.rows
+        for y in range(self.height):
+            row = rows[y]
+            if row:
+                base = y * self.width
+                for x in range(self.width):
+                    if row & (1 << (WIDTH - 1 - x)):
+                        grid[base + x] = STATIC_COLOR
+        for player in (self.p1, self.p2):
+            if not player.is_placed:
+                for (px, py) in player.shape:
+                    grid[(player.y + py) * self.width + player.x + px] = player.color
+        return grid
+
+    def get_game_state(self, is_paused=False, trace=None):
+        """Generate the full game state for the client.
+
+        trace: (id, hold) of the client's latency mark to echo, or None.
+        """
+        state = {
+            "grid": self.cell_grid(),
+            "score": self.score,
+            "p1_next": self.p1.next_shape,
+            "p2_next": self.p2.next_shape,
+            "game_over": self.game_over,
+            "paused": is_paused
+        }
+        if trace:
+            state["trace"] = list(trace)
+        return json.dumps(state)
+
+
+GRAVITY = 0  # player number of a gravity step in a run_log() log
+
+def run_log(seed, log, game=None):
+    """Replay (player, action) steps on a new game from `seed`; player
+    GRAVITY (action ignored) is a gravity step, cleared lines are finished
+    at once. Returns the game."""
+    game = game or TetrisGame(seed)
+    for player, action in log:
+        if player == GRAVITY:
+            lines = game.step_gravity()
+            if lines:
+                game.finish_line_clear(lines)
+        else:
+            game.handle_input(player, action)
+    return game
@@ -11,6 +11,9 @@ import json
 import threading
 import queue
 
+from state_mailbox import Mailbox, EventQueue
+from latency_trace import LatencyTrace, json_trace
+
 # ---------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------
@@ -92,10 +95,11 @@ def draw_mini_shape(surface, shape_key, x_offset, y_offset):
 
 class CommunicationThread(threading.Thread):
     """Handles all serial/socket communication in a separate thread."""
-    def __init__(self, mode, input_queue, output_queue):
+    def __init__(self, mode, mailbox, events, output_queue):
         super().__init__(daemon=True)
         self.mode = mode
-        self.input_q = input_queue  # Data from Pico (game state)
+        self.mailbox = mailbox  # Latest JSON state line from Pico
+        self.events = events    # Errors, latency-trace echoes
         self.output_q = output_queue # Data to Pico (key presses)
         self.connection = None
         self.running = True
@@ -129,7 +133,7 @@ class CommunicationThread(threading.Thread):
     def run(self):
         """Main loop for the thread."""
         if not self.connect():
-            self.input_q.put({"error": "Connection Failed"})
+            self.events.put({"error": "Connection Failed"})
             return
             
         buffer = ""
@@ -156,32 +160,26 @@ class CommunicationThread(threading.Thread):
                         raw_data = self.connection.read(bytes_waiting)
                         buffer += raw_data.decode('utf-8', errors='ignore')
                     
-                    # Process buffer line by line
-                    if '\n' in buffer:
-                        data, buffer = buffer.split('\n', 1)
-                        data = data.strip()
-                    else:
-                        data = None
-
                 elif self.mode == "WIFI":
-                    # Read until newline
                     buffer += self.connection.recv(1024).decode('utf-8')
-                    if '\n' in buffer:
-                        data, buffer = buffer.split('\n', 1)
-                        data = data.strip()
-                    else:
-                        data = None
-                
-                if data:
-                    try:
-                        # Pico sends JSON strings
-                        game_state = json.loads(data)
-                        self.input_q.put(game_state)
-                    except json.JSONDecodeError:
-                        # Pico might also send debug print()s. Ignore them.
+
+                # Process buffer line by line, every complete line
+                while '\n' in buffer:
+                    data, buffer = buffer.split('\n', 1)
+                    data = data.strip()
+                    if data.startswith('{'):
+                        # Latency echoes are picked out of every state,
+                        # even one a newer state replaces
+                        trace = json_trace(data)
+                        if trace:
+                            self.events.put({"trace": trace, "received": time.perf_counter()})
+                        # Pico sends JSON states. Decoded by the GUI, and
+                        # only if no newer state replaces it
+                        self.mailbox.put(data)
+                    elif data:
+                        # Pico might also send debug print()s
                         print(f"Pico debug: {data}")
-                        pass
-                        
+
             except serial.SerialTimeoutException:
                     pass # Normal timeout
             except socket.timeout:
@@ -208,6 +206,7 @@ class PygameClient:
         self.font_big = pygame.font.SysFont(None, 50)
         self.font_medium = pygame.font.SysFont(None, 30)
         self.font_small = pygame.font.SysFont(None, 25)
+        self.font_mono = pygame.font.SysFont("monospace", 12)
         
         self.comm_mode = self.show_menu()
         if self.comm_mode is None:
@@ -221,10 +220,15 @@ class PygameClient:
             self.error_message = self.error_message or "Failed to contact Pico on USB"
         # ---
         
-        self.game_state_q = queue.Queue()
+        self.mailbox = Mailbox()
+        self.events = EventQueue()
         self.input_q = queue.Queue()
         
-        self.comm_thread = CommunicationThread(self.comm_mode, self.game_state_q, self.input_q)
+        # Key-to-screen latency: F3 shows it, F4 saves it as CSV
+        self.trace = LatencyTrace("v3-" + self.comm_mode.lower())
+        self.show_trace = False
+        
+        self.comm_thread = CommunicationThread(self.comm_mode, self.mailbox, self.events, self.input_q)
         if self.error_message is None:
             self.comm_thread.start()
         
@@ -299,15 +303,18 @@ class PygameClient:
                     self.handle_keydown(event.key)
             
             # 2. Get Game State from Pico
-            try:
-                while not self.game_state_q.empty():
-                    new_state = self.game_state_q.get_nowait()
-                    if "error" in new_state:
-                        self.error_message = new_state["error"]
-                    else:
-                        self.current_state = new_state
-            except queue.Empty:
-                pass
+            for msg in self.events.get_all():
+                if "error" in msg:
+                    self.error_message = msg["error"]
+                elif "trace" in msg:
+                    self.trace.echo(msg["trace"], msg["received"])
+            # Only the newest state is decoded; older ones were replaced
+            line = self.mailbox.take()
+            if line:
+                try:
+                    self.current_state = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Pico debug: {line}")
                 
             if not self.comm_thread.is_alive() and not self.error_message:
                 # If the thread dies and we don't have an error, set one.
@@ -319,6 +326,7 @@ class PygameClient:
                 
             # 3. Draw Everything
             self.draw()
+            self.trace.shown() # This frame shows the state with any echo above
             
             self.clock.tick(60) # Run at 60 FPS
             
@@ -326,12 +334,22 @@ class PygameClient:
         self.comm_thread.running = False
         self.comm_thread.join(timeout=1)
         pygame.quit()
+        if self.trace.count():
+            print(self.trace.summary())
         if self.error_message:
             print(f"Exiting due to error: {self.error_message}")
 
     def handle_keydown(self, key):
         """Map pygame keys to single-char commands for Pico."""
         
+        # --- Latency Overlay / Export ---
+        if key == pygame.K_F3:
+            self.show_trace = not self.show_trace
+            return
+        if key == pygame.K_F4:
+            print("Latency samples written to", self.trace.write_csv())
+            return
+        
         # --- NEW: Pause Menu Input ---
         if self.current_state.get("paused", False):
             if key == pygame.K_1:
@@ -349,7 +367,7 @@ class PygameClient:
         
         # --- Pause Toggle ---
         if key == pygame.K_p:
-            self.input_q.put('p')
+            self.input_q.put('p' + self.trace.mark())
             return
 
         # --- Player Game Input ---
@@ -367,7 +385,8 @@ class PygameClient:
             pygame.K_RIGHT: 'r',
         }
         if key in key_map:
-            self.input_q.put(key_map[key])
+            # The trace mark comes back in the next state (latency_trace.py)
+            self.input_q.put(key_map[key] + self.trace.mark())
 
     def draw(self):
         """Draw the entire game screen."""
@@ -375,6 +394,8 @@ class PygameClient:
         
         self.draw_grid()
         self.draw_info_panel()
+        if self.show_trace:
+            self.trace.draw(self.screen, self.font_mono, (GAME_AREA_WIDTH + 5, 450))
         
         # --- NEW: Handle Overlays ---
         if self.current_state.get("paused", False):
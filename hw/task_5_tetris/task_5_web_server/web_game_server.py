@@ -1,110 +1,338 @@
-import socket
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio  # CPython, for trying the page on a PC
+import binascii
+import hashlib
 from machine import Pin
-import time
+
+from tetris_engine import TetrisGame, TETROMINO_KEYS
+from tetris_proto import StateEncoder, CommandReader
 
 # Ensure Wi-Fi is connected before running this script!
 # (Assume boot.py or manual setup has run)
+#
+# Upload next to this file: tetris_engine.py, tetris_proto.py (same as in
+# task_5_wifi_usb). Then browse to http://<pico ip>/ and play.
+#
+# One uasyncio loop serves every client at once. HTTP responses are built
+# once at import as bytes and sent with a single write, except the page:
+# it stays one bytes constant (in flash when this module is frozen) and
+# goes out in chunks. Connections are kept alive between requests. The game runs on the Pico: the page opens a
+# WebSocket on /ws, sends its keys over it and gets binary state frames
+# (tetris_proto) pushed whenever the game changes, instead of asking for
+# them with an HTTP request per action.
 
 # --- Hardware Setup ---
 # We'll use the onboard LED for a simple test response
-led = Pin('LED', Pin.OUT) 
-
-# --- Web Server Functions ---
-
-def web_page():
-    # HTML content for the minimal "game" interface
-    html = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Pico W Game</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <style>
-            body { font-family: Arial; text-align: center; margin: 50px; background: #f0f0f0; }
-            .card { background: white; padding: 20px; border-radius: 10px; box-shadow: 0 4px 8px rgba(0,0,0,0.1); }
-            .button { background-color: #4CAF50; color: white; padding: 15px 32px; text-align: center; text-decoration: none; display: inline-block; font-size: 16px; margin: 4px 2px; cursor: pointer; border: none; border-radius: 8px;}
-            .status { margin-top: 20px; font-size: 1.2em; }
-        </style>
-    </head>
-    <body>
-        <div class="card">
-            <h1>Pico W Web Game Controller</h1>
-            <p class="status" id="status">LED Status: OFF</p>
-            
-            <button class="button" onclick="sendAction('/?led=on')">TURN ON LED</button>
-            <button class="button" onclick="sendAction('/?led=off')" style="background-color: #f44336;">TURN OFF LED</button>
-            
-            <p>Accessing the Pico W at its core.</p>
-        </div>
-
-        <script>
-            function sendAction(action) {
-                // Use AJAX to send a request to the Pico W server
-                var xhr = new XMLHttpRequest();
-                xhr.open("GET", action, true);
-                xhr.send();
-                
-                // Update status text instantly (for a quick response feel)
-                var statusElement = document.getElementById("status");
-                if (action.includes('on')) {
-                    statusElement.innerHTML = "LED Status: ON (Request Sent)";
-                } else {
-                    statusElement.innerHTML = "LED Status: OFF (Request Sent)";
-                }
-            }
-        </script>
-    </body>
-    </html>"""
-    return html
+led = Pin('LED', Pin.OUT)
+
+# --- Settings ---
+PORT = 80
+GAME_TICK_MS = 500
+MAX_SOCKETS = 4  # WebSocket clients; each keeps its own frame history
+IDLE_S = 10  # Close keep-alive connections idle this long
+PAGE_CHUNK = 512  # Bytes of the page per write
+KEYS = {'w': (1, 'rotate'), 'a': (1, 'left'), 's': (1, 'down'), 'd': (1, 'right'),
+        'u': (2, 'rotate'), 'l': (2, 'left'), 'n': (2, 'down'), 'r': (2, 'right')}
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
 
 # ----------------------------------------------------
-# Main Server Loop
+# Static responses (encoded once, sent as-is)
 # ----------------------------------------------------
 
-# Set up socket connection
-try:
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.bind(('', 80)) # Bind to port 80 (standard HTTP port)
-    s.listen(5) # Listen for up to 5 concurrent connections
-except Exception as e:
-    print(f"Socket error: {e}")
+PAGE = b"""<!DOCTYPE html>
+<html>
+<head>
+<title>Pico W Tetris</title>
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<style>
+body { font-family: Arial; text-align: center; margin: 20px; background: #f0f0f0; }
+.card { background: white; padding: 20px; border-radius: 10px; box-shadow: 0 4px 8px rgba(0,0,0,0.1); display: inline-block; }
+canvas { background: #111; border-radius: 4px; }
+.button { background-color: #4CAF50; color: white; padding: 10px 18px; font-size: 16px; margin: 4px 2px; cursor: pointer; border: none; border-radius: 8px; }
+.status { margin-top: 10px; font-size: 1.2em; }
+</style>
+</head>
+<body>
+<div class="card">
+<h1>Pico W Tetris</h1>
+<canvas id="board" width="320" height="640"></canvas>
+<script src="/keys.js"></script>
+<p class="status" id="status">Connecting...</p>
+<p>P1: W A S D &nbsp; P2: arrow keys &nbsp; P: pause / new game</p>
+<button class="button" onclick="key('a')">&#8592;</button>
+<button class="button" onclick="key('w')">&#8635;</button>
+<button class="button" onclick="key('d')">&#8594;</button>
+<button class="button" onclick="key('s')">&#8595;</button>
+<button class="button" onclick="key('p')">P</button>
+<br>
+<button class="button" onclick="fetch('/?led=on')">LED ON</button>
+<button class="button" onclick="fetch('/?led=off')" style="background-color: #f44336;">LED OFF</button>
+</div>
+<script>
+var W = 16, H = 32, CELL = 20;
+var COLORS = ["#111", "#2196F3", "#f44336", "#9e9e9e"];
+var KEYMAP = {w: "w", a: "a", s: "s", d: "d", p: "p",
+              ArrowUp: "u", ArrowLeft: "l", ArrowDown: "n", ArrowRight: "r"};
+var ctx = document.getElementById("board").getContext("2d");
+var statusText = document.getElementById("status");
+var grids = {}, order = [], ws;
+
+function hex4(n) { return ("000" + n.toString(16)).slice(-4); }
+function key(ch) { if (ws && ws.readyState == 1) ws.send(ch); }
+
+function frame(buf) {
+  var b = new Uint8Array(buf);
+  if (b[0] != 0xA5 || b[1] != 0x5A || b[2] != 3) return;
+  var seq = b[4] << 8 | b[5], flags = b[12], p = 23, grid;
+  if (flags & 4) p += 4;
+  if (b[3] == 1) {
+    grid = b.slice(p, p + 4 * H);
+  } else {
+    var base = grids[b[p] << 8 | b[p + 1]];
+    if (!base) return;
+    grid = base.slice();
+    for (var n = b[p + 2], i = 0, q = p + 3; i < n; i++, q += 5) grid.set(b.subarray(q + 1, q + 5), b[q] * 4);
+  }
+  grids[seq] = grid; order.push(seq);
+  if (order.length > 16) delete grids[order.shift()];
+  ws.send("#" + hex4(seq));  // Ack: later frames only carry changed rows
+  for (var y = 0; y < H; y++) {
+    var hi = grid[4 * y] << 8 | grid[4 * y + 1], lo = grid[4 * y + 2] << 8 | grid[4 * y + 3];
+    for (var x = 0; x < W; x++) {
+      var bit = W - 1 - x;
+      ctx.fillStyle = COLORS[((hi >> bit) & 1) << 1 | ((lo >> bit) & 1)];
+      ctx.fillRect(x * CELL, y * CELL, CELL - 1, CELL - 1);
+    }
+  }
+  var score = ((b[8] << 24) | (b[9] << 16) | (b[10] << 8) | b[11]) >>> 0;
+  statusText.textContent = "Score: " + score + "  Next: " + (SHAPES[b[13]] || "-") + " / " + (SHAPES[b[14]] || "-")
+    + (flags & 2 ? "  GAME OVER" : flags & 1 ? "  PAUSED" : "");
+}
+
+function connect() {
+  ws = new WebSocket("ws://" + location.host + "/ws");
+  ws.binaryType = "arraybuffer";
+  ws.onmessage = function (e) { frame(e.data); };
+  ws.onclose = function () { statusText.textContent = "Disconnected, retrying..."; grids = {}; order = []; setTimeout(connect, 2000); };
+}
+document.addEventListener("keydown", function (e) {
+  var ch = KEYMAP[e.key.length == 1 ? e.key.toLowerCase() : e.key];
+  if (ch) { key(ch); e.preventDefault(); }
+});
+connect();
+</script>
+</body>
+</html>"""
+
+
+def header(status, content_type, length, extra=b""):
+    return (b"HTTP/1.1 " + status + b"\r\nContent-Type: " + content_type
+            + b"\r\nContent-Length: " + str(length).encode() + b"\r\n" + extra + b"\r\n")
+
+
+def response(status, content_type, body, extra=b""):
+    return header(status, content_type, len(body), extra) + body
+
+
+CACHE = b"Cache-Control: max-age=3600\r\n"
+PAGE_HEADER = header(b"200 OK", b"text/html", len(PAGE), CACHE)
+# Shape letters in the engine's order, which frames index into
+KEYS_JS = response(b"200 OK", b"application/javascript",
+                   b'var SHAPES = "' + "".join(TETROMINO_KEYS).encode() + b'";', CACHE)
+NO_CONTENT = b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n"
+NOT_FOUND = response(b"404 Not Found", b"text/plain", b"Not found")
+BUSY = response(b"503 Service Unavailable", b"text/plain", b"Too many players")
+
+
+async def send_page(writer):
+    # Slices of a memoryview: the page itself is never copied
+    writer.write(PAGE_HEADER)
+    page = memoryview(PAGE)
+    for i in range(0, len(PAGE), PAGE_CHUNK):
+        writer.write(page[i:i + PAGE_CHUNK])
+        await writer.drain()
+
+# ----------------------------------------------------
+# Game
+# ----------------------------------------------------
+
+game = TetrisGame()
+paused = False
+sockets = []  # Open WebSocket clients
+
+
+def changed():
+    # Wake every WebSocket sender; each sends the newest state once
+    for client in sockets:
+        client.dirty.set()
+
 
-print("Web server started on port 80.")
+def apply_key(ch):
+    global game, paused
+    if ch == 'p':
+        if game.game_over:
+            game = TetrisGame()
+            paused = False
+        else:
+            paused = not paused
+        changed()
+        return
+    k = KEYS.get(ch)
+    if k and not paused and not game.game_over:
+        game.handle_input(*k)
+        changed()
 
-while True:
+
+async def game_loop():
+    while True:
+        await asyncio.sleep(GAME_TICK_MS / 1000)
+        if paused or game.game_over:
+            continue
+        lines = game.step_gravity()
+        if lines:
+            game.finish_line_clear(lines)
+        changed()
+
+# ----------------------------------------------------
+# WebSocket (/ws)
+# ----------------------------------------------------
+
+class Socket:
+    def __init__(self, writer):
+        self.writer = writer
+        self.encoder = StateEncoder()  # Per client: DELTAs follow its own acks
+        self.reader = CommandReader(self.encoder)
+        self.dirty = asyncio.Event()
+        self.dirty.set()  # Send the current state straight away
+
+    async def send_loop(self):
+        writer = self.writer
+        try:
+            while True:
+                await self.dirty.wait()
+                self.dirty.clear()
+                frame = self.encoder.encode(game, paused)
+                n = len(frame)
+                head = bytes((0x82, n)) if n < 126 else bytes((0x82, 126, n >> 8, n & 0xFF))
+                writer.write(head + bytes(frame))  # Binary message, one write
+                await writer.drain()
+        except OSError:
+            pass  # Closed; the receive side cleans up
+
+
+async def ws_messages(reader, writer, client):
+    # Client -> Pico messages are masked; text and binary are both key input
+    while True:
+        head = await reader.readexactly(2)
+        n = head[1] & 0x7F
+        if n == 126:
+            ext = await reader.readexactly(2)
+            n = (ext[0] << 8) | ext[1]
+        elif n > 126:
+            return  # No 64-bit lengths from a keyboard
+        mask = await reader.readexactly(4) if head[1] & 0x80 else b"\0\0\0\0"
+        data = await reader.readexactly(n) if n else b""
+        opcode = head[0] & 0x0F
+        if opcode == 8:
+            writer.write(b"\x88\x00")
+            await writer.drain()
+            return
+        if opcode == 9:
+            if n > 125:
+                return  # Control frames carry at most 125 bytes
+            # Ping: answer with a pong carrying the same payload, unmasked
+            writer.write(bytes((0x8A, n)) + bytes(data[i] ^ mask[i & 3] for i in range(n)))
+            await writer.drain()
+            continue
+        if opcode == 10:
+            continue  # Unsolicited pong
+        for i in range(n):
+            ch = client.reader.feed(chr(data[i] ^ mask[i & 3]))
+            if ch:
+                apply_key(ch)
+
+
+async def websocket(reader, writer, key):
+    if len(sockets) >= MAX_SOCKETS:
+        writer.write(BUSY)
+        await writer.drain()
+        return
+    accept = binascii.b2a_base64(hashlib.sha1(key + WS_GUID).digest()).strip()
+    writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                 b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+    await writer.drain()
+    client = Socket(writer)
+    sockets.append(client)
+    print('WebSocket client, %d open' % len(sockets))
+    sender = asyncio.create_task(client.send_loop())
+    try:
+        await ws_messages(reader, writer, client)
+    finally:
+        sender.cancel()
+        sockets.remove(client)
+        print('WebSocket closed, %d open' % len(sockets))
+
+# ----------------------------------------------------
+# HTTP
+# ----------------------------------------------------
+
+async def handle(reader, writer):
     try:
-        conn, addr = s.accept() # Wait for client connection
-        print('Got connection from %s' % str(addr))
-        request = conn.recv(1024) # Receive request data
-        request = str(request)
-        
-        # --- Handle Incoming Request ---
-        
-        # Check if the request contains an LED command
-        led_on = request.find('/?led=on')
-        led_off = request.find('/?led=off')
-        
-        if led_on == 6: # '/?led=on' command received
-            led.value(1) # Turn LED ON
-            print('-> LED ON command processed')
-        elif led_off == 6: # '/?led=off' command received
-            led.value(0) # Turn LED OFF
-            print('-> LED OFF command processed')
-
-        # --- Send Response ---
-        
-        response = web_page()
-        # Send HTTP headers and HTML content
-        conn.send('HTTP/1.1 200 OK\n')
-        conn.send('Content-Type: text/html\n')
-        conn.send('Connection: close\n\n')
-        conn.sendall(response)
-        conn.close()
-        
-    except OSError as e:
-        conn.close()
-        print('Connection closed:', e)
-        time.sleep(1)
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        time.sleep(1)
\ No newline at end of file
+        while True:
+            # Keep-alive: wait for the next request on this connection
+            line = await asyncio.wait_for(reader.readline(), IDLE_S)
+            if not line:
+                break
+            parts = line.split()
+            path = parts[1] if len(parts) > 1 else b"/"
+            ws_key = None
+            close = False
+            while True:
+                header = await reader.readline()
+                if header in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = header.partition(b":")
+                name = name.strip().lower()
+                if name == b"sec-websocket-key":
+                    ws_key = value.strip()
+                elif name == b"connection" and b"close" in value.lower():
+                    close = True
+
+            if path == b"/ws" and ws_key:
+                await websocket(reader, writer, ws_key)
+                break
+            if path == b"/?led=on":
+                led.value(1)
+                print('-> LED ON command processed')
+                writer.write(NO_CONTENT)
+            elif path == b"/?led=off":
+                led.value(0)
+                print('-> LED OFF command processed')
+                writer.write(NO_CONTENT)
+            elif path == b"/":
+                await send_page(writer)
+            elif path == b"/keys.js":
+                writer.write(KEYS_JS)
+            else:
+                writer.write(NOT_FOUND)
+            await writer.drain()
+            if close:
+                break
+    except (OSError, EOFError, asyncio.TimeoutError):
+        pass  # Client went away or stayed idle
+    writer.close()
+    await writer.wait_closed()
+
+# ----------------------------------------------------
+# Main
+# ----------------------------------------------------
+
+async def main():
+    await asyncio.start_server(handle, '0.0.0.0', PORT, backlog=5)
+    print("Web server started on port %d." % PORT)
+    await game_loop()
+
+
+asyncio.run(main())
@@ -0,0 +1,155 @@
+# latency_trace.py
+# Key-to-screen latency tracing for the pygame clients.
+#
+# After a key the client sends a trace mark ("!" and a 4-digit hex id, see
+# TraceMarks in tetris_transport.py). The Pico echoes the newest mark in the
+# next state it sends, together with how long it held it (0.1 ms units), so
+# each traced key yields:
+#   rtt      key sent -> echoing state received by the link
+#   pico     mark arrived on the Pico -> echoing state sent
+#   oneway   (rtt - pico) / 2, the link time each way if it is symmetric
+#   display  state received -> GUI pass that drew it finished
+#   total    key sent -> drawn, what the player sees
+# Several keys before one state share an echo; only the newest is measured.
+#
+# F3 in the clients toggles the overlay, F4 writes the samples to CSV.
+
+import csv
+import re
+import time
+from collections import deque
+
+import pygame
+
+METRICS = ("rtt", "pico", "oneway", "display", "total")
+BINS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)  # upper edges; last bin is open
+
+# "trace": [id, hold] in a JSON state line, found without decoding the line
+_JSON_TRACE = re.compile(r'"trace":\s*\[(\d+),\s*(\d+)\]')
+
+
+def json_trace(line):
+    """(id, hold) echoed by a JSON state line, or None."""
+    if '"trace"' not in line:
+        return None
+    m = _JSON_TRACE.search(line)
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+
+class LatencyTrace:
+    def __init__(self, transport, keep=5000, timeout=5.0):
+        self.transport = transport
+        self.timeout = timeout
+        self.next_id = 0
+        self.sent = {}  # id -> perf_counter() at mark()
+        self.echoed = []  # (id, sent, received, pico_ms) waiting for shown()
+        self.samples = deque(maxlen=keep)  # Rows for percentiles and CSV
+        self.hist = {m: [0] * (len(BINS_MS) + 1) for m in METRICS}
+        self.unanswered = 0  # Marks replaced by a newer one or never echoed
+
+    # ---------- Client side ----------
+    def mark(self):
+        """Trace mark to send right after a key."""
+        now = time.perf_counter()
+        if len(self.sent) > 64:
+            for i in [i for i, t in self.sent.items() if now - t > self.timeout]:
+                del self.sent[i]
+                self.unanswered += 1
+        self.next_id = (self.next_id + 1) & 0xFFFF
+        self.sent[self.next_id] = now
+        return "!%04x" % self.next_id
+
+    def echo(self, trace, received):
+        """The Pico echoed `trace` = (id, hold) in a state received at
+        perf_counter() `received`."""
+        trace_id, hold = trace
+        sent = self.sent.pop(trace_id, None)
+        if sent is None:
+            return
+        # Older marks were folded into this echo
+        for i in [i for i, t in self.sent.items() if t < sent]:
+            del self.sent[i]
+            self.unanswered += 1
+        self.echoed.append((trace_id, sent, received, hold / 10))
+
+    def shown(self, now=None):
+        """Call after the GUI pass that drew the newest state."""
+        if not self.echoed:
+            return
+        now = now or time.perf_counter()
+        for trace_id, sent, received, pico in self.echoed:
+            rtt = (received - sent) * 1000
+            row = {
+                "id": trace_id,
+                "sent": sent,
+                "rtt": rtt,
+                "pico": pico,
+                "oneway": max(0.0, (rtt - pico) / 2),
+                "display": (now - received) * 1000,
+                "total": (now - sent) * 1000,
+            }
+            self.samples.append(row)
+            for m in METRICS:
+                self.hist[m][_bin(row[m])] += 1
+        del self.echoed[:]
+
+    # ---------- Reporting ----------
+    def count(self):
+        return sum(self.hist["total"])
+
+    def stats(self, metric):
+        """(avg, p50, p95, max) in ms over the kept samples, or None."""
+        values = sorted(row[metric] for row in self.samples)
+        if not values:
+            return None
+        n = len(values)
+        return (sum(values) / n, values[n // 2], values[min(n - 1, int(n * 0.95))], values[-1])
+
+    def lines(self):
+        out = ["Latency (%s) %d keys" % (self.transport, self.count())]
+        for m in METRICS:
+            s = self.stats(m)
+            if s:
+                out.append("%-7s %5.1f %5.1f %6.1f" % (m, s[0], s[1], s[2]))
+        if len(out) > 1:
+            out.insert(1, "ms       avg   p50    p95")
+            counts = self.hist["total"]
+            top = max(counts) or 1
+            low = 0
+            for edge, c in zip(BINS_MS + (None,), counts):
+                if c:
+                    label = "<%d" % edge if edge else ">%d" % low
+                    out.append("%6s %s %d" % (label, "#" * max(1, 12 * c // top), c))
+                low = edge
+        return out
+
+    def summary(self):
+        return "\n".join(self.lines() + ["unanswered marks: %d" % self.unanswered])
+
+    def draw(self, surface, font, topleft, color=(200, 200, 200), bg=None):
+        """Draw lines() at `topleft`; returns the rect covered."""
+        x, y = topleft
+        rect = pygame.Rect(x, y, 0, 0)
+        for line in self.lines():
+            surf = font.render(line, True, color, bg)
+            rect.union_ip(surface.blit(surf, (x, y)))
+            y += surf.get_height()
+        return rect
+
+    def write_csv(self, path=None):
+        """Write every kept sample; returns the file name."""
+        path = path or time.strftime("latency_%%s_%Y%m%d_%H%M%S.csv") % self.transport.lower()
+        with open(path, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["transport", "id", "sent_s"] + ["%s_ms" % m for m in METRICS])
+            for row in self.samples:
+                w.writerow([self.transport, row["id"], "%.6f" % row["sent"]]
+                           + ["%.3f" % row[m] for m in METRICS])
+        return path
+
+
+def _bin(ms):
+    for i, edge in enumerate(BINS_MS):
+        if ms < edge:
+            return i
+    return len(BINS_MS)
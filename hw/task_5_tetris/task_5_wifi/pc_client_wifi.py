@@ -12,6 +12,8 @@ import json
 import threading
 import queue
 
+from state_mailbox import Mailbox, EventQueue
+
 # ---------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------
@@ -75,9 +77,10 @@ def draw_mini_shape(surface, shape_key, x_offset, y_offset):
 
 class CommunicationThread(threading.Thread):
     """Handles all socket communication in a separate thread."""
-    def __init__(self, input_queue, output_queue):
+    def __init__(self, mailbox, events, output_queue):
         super().__init__(daemon=True)
-        self.input_q = input_queue
+        self.mailbox = mailbox  # Latest JSON state line from Pico
+        self.events = events    # Errors
         self.output_q = output_queue
         self.connection = None
         self.running = True
@@ -98,7 +101,7 @@ class CommunicationThread(threading.Thread):
     def run(self):
         """Main loop for the thread."""
         if not self.connect():
-            self.input_q.put({"error": "Connection Failed"})
+            self.events.put({"error": "Connection Failed"})
             return
             
         buffer = ""
@@ -116,19 +119,14 @@ class CommunicationThread(threading.Thread):
             # 2. Receive data from Pico
             try:
                 buffer += self.connection.recv(1024).decode('utf-8')
-                if '\n' in buffer:
+                while '\n' in buffer:
                     data, buffer = buffer.split('\n', 1)
                     data = data.strip()
-                else:
-                    data = None
-                
-                if data:
-                    try:
-                        game_state = json.loads(data)
-                        self.input_q.put(game_state)
-                    except json.JSONDecodeError:
+                    if data.startswith('{'):
+                        # Decoded by the GUI, and only if no newer state replaces it
+                        self.mailbox.put(data)
+                    elif data:
                         print(f"Pico debug: {data}")
-                        pass
                         
             except socket.timeout:
                 pass # Normal timeout
@@ -158,10 +156,11 @@ class PygameClient:
         self.comm_mode = "WIFI"
         self.error_message = None
         
-        self.game_state_q = queue.Queue()
+        self.mailbox = Mailbox()
+        self.events = EventQueue()
         self.input_q = queue.Queue()
         
-        self.comm_thread = CommunicationThread(self.game_state_q, self.input_q)
+        self.comm_thread = CommunicationThread(self.mailbox, self.events, self.input_q)
         self.comm_thread.start()
         
         self.current_state = {
@@ -183,12 +182,12 @@ class PygameClient:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT: running = False
                 if event.type == pygame.KEYDOWN: self.handle_keydown(event.key)
-            try:
-                while not self.game_state_q.empty():
-                    new_state = self.game_state_q.get_nowait()
-                    if "error" in new_state: self.error_message = new_state["error"]
-                    else: self.current_state = new_state
-            except queue.Empty: pass
+            for msg in self.events.get_all():
+                if "error" in msg: self.error_message = msg["error"]
+            line = self.mailbox.take()  # Only the newest state is decoded
+            if line:
+                try: self.current_state = json.loads(line)
+                except json.JSONDecodeError: print(f"Pico debug: {line}")
             if not self.comm_thread.is_alive() and not self.error_message:
                 if not (self.current_state.get("game_over") or self.current_state.get("paused")):
                     self.error_message = "Connection Lost"
@@ -11,6 +11,9 @@ import json
 import threading
 import queue
 
+from board_renderer import BoardRenderer
+from state_mailbox import Mailbox, EventQueue
+
 # ---------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------
@@ -75,9 +78,10 @@ def draw_mini_shape(surface, shape_key, x_offset, y_offset):
 # ---------------------------------------------------------------
 class CommunicationThread(threading.Thread):
     """Handles all socket communication in a separate thread."""
-    def __init__(self, input_queue, output_queue):
+    def __init__(self, mailbox, events, output_queue):
         super().__init__(daemon=True)
-        self.input_q = input_queue
+        self.mailbox = mailbox  # Latest JSON state line from Pico
+        self.events = events    # Errors
         self.output_q = output_queue
         self.connection = None
         self.running = True
@@ -96,7 +100,7 @@ class CommunicationThread(threading.Thread):
 
     def run(self):
         if not self.connect():
-            self.input_q.put({"error": "Connection Failed"})
+            self.events.put({"error": "Connection Failed"})
             return
         buffer = ""
         while self.running:
@@ -113,18 +117,14 @@ class CommunicationThread(threading.Thread):
             # Receive data from Pico
             try:
                 buffer += self.connection.recv(1024).decode('utf-8')
-                if '\n' in buffer:
+                while '\n' in buffer:
                     data, buffer = buffer.split('\n', 1)
                     data = data.strip()
-                else:
-                    data = None
-                if data:
-                    try:
-                        game_state = json.loads(data)
-                        self.input_q.put(game_state)
-                    except json.JSONDecodeError:
+                    if data.startswith('{'):
+                        # Decoded by the GUI, and only if no newer state replaces it
+                        self.mailbox.put(data)
+                    elif data:
                         print(f"Pico debug: {data}")
-                        pass
             except socket.timeout:
                 pass
             except Exception as e:
@@ -149,9 +149,10 @@ class PygameClient:
 
         self.comm_mode = "WIFI"
         self.error_message = None
-        self.game_state_q = queue.Queue()
+        self.mailbox = Mailbox()
+        self.events = EventQueue()
         self.input_q = queue.Queue()
-        self.comm_thread = CommunicationThread(self.game_state_q, self.input_q)
+        self.comm_thread = CommunicationThread(self.mailbox, self.events, self.input_q)
         self.comm_thread.start()
 
         self.current_state = {
@@ -163,6 +164,14 @@ class PygameClient:
             "paused": False
         }
 
+        # Board cells are redrawn only where they change (see board_renderer.py)
+        self.board = BoardRenderer(self.screen, COLOR_MAP, COLOR_BG, cols=GRID_WIDTH, rows=GRID_HEIGHT,
+                                   block=BLOCK_SIZE, border=BORDER_SIZE, grid_color=GRID_LINE_COLOR, frame_color=(80, 80, 80))
+        self.panel_rect = pygame.Rect(GAME_AREA_WIDTH, 0, INFO_PANEL_WIDTH, WINDOW_HEIGHT)
+        self.panel_key = None
+        self.drawn_state = None
+        self.drawn_error = None
+
     def run_game(self):
         running = True
         while running:
@@ -171,15 +180,16 @@ class PygameClient:
                     running = False
                 if event.type == pygame.KEYDOWN:
                     self.handle_keydown(event.key)
-            try:
-                while not self.game_state_q.empty():
-                    new_state = self.game_state_q.get_nowait()
-                    if "error" in new_state:
-                        self.error_message = new_state["error"]
-                    else:
-                        self.current_state = new_state
-            except queue.Empty:
-                pass
+            for msg in self.events.get_all():
+                if "error" in msg:
+                    self.error_message = msg["error"]
+            # Only the newest state is decoded; older ones were replaced
+            line = self.mailbox.take()
+            if line:
+                try:
+                    self.current_state = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Pico debug: {line}")
             if not self.comm_thread.is_alive() and not self.error_message:
                 if not (self.current_state.get("game_over") or self.current_state.get("paused")):
                     self.error_message = "Connection Lost"
@@ -206,38 +216,38 @@ class PygameClient:
             self.input_q.put(key_map[key])
 
     def draw(self):
-        self.screen.fill(COLOR_BG)
-        self.draw_grid()
-        self.draw_grid_lines()
-        # Draw border frame
-        pygame.draw.rect(self.screen, (80, 80, 80), pygame.Rect(0, 0, GAME_AREA_WIDTH, GAME_AREA_HEIGHT), 2)
-        self.draw_info_panel()
-        if self.current_state.get("paused", False):
-            self.draw_pause_menu()
-        elif self.current_state.get("game_over", False):
-            self.draw_game_over()
-        if self.error_message:
-            self.draw_error()
-        pygame.display.flip()
-
-    def draw_grid_lines(self):
-        """Draw better aligned, visible background grid lines."""
-        for x in range(GRID_WIDTH + 1):
-            xpos = x * (BLOCK_SIZE + BORDER_SIZE)
-            pygame.draw.line(self.screen, GRID_LINE_COLOR, (xpos, 0), (xpos, GAME_AREA_HEIGHT))
-        for y in range(GRID_HEIGHT + 1):
-            ypos = y * (BLOCK_SIZE + BORDER_SIZE)
-            pygame.draw.line(self.screen, GRID_LINE_COLOR, (0, ypos), (GAME_AREA_WIDTH, ypos))
-
-    def draw_grid(self):
-        grid_data = self.current_state["grid"]
-        for i in range(len(grid_data)):
-            x = i % GRID_WIDTH
-            y = i // GRID_WIDTH
-            color = COLOR_MAP.get(grid_data[i], COLOR_BLACK)
-            draw_x = (BLOCK_SIZE + BORDER_SIZE) * x + BORDER_SIZE
-            draw_y = (BLOCK_SIZE + BORDER_SIZE) * y + BORDER_SIZE
-            pygame.draw.rect(self.screen, color, (draw_x, draw_y, BLOCK_SIZE, BLOCK_SIZE))
+        state = self.current_state
+        if state is self.drawn_state and self.error_message == self.drawn_error:
+            return # Nothing new to show
+        overlay = state.get("paused", False) or state.get("game_over", False) or self.error_message
+        if overlay or self.drawn_state is None:
+            # Full redraw: the overlays are blended over the board
+            self.screen.fill(COLOR_BG)
+            self.board.invalidate()
+            self.board.draw(state["grid"])
+            self.draw_info_panel()
+            if state.get("paused", False):
+                self.draw_pause_menu()
+            elif state.get("game_over", False):
+                self.draw_game_over()
+            if self.error_message:
+                self.draw_error()
+            pygame.display.flip()
+            # Repaint board and panel in full once the overlay is gone
+            self.board.invalidate()
+            self.panel_key = None
+        else:
+            rects = self.board.draw(state["grid"])
+            panel_key = (state["score"], state.get("p1_next", ""), state.get("p2_next", ""))
+            if panel_key != self.panel_key:
+                self.panel_key = panel_key
+                self.screen.fill(COLOR_BG, self.panel_rect)
+                self.draw_info_panel()
+                rects.append(self.panel_rect)
+            if rects:
+                pygame.display.update(rects)
+        self.drawn_state = state
+        self.drawn_error = self.error_message
 
     def draw_info_panel(self):
         panel_x = GAME_AREA_WIDTH
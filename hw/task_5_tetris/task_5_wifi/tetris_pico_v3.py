@@ -5,11 +5,12 @@
 import machine
 import time
 import sys
-import select
-import random
 import network
 import socket
-import ujson
+from array import array
+from tetris_engine import TetrisGame
+from tetris_transport import InputRing, UsbInput, SocketInput, TraceMarks
+from tetris_replay import ReplayWriter
 
 # ---------------------------------------------------------------
 # Configuration
@@ -36,35 +37,134 @@ SPI_CS_PIN = machine.Pin(9) # Use GP9 for CS
 # Number of 8x8 matrices cascaded
 NUM_MATRICES = 8  # For 16x32, you have (16/8) * (32/8) = 2 * 4 = 8 modules
 
+# How the modules are arranged: 2 wide, 4 high, chained row by row from the
+# top left, all mounted upright. Change this instead of set_pixel() when the
+# wiring differs (see TiledLayout).
+DISPLAY_LAYOUT = {
+    "tiles_x": 2,
+    "tiles_y": 4,
+    "chain": (0, 1, 2, 3, 4, 5, 6, 7),  # chain index of each tile, row by row
+    "rotation": 0,  # quarter turns per module (one value, or one per tile)
+    "mirror": False,  # left-right flip per module (one value, or one per tile)
+}
+
 # --- Game Config ---
 GAME_TICK_RATE = 0.5  # Seconds per game tick (gravity)
-PLAYER_1_COLOR = 1  # 1 represents Player 1's piece
-PLAYER_2_COLOR = 2  # 2 represents Player 2's piece
-STATIC_COLOR = 3  # Represents a placed piece
-
-# Tetromino shapes (O, I, S, Z, L, J, T)
-TETROMINOES = {
-    'O': [(0, 0), (1, 0), (0, 1), (1, 1)],
-    'I': [(0, 1), (1, 1), (2, 1), (3, 1)],
-    'S': [(1, 0), (2, 0), (0, 1), (1, 1)],
-    'Z': [(0, 0), (1, 0), (1, 1), (2, 1)],
-    'L': [(0, 1), (1, 1), (2, 1), (2, 0)],
-    'J': [(0, 1), (1, 1), (2, 1), (0, 0)],
-    'T': [(1, 1), (0, 1), (2, 1), (1, 0)]
-}
-TETROMINO_KEYS = list(TETROMINOES.keys())
+INPUT_STATS_MS = 0  # Print input queue depth / latency every N ms (0 = off)
+REPLAY_FILE = "replay.trl"  # Log of the last match for replay_tool.py ("" = off)
+# Pieces, colors and the rules live in tetris_engine.py
+
+# ---------------------------------------------------------------
+# Display Layout
+# ---------------------------------------------------------------
+
+# Bit-reversed bytes, for modules mounted mirrored
+REVERSED_BITS = bytes(sum(((i >> k) & 1) << (7 - k) for k in range(8)) for i in range(256))
+
+class TiledLayout:
+    """Maps logical pixels of a grid of 8x8 modules onto the chain buffer.
+
+    The buffer holds 8 row bytes per module in chain order, MSB = left
+    column (MAX7219Display.buffer). Everything is compiled once into
+    lookup tables, so a pixel write is two table reads.
+    """
+    def __init__(self, tiles_x, tiles_y, chain=None, rotation=0, mirror=False):
+        self.width = 8 * tiles_x
+        self.height = 8 * tiles_y
+        tiles = tiles_x * tiles_y
+        if chain is None:
+            chain = range(tiles)
+        if isinstance(rotation, int):
+            rotation = (rotation,) * tiles
+        if isinstance(mirror, bool):
+            mirror = (mirror,) * tiles
+
+        # Per logical pixel (index y * width + x): byte offset and bit mask
+        n = self.width * self.height
+        self.offsets = array('H', [0] * n)
+        self.masks = bytearray(n)
+        for y in range(self.height):
+            for x in range(self.width):
+                tile = (y // 8) * tiles_x + x // 8
+                col, row = self._module_coords(x % 8, y % 8, rotation[tile], mirror[tile])
+                i = y * self.width + x
+                self.offsets[i] = chain[tile] * 8 + row
+                self.masks[i] = 0x80 >> col
+
+        # Whole-frame path: for each byte of a MONO_HLSB logical frame, the
+        # buffer byte it lands in unchanged (copy) or bit-reversed (mirror).
+        # Bytes spread over several buffer bytes (rotated modules) get -1
+        # and are blitted pixel by pixel.
+        row_bytes = self.width // 8
+        self.byte_dst = array('h', [-1] * (row_bytes * self.height))
+        self.byte_rev = bytearray(row_bytes * self.height)
+        for j in range(len(self.byte_dst)):
+            i = (j // row_bytes) * self.width + (j % row_bytes) * 8
+            dst = self.offsets[i]
+            masks = bytes(self.masks[i:i + 8])
+            if any(self.offsets[i + k] != dst for k in range(8)):
+                continue
+            if masks == bytes(0x80 >> k for k in range(8)):
+                self.byte_dst[j] = dst
+            elif masks == bytes(1 << k for k in range(8)):
+                self.byte_dst[j] = dst
+                self.byte_rev[j] = 1
+
+    @staticmethod
+    def _module_coords(lx, ly, rotation, mirror):
+        # Logical position inside a tile -> (column, row) on the module
+        rotation &= 3
+        if rotation == 0:
+            col, row = lx, ly
+        elif rotation == 1:
+            col, row = ly, 7 - lx
+        elif rotation == 2:
+            col, row = 7 - lx, 7 - ly
+        else:
+            col, row = 7 - ly, lx
+        if mirror:
+            col = 7 - col
+        return col, row
+
+    def blit(self, frame, buffer):
+        """Copy a MONO_HLSB logical frame (width // 8 bytes per row) into buffer."""
+        byte_dst, byte_rev = self.byte_dst, self.byte_rev
+        for j in range(len(byte_dst)):
+            v = frame[j]
+            dst = byte_dst[j]
+            if dst >= 0:
+                buffer[dst] = REVERSED_BITS[v] if byte_rev[j] else v
+            else:
+                # Slow path: clear then set each of the 8 pixels
+                i = j * 8
+                offsets, masks = self.offsets, self.masks
+                for k in range(8):
+                    if v & (0x80 >> k):
+                        buffer[offsets[i + k]] |= masks[i + k]
+                    else:
+                        buffer[offsets[i + k]] &= ~masks[i + k]
 
 # ---------------------------------------------------------------
 # Minimal MAX7219 Driver
 # ---------------------------------------------------------------
 
 class MAX7219Display:
-    def __init__(self, spi, cs_pin, num_matrices):
+    def __init__(self, spi, cs_pin, num_matrices, layout=None):
         self.spi = spi
         self.cs = cs_pin
         self.cs.init(cs_pin.OUT, value=1)
         self.num_matrices = num_matrices
         self.buffer = bytearray(8 * num_matrices)
+        self.layout = layout or TiledLayout(**DISPLAY_LAYOUT)
+        self._offsets = self.layout.offsets
+        self._masks = self.layout.masks
+        self._width = self.layout.width
+        # What the modules currently show; show() only sends rows that differ
+        self.shadow = bytearray(8 * num_matrices)
+        self.shadow_valid = False
+        # One daisy-chain transaction (register, data per module), reused
+        self.tx = bytearray(2 * num_matrices)
+        self.bytes_sent = 0
         
         # Register addresses
         self._NOOP = 0x0
@@ -78,10 +178,14 @@ class MAX7219Display:
 
     def _write_cmd(self, register, data):
         """Write to a register on all cascaded matrices."""
+        tx = self.tx
+        for i in range(0, len(tx), 2):
+            tx[i] = register
+            tx[i + 1] = data
         self.cs(0)
-        for _ in range(self.num_matrices):
-            self.spi.write(bytearray([register, data]))
+        self.spi.write(tx)
         self.cs(1)
+        self.bytes_sent += len(tx)
 
     def init_display(self):
         """Initialize the MAX7219 registers."""
@@ -90,48 +194,60 @@ class MAX7219Display:
         self._write_cmd(self._SCAN_LIMIT, 0x07)      # Scan all 8 digits
         self._write_cmd(self._DECODE_MODE, 0x00)     # No BCD decode
         self._write_cmd(self._INTENSITY, 0x07)       # Medium intensity
+        self.shadow_valid = False                    # digit registers unknown
         self.clear()
         self.show()
 
     def set_pixel(self, x, y, value):
         """Set a pixel in the display buffer."""
-        # This logic heavily depends on how your 16x32 matrix is wired.
-        # This example assumes a 2x4 layout (2 wide, 4 high) of 8x8 modules.
-        # x=0..15, y=0..31
-        
+        # The module arrangement lives in self.layout (DISPLAY_LAYOUT)
         if not (0 <= x < DISPLAY_WIDTH and 0 <= y < DISPLAY_HEIGHT):
             return
 
-        matrix_x = x // 8  # 0 or 1
-        matrix_y = y // 8  # 0, 1, 2, or 3
-        
-        matrix_index = matrix_y * 2 + matrix_x
-        
-        local_x = x % 8
-        local_y = y % 8
-        
-        byte_offset = matrix_index * 8 + local_y
-        
-        bit_mask = 1 << (7 - local_x)
-        
+        i = y * self._width + x
         if value:
-            self.buffer[byte_offset] |= bit_mask
+            self.buffer[self._offsets[i]] |= self._masks[i]
         else:
-            self.buffer[byte_offset] &= ~bit_mask
+            self.buffer[self._offsets[i]] &= ~self._masks[i]
+
+    def blit(self, frame):
+        """Replace the buffer with a MONO_HLSB frame of the whole display."""
+        self.layout.blit(frame, self.buffer)
 
     def clear(self):
         """Clear the internal buffer."""
         for i in range(len(self.buffer)):
             self.buffer[i] = 0x00
 
-    def show(self):
-        """Send the buffer contents to the display."""
+    def show(self, force=False):
+        """Send the rows that changed since the last show().
+
+        Modules whose row is unchanged get a no-op in that transaction, and
+        rows unchanged on every module are not sent at all.
+        """
+        buffer, shadow, tx = self.buffer, self.shadow, self.tx
+        n = self.num_matrices
+        force = force or not self.shadow_valid
         for row in range(8):
-            self.cs(0)
-            for matrix_index in reversed(range(self.num_matrices)):
-                byte_offset = matrix_index * 8 + row
-                self.spi.write(bytearray([row + 1, self.buffer[byte_offset]]))
-            self.cs(1)
+            changed = False
+            # Farthest module first, so the last one written is nearest DIN
+            for k in range(n):
+                byte_offset = (n - 1 - k) * 8 + row
+                value = buffer[byte_offset]
+                if force or value != shadow[byte_offset]:
+                    shadow[byte_offset] = value
+                    tx[2 * k] = row + 1
+                    tx[2 * k + 1] = value
+                    changed = True
+                else:
+                    tx[2 * k] = self._NOOP
+                    tx[2 * k + 1] = 0
+            if changed:
+                self.cs(0)
+                self.spi.write(tx)
+                self.cs(1)
+                self.bytes_sent += len(tx)
+        self.shadow_valid = True
             
     def display_text(self, text):
         # Simplified text display (for menus)
@@ -158,303 +274,165 @@ class MAX7219Display:
         self.show()
 
 # ---------------------------------------------------------------
-# Game Logic
+# Display Drawing Function
 # ---------------------------------------------------------------
 
-class TetrisGame:
-    def __init__(self):
-        self.width = DISPLAY_WIDTH
-        self.height = DISPLAY_HEIGHT
-        self.grid = [[0 for _ in range(self.width)] for _ in range(self.height)]
-        self.score = 0
-        self.game_over = False
-        
-        self.p1 = self.Player(self, PLAYER_1_COLOR, self.width // 2 - 4)
-        self.p2 = self.Player(self, PLAYER_2_COLOR, self.width // 2 + 1)
-        
-        self.p1.next_shape = self.get_random_shape()
-        self.p2.next_shape = self.get_random_shape()
-        
-        self.spawn_new_pieces()
+# Reused every frame: board rows with pieces, and the same as a MONO_HLSB frame
+_display_rows = array('H', [0] * DISPLAY_HEIGHT)
+_display_frame = bytearray(DISPLAY_WIDTH // 8 * DISPLAY_HEIGHT)
+
+def render_frame(game):
+    """Board rows with pieces as a MONO_HLSB frame (reused buffer)."""
+    rows = game.display_rows(_display_rows)
+    frame = _display_frame
+    # 16 columns per row: high byte = left module, low byte = right module
+    for y in range(DISPLAY_HEIGHT):
+        row = rows[y]
+        frame[2 * y] = row >> 8
+        frame[2 * y + 1] = row & 0xFF
+    return frame
+
+def draw_game_to_display(display, game, animator=None):
+    """Draws the game board straight from the engine's row bitmasks,
+    with any running effects on top."""
+    frame = render_frame(game)
+    if animator:
+        animator.draw(frame)
+    display.blit(frame)
+    display.show()
 
-    def get_random_shape(self):
-        return random.choice(TETROMINO_KEYS)
-
-    def spawn_new_pieces(self):
-        self.p1.spawn(self.p1.next_shape)
-        self.p2.spawn(self.p2.next_shape)
-        
-        self.p1.next_shape = self.get_random_shape()
-        self.p2.next_shape = self.get_random_shape()
-        
-        # Check for immediate game over
-        if not self.p1.is_valid_position() or not self.p2.is_valid_position():
-            self.game_over = True
-
-    class Player:
-        def __init__(self, game, color, start_x):
-            self.game = game
-            self.color = color
-            self.start_x = start_x
-            self.shape = None
-            self.shape_key = ''
-            self.x = 0
-            self.y = 0
-            self.next_shape = ''
-            self.is_placed = False
-
-        def spawn(self, shape_key):
-            self.shape_key = shape_key
-            self.shape = TETROMINOES[shape_key]
-            self.x = self.start_x
-            self.y = 0 # Spawn at top
-            self.is_placed = False
-
-        def is_valid_position(self, shape=None, x=None, y=None):
-            shape = shape if shape is not None else self.shape
-            x = x if x is not None else self.x
-            y = y if y is not None else self.y
-            
-            for (px, py) in shape:
-                nx, ny = x + px, y + py
-                # Check bounds
-                if not (0 <= nx < self.game.width and 0 <= ny < self.game.height):
-                    return False
-                # Check for collision with static pieces
-                if self.game.grid[ny][nx] == STATIC_COLOR:
-                    return False
-                # Check for collision with *other* player's active piece
-                other_player = self.game.p2 if self.color == PLAYER_1_COLOR else self.game.p1
-                if not other_player.is_placed:
-                    for (opx, opy) in other_player.shape:
-                        if (other_player.x + opx == nx and other_player.y + opy == ny):
-                            return False
-            return True
-
-        def move(self, dx, dy):
-            if self.is_placed:
-                return False
-            if self.is_valid_position(x=self.x + dx, y=self.y + dy):
-                self.x += dx
-                self.y += dy
-                return True
+# ---------------------------------------------------------------
+# Animations
+# ---------------------------------------------------------------
+# Effects are small state machines stepped once per loop pass instead of
+# blocking with sleeps, so input is read and state is sent while they play.
+# Each effect draws on top of the frame rendered from the board.
+
+def frame_pixel(frame, x, y, on=True):
+    i = 2 * y + (x >> 3)
+    if on:
+        frame[i] |= 0x80 >> (x & 7)
+    else:
+        frame[i] &= ~(0x80 >> (x & 7))
+
+class Effect:
+    """A run of equal-length phases; `phases=None` repeats until stopped."""
+    def __init__(self, phase_ms, phases=None):
+        self.phase_ms = phase_ms
+        self.phases = phases
+        self.phase = 0
+        self.start_ms = 0
+        self.done = False
+
+    def start(self, now):
+        self.start_ms = now
+        self.phase = 0
+        self.done = False
+
+    def step(self, now):
+        """Move to the phase for `now`. Returns True if the picture changed."""
+        phase = time.ticks_diff(now, self.start_ms) // self.phase_ms
+        if phase == self.phase:
             return False
+        if self.phases is not None and phase >= self.phases:
+            self.done = True
+        self.phase = phase
+        return True
 
-        def rotate(self):
-            if self.is_placed or self.shape_key == 'O':
-                return
-            
-            # Simple rotation logic
-            pivot = self.shape[1] 
-            
-            new_shape = []
-            if self.shape_key == 'I':
-                pivot = (1, 1) # Use a conceptual pivot
-                for (px, py) in self.shape:
-                    new_shape.append((-(py - pivot[1]) + pivot[0], (px - pivot[0]) + pivot[1]))
-            else:
-                 for (px, py) in self.shape:
-                    new_shape.append((-(py - pivot[1]) + pivot[0], (px - pivot[0]) + pivot[1]))
-            
-            # "Wall kick"
-            if self.is_valid_position(shape=new_shape):
-                self.shape = new_shape
-            elif self.is_valid_position(shape=new_shape, x=self.x + 1):
-                self.shape = new_shape
-                self.x += 1
-            elif self.is_valid_position(shape=new_shape, x=self.x - 1):
-                self.shape = new_shape
-                self.x -= 1
-            elif self.is_valid_position(shape=new_shape, x=self.x + 2):
-                self.shape = new_shape
-                self.x += 2
-            elif self.is_valid_position(shape=new_shape, x=self.x - 2):
-                self.shape = new_shape
-                self.x -= 2
-
-
-    def step_gravity(self):
-        """Apply gravity to both players."""
-        if self.game_over:
-            return
+    def draw(self, frame):
+        pass
 
-        p1_can_move = True
-        p2_can_move = True
+    def finish(self):
+        """Called once when the last phase has ended."""
+        pass
 
-        if not self.p1.is_placed:
-            if not self.p1.move(0, 1):
-                p1_can_move = False
-                
-        if not self.p2.is_placed:
-            if not self.p2.move(0, 1):
-                p2_can_move = False
+class LineClearEffect(Effect):
+    """Flicker the cleared lines 3 times, then let the engine remove them."""
+    def __init__(self, game, lines):
+        super().__init__(100, 7)  # off/on x3, then on until 0.7 s
+        self.game = game
+        self.lines = lines
 
-        if not p1_can_move and not self.p1.is_placed:
-            self.place_piece(self.p1)
-            
-        if not p2_can_move and not self.p2.is_placed:
-            self.place_piece(self.p2)
-            
-        # Check if both players have placed their pieces
-        if self.p1.is_placed and self.p2.is_placed:
-            cleared_lines = self.check_for_lines()
-            if cleared_lines == 0:
-                self.spawn_new_pieces()
-            # If lines were cleared, flicker effect will happen
-            
-    def place_piece(self, player):
-        """Lock a player's piece into the grid."""
-        if player.is_placed:
-            return
-        player.is_placed = True
-        for (px, py) in player.shape:
-            nx, ny = player.x + px, player.y + py
-            if 0 <= ny < self.height and 0 <= nx < self.width:
-                self.grid[ny][nx] = STATIC_COLOR
-
-    def check_for_lines(self):
-        """Check for and clear completed lines."""
-        lines_to_clear = []
-        for y in range(self.height):
-            if all(self.grid[y][x] == STATIC_COLOR for x in range(self.width)):
-                lines_to_clear.append(y)
-        
-        if lines_to_clear:
-            self.score += len(lines_to_clear) ** 2 # Bonus
-            
-            # Return lines for flicker effect.
-            return lines_to_clear
-            
-        return 0
-        
-    def finish_line_clear(self, cleared_lines):
-        """Called after flicker, to remove lines and shift grid down."""
-        for y_to_clear in cleared_lines:
-            # Remove the cleared line
-            del self.grid[y_to_clear]
-            # Add a new empty line at the top
-            self.grid.insert(0, [0 for _ in range(self.width)])
-            
-        # After clearing, spawn new pieces
-        self.spawn_new_pieces()
+    def draw(self, frame):
+        if self.phase < 6 and not self.phase & 1:
+            for y in self.lines:
+                frame[2 * y] = 0
+                frame[2 * y + 1] = 0
 
+    def finish(self):
+        self.game.finish_line_clear(self.lines)
 
-    def handle_input(self, player_num, action):
-        if self.game_over:
-            return
-            
-        player = self.p1 if player_num == 1 else self.p2
-        
-        if player.is_placed: # Don't accept input if piece is placed
-            return
-            
-        if action == 'left':
-            player.move(-1, 0)
-        elif action == 'right':
-            player.move(1, 0)
-        elif action == 'down':
-            # Move down until it can't, then place
-            while player.move(0, 1):
-                pass
-            self.place_piece(player)
-        elif action == 'rotate':
-            player.rotate()
-            
-    def get_game_state(self, is_paused=False):
-        """Generate the full game state for the client."""
-        # Create a temporary grid with active pieces drawn on it
-        temp_grid = [row[:] for row in self.grid]
-        
-        # Draw P1
-        if not self.p1.is_placed:
-            for (px, py) in self.p1.shape:
-                nx, ny = self.p1.x + px, self.p1.y + py
-                if 0 <= ny < self.height and 0 <= nx < self.width:
-                    temp_grid[ny][nx] = self.p1.color
-
-        # Draw P2
-        if not self.p2.is_placed:
-            for (px, py) in self.p2.shape:
-                nx, ny = self.p2.x + px, self.p2.y + py
-                if 0 <= ny < self.height and 0 <= nx < self.width:
-                    temp_grid[ny][nx] = self.p2.color
-        
-        # Flatten grid
-        flat_grid = [cell for row in temp_grid for cell in row]
-        
-        state = {
-            "grid": flat_grid,
-            "score": self.score,
-            "p1_next": self.p1.next_shape,
-            "p2_next": self.p2.next_shape,
-            "game_over": self.game_over,
-            "paused": is_paused  # --- NEW ---
-        }
-        return ujson.dumps(state)
-        
-    def print_to_repl(self):
-        """Print a simple text version of the game to the REPL. (NO LONGER USED)"""
-        pass
+class PauseEffect(Effect):
+    """Blinking "P" on a blank screen until stopped."""
+    def __init__(self):
+        super().__init__(500)
 
-# ---------------------------------------------------------------
-# Display Drawing Function
-# ---------------------------------------------------------------
+    def draw(self, frame):
+        for i in range(len(frame)):
+            frame[i] = 0
+        if not self.phase & 1:
+            for (x, y) in ((1, 1), (1, 2), (1, 3), (2, 1), (3, 1), (2, 2)):
+                frame_pixel(frame, x, y)
 
-def draw_game_to_display(display, game_state_json):
-    """Draws the game state onto the MAX7219 display."""
-    try:
-        state = ujson.loads(game_state_json)
-        grid_flat = state["grid"]
-        
-        display.clear()
-        
-        for i in range(len(grid_flat)):
-            x = i % DISPLAY_WIDTH
-            y = i // DISPLAY_WIDTH
-            
-            # Draw any piece (active or static)
-            if grid_flat[i] != 0:
-                display.set_pixel(x, y, 1)
-                
-        display.show()
-    except Exception as e:
-        print("Error drawing to display:", e)
-
-def display_line_flicker(display, game, lines_to_clear):
-    """Flicker the cleared lines."""
-    for _ in range(3): # Flicker 3 times
-        # Turn lines off
-        for y in lines_to_clear:
-            for x in range(DISPLAY_WIDTH):
-                display.set_pixel(x, y, 0)
-        display.show()
-        time.sleep(0.1)
-        
-        # Turn lines on
-        for y in lines_to_clear:
-            for x in range(DISPLAY_WIDTH):
-                display.set_pixel(x, y, 1)
-        display.show()
-        time.sleep(0.1)
+class GameOverEffect(Effect):
+    """Fill the board from the bottom up, then hold it for the rest of 5 s."""
+    def __init__(self):
+        super().__init__(50, 100)
+
+    def step(self, now):
+        changed = super().step(now)
+        return changed and (self.done or self.phase <= DISPLAY_HEIGHT)
+
+    def draw(self, frame):
+        filled = min(self.phase + 1, DISPLAY_HEIGHT)
+        for y in range(DISPLAY_HEIGHT - filled, DISPLAY_HEIGHT):
+            frame[2 * y] = 0xFF
+            frame[2 * y + 1] = 0xFF
+
+class Animator:
+    """Runs the active effects, in start order (later ones draw on top)."""
+    def __init__(self):
+        self.effects = []
+
+    def start(self, effect):
+        effect.start(time.ticks_ms())
+        self.effects.append(effect)
+        return effect
+
+    def stop(self, effect):
+        if effect in self.effects:
+            self.effects.remove(effect)
+
+    def step(self, now):
+        """Step every effect; returns True if the display needs a redraw."""
+        changed = False
+        effects = self.effects
+        i = 0
+        while i < len(effects):
+            effect = effects[i]
+            if effect.step(now):
+                changed = True
+            if effect.done:
+                effects.pop(i)
+                effect.finish()
+            else:
+                i += 1
+        return changed
+
+    def draw(self, frame):
+        for effect in self.effects:
+            effect.draw(frame)
 
 # ---------------------------------------------------------------
 # Communication Handlers
 # ---------------------------------------------------------------
 
 # --- USB (STDIO) ---
-usb_poller = select.poll()
-usb_poller.register(sys.stdin, select.POLLIN)
-
-def check_usb_input():
-    """Check for non-blocking input from USB."""
-    if usb_poller.poll(0):
-        try:
-            char = sys.stdin.read(1)
-            if char:
-                return char
-        except Exception as e:
-            print("USB read error:", e)
-    return None
+# Input from either transport is drained into one ring per game and
+# applied in a single pass (see tetris_transport.py)
+input_ring = InputRing()
+usb_input = UsbInput(input_ring)
+trace_marks = TraceMarks() # Client latency marks, echoed in the next state
 
 def send_usb_message(message):
     """Send a message over USB (just print it)."""
@@ -506,21 +484,6 @@ def check_wifi_connection(server_socket):
         # No connection pending
         return None
 
-def check_wifi_input(client_socket):
-    """Check for non-blocking input from WiFi client."""
-    if client_socket:
-        try:
-            data = client_socket.recv(64) # Read up to 64 bytes
-            if data:
-                return data.decode('utf-8')
-            else:
-                # Client disconnected
-                return "DISCONNECTED"
-        except OSError as e:
-            # No data available
-            return None
-    return None
-
 def send_wifi_message(client_socket, message):
     """Send a message to the WiFi client."""
     if client_socket:
@@ -592,6 +555,19 @@ def wait_for_mode_selection(display):
 # Main Game Loop
 # ---------------------------------------------------------------
 
+def save_replay(replay, game):
+    """Write the match log to flash: at game over, or cut short when the
+    game is left early."""
+    if game.game_over:
+        replay.end(time.ticks_ms(), game)
+    if not REPLAY_FILE:
+        return
+    try:
+        replay.save(REPLAY_FILE)
+        print("Replay saved: {} ({} events)".format(REPLAY_FILE, replay.events))
+    except OSError as e:
+        print("Replay save failed:", e)
+
 def game_loop(mode, display):
     """
     The main game loop.
@@ -604,7 +580,16 @@ def game_loop(mode, display):
     is_paused = False
     
     last_tick_time = time.ticks_ms()
-    flicker_info = None # Stores (start_time, lines_to_clear)
+    replay = ReplayWriter(game.seed, last_tick_time) # Seed + timed events, see tetris_replay.py
+    animator = Animator()
+    line_clear = None # Running LineClearEffect, holds gravity
+    pause_effect = None
+    game_over_effect = None
+    dirty = True # Redraw and send state only when something changed
+    input_ring.clear() # Drop keys and stats left over from the last game
+    input_ring.reset_stats()
+    trace_marks.reset() # A mark cut off by RESTART must not swallow the next keys
+    stats_time = time.ticks_ms()
     
     # Comms setup
     server_socket = None
@@ -625,110 +610,128 @@ def game_loop(mode, display):
 
     while True:
         
-        # --- 1. Handle Flicker Effect ---
-        if flicker_info:
-            start_time, lines_to_clear = flicker_info
-            if time.ticks_diff(time.ticks_ms(), start_time) > 700: # 0.7s flicker
-                # Flicker finished, now clear lines and spawn
-                game.finish_line_clear(lines_to_clear)
-                flicker_info = None
+        # --- 1. Step Animations ---
+        if animator.step(time.ticks_ms()):
+            dirty = True
+        if line_clear and line_clear.done:
+            # Flicker finished, finish() cleared the lines and spawned
+            replay.clear(time.ticks_ms())
+            line_clear = None
+        if game_over_effect and game_over_effect.done:
+            # Clean up sockets and return
+            if client_socket: client_socket.close()
+            if server_socket: server_socket.close()
+            return "RESTART"
         
         # --- 2. Handle Gravity (Game Tick) ---
-        if not is_paused and not game.game_over and not flicker_info:
+        if not is_paused and not game.game_over and not line_clear:
             current_time = time.ticks_ms()
             if time.ticks_diff(current_time, last_tick_time) > (GAME_TICK_RATE * 1000):
                 last_tick_time = current_time
-                game.step_gravity()
-                
-                # Check if step resulted in line clear
-                lines_to_clear = game.check_for_lines()
+                dirty = True
+                # Returns the full lines if the step completed any
+                lines_to_clear = game.step_gravity()
+                replay.gravity(current_time, game)
                 if lines_to_clear:
                     # Start flicker effect
-                    flicker_info = (time.ticks_ms(), lines_to_clear)
-                    # Play flicker on display
-                    display_line_flicker(display, game, lines_to_clear)
+                    line_clear = animator.start(LineClearEffect(game, lines_to_clear))
 
+        if game.game_over and not game_over_effect:
+            print("Game Over! Final Score: {}".format(game.score))
+            save_replay(replay, game)
+            # PC client shows its message while the effect plays
+            game_over_effect = animator.start(GameOverEffect())
+            dirty = True
 
         # --- 3. Handle Inputs ---
-        raw_input_data = None
+        # Drain every pending byte, then apply all commands this pass
         if mode == "USB":
-            raw_input_data = check_usb_input()
+            usb_input.drain()
         
         elif mode == "WIFI":
             if not client_socket:
                 client_socket = check_wifi_connection(server_socket)
-            else:
-                raw_input_data = check_wifi_input(client_socket)
-                if raw_input_data == "DISCONNECTED":
-                    print("Client disconnected.")
-                    client_socket.close()
-                    client_socket = None
-                    raw_input_data = None
-
-        if raw_input_data:
-            # Process all chars in buffer
-            for char in raw_input_data:
-                if char in SYSTEM_INPUT_MAP:
-                    command = SYSTEM_INPUT_MAP[char]
-                    
-                    if command == "pause_toggle":
-                        is_paused = not is_paused
-                        print("Pause Toggled:", is_paused)
-                    
-                    elif is_paused:
-                        if command == "menu_resume":
-                            is_paused = False
-                        elif command == "menu_restart":
-                            print("Restarting game...")
-                            if client_socket: client_socket.close()
-                            if server_socket: server_socket.close()
-                            return "RESTART"
-                        elif command == "menu_main_menu":
-                            print("Returning to main menu...")
-                            if client_socket: client_socket.close()
-                            if server_socket: server_socket.close()
-                            return "MAIN_MENU"
-                            
-                elif char in PLAYER_INPUT_MAP:
-                    # Only process game input if not paused and not game over
-                    if not is_paused and not game.game_over:
-                        player_num, action = PLAYER_INPUT_MAP[char]
-                        game.handle_input(player_num, action)
-
-        # --- 4. Send State to Client ---
-        game_state_json = game.get_game_state(is_paused)
-        
-        if mode == "USB":
-            send_usb_message(game_state_json)
-        
-        elif mode == "WIFI" and client_socket:
-            if not send_wifi_message(client_socket, game_state_json):
-                # Send failed, client likely disconnected
+                if client_socket:
+                    wifi_input = SocketInput(input_ring, client_socket)
+                    dirty = True # Send the new client the current state
+            elif wifi_input.drain() < 0:
+                print("Client disconnected.")
                 client_socket.close()
                 client_socket = None
 
-        # --- 5. Draw to Pico Display ---
-        if is_paused:
-            display.display_text("PAUSE")
-        elif not flicker_info:
-            draw_game_to_display(display, game_state_json)
-
-        # --- 6. Print to REPL (REMOVED) ---
-        
-        # --- 7. Game Over ---
-        if game.game_over:
-            print("Game Over! Final Score: {}".format(game.score))
-            time.sleep(5) # PC client will show message
+        # Process all chars in the ring
+        while input_ring.count:
+            char = trace_marks.feed(chr(input_ring.get()), input_ring.last_stamp)
+            if char in SYSTEM_INPUT_MAP:
+                command = SYSTEM_INPUT_MAP[char]
+                
+                if command == "pause_toggle":
+                    is_paused = not is_paused
+                    replay.pause(time.ticks_ms())
+                    print("Pause Toggled:", is_paused)
+                    input_ring.applied()
+                    dirty = True
+                
+                elif is_paused:
+                    if command == "menu_resume":
+                        is_paused = False
+                        replay.pause(time.ticks_ms())
+                        dirty = True
+                    elif command == "menu_restart":
+                        print("Restarting game...")
+                        save_replay(replay, game)
+                        if client_socket: client_socket.close()
+                        if server_socket: server_socket.close()
+                        return "RESTART"
+                    elif command == "menu_main_menu":
+                        print("Returning to main menu...")
+                        save_replay(replay, game)
+                        if client_socket: client_socket.close()
+                        if server_socket: server_socket.close()
+                        return "MAIN_MENU"
+                        
+            elif char in PLAYER_INPUT_MAP:
+                # Only process game input if not paused and not game over
+                if not is_paused and not game.game_over:
+                    player_num, action = PLAYER_INPUT_MAP[char]
+                    game.handle_input(player_num, action)
+                    replay.key(time.ticks_ms(), player_num, action)
+                    input_ring.applied()
+                    dirty = True
+
+        if is_paused and not pause_effect:
+            pause_effect = animator.start(PauseEffect())
+        elif pause_effect and not is_paused:
+            animator.stop(pause_effect)
+            pause_effect = None
+
+        if INPUT_STATS_MS and time.ticks_diff(time.ticks_ms(), stats_time) >= INPUT_STATS_MS:
+            print(input_ring.report())
+            input_ring.reset_stats()
+            stats_time = time.ticks_ms()
+
+        if dirty:
+            dirty = False
+
+            # --- 4. Send State to Client ---
+            trace = trace_marks.take(time.ticks_us())
+            game_state_json = game.get_game_state(is_paused, trace)
             
-            # Clean up sockets and return
-            if client_socket: client_socket.close()
-            if server_socket: server_socket.close()
-            return "RESTART"
+            if mode == "USB":
+                send_usb_message(game_state_json)
+            
+            elif mode == "WIFI" and client_socket:
+                if not send_wifi_message(client_socket, game_state_json):
+                    # Send failed, client likely disconnected
+                    client_socket.close()
+                    client_socket = None
+
+            # --- 5. Draw to Pico Display (effects on top) ---
+            draw_game_to_display(display, game, animator)
 
         # Small delay to prevent 100% CPU
         time.sleep_ms(10)
 
-
 # ---------------------------------------------------------------
 # Entry Point
 # ---------------------------------------------------------------
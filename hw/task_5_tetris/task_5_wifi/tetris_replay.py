@@ -0,0 +1,236 @@
+# tetris_replay.py
+# Match logs: the seed of a game plus every event that changed it, with its
+# time, compact enough to keep in RAM on the Pico and save to flash at game
+# over. The engine is deterministic given the seed and the event order (see
+# tetris_engine.py), so replaying a log on the PC rebuilds the match exactly;
+# the time of each event shows where the Pico was slow. Shared by the
+# firmware and the PC tools; runs on MicroPython and CPython.
+#
+# Log (integers big-endian, varints unsigned LEB128):
+#   "TRL" | version:u8 | seed:u32 | events
+# Event: varint(dt << 4 | code), dt in ms since the previous event
+#   GRAVITY          step_gravity()
+#   CLEAR            finish_line_clear() of the lines the last step completed
+#   KEY + 0..7       handle_input(): player 1 rotate/left/down/right, then player 2
+#   PAUSE            pause toggle (timing only)
+#   CHECK, END       followed by varint(state_hash()); END closes the log
+#
+# A CHECK every `checkpoint_every` gravity steps narrows a desync down to a
+# few seconds of play. Over the transport a log travels as "REPLAY i/n hex"
+# text lines next to the frames (replay_lines(), ReplayReceiver).
+
+import binascii
+import time
+
+from tetris_engine import TetrisGame, TETROMINO_KEYS
+
+try:
+    ticks_diff = time.ticks_diff
+except AttributeError:  # CPython: plain millisecond counts
+    def ticks_diff(a, b):
+        return a - b
+
+MAGIC = b"TRL"
+VERSION = 1
+HEADER_SIZE = 8
+
+GRAVITY = 0
+CLEAR = 1
+KEY = 2  # KEY .. KEY + 7
+PAUSE = 10
+CHECK = 13
+END = 15
+
+ACTIONS = ('rotate', 'left', 'down', 'right')
+MAX_LOG = 32768  # bytes; later events are dropped and the log marked truncated
+LINE_BYTES = 96  # log bytes per REPLAY line (StateDecoder keeps 256 chars)
+
+# ---------------------------------------------------------------
+# State hash
+# ---------------------------------------------------------------
+
+_STATE = bytearray(64 + 4 + 1 + 2 + 8)
+
+def state_hash(game):
+    """CRC-32 of everything replay must reproduce: board, score, game
+    over, next shapes and active pieces."""
+    buf = _STATE
+    i = 0
+    for row in game.rows:
+        buf[i] = row >> 8
+        buf[i + 1] = row & 0xFF
+        i += 2
+    score = game.score
+    buf[i] = (score >> 24) & 0xFF
+    buf[i + 1] = (score >> 16) & 0xFF
+    buf[i + 2] = (score >> 8) & 0xFF
+    buf[i + 3] = score & 0xFF
+    buf[i + 4] = 1 if game.game_over else 0
+    i += 5
+    for player in (game.p1, game.p2):
+        buf[i] = TETROMINO_KEYS.index(player.next_shape) if player.next_shape else 0xFF
+        i += 1
+    for player in (game.p1, game.p2):
+        if player.is_placed:
+            buf[i] = 0xFF
+            buf[i + 1] = buf[i + 2] = buf[i + 3] = 0
+        else:
+            buf[i] = TETROMINO_KEYS.index(player.shape_key)
+            buf[i + 1] = player.rotation
+            buf[i + 2] = player.x & 0xFF
+            buf[i + 3] = player.y & 0xFF
+        i += 4
+    return binascii.crc32(buf) & 0xFFFFFFFF
+
+# ---------------------------------------------------------------
+# Recording (Pico side)
+# ---------------------------------------------------------------
+
+class ReplayWriter:
+    """Appends events of one game to self.data."""
+    def __init__(self, seed, now, checkpoint_every=32):
+        self.data = bytearray(MAGIC)
+        self.data.append(VERSION)
+        for shift in (24, 16, 8, 0):
+            self.data.append((seed >> shift) & 0xFF)
+        self.last = now
+        self.checkpoint_every = checkpoint_every
+        self.steps = 0
+        self.events = 0
+        self.truncated = False
+        self.ended = False
+
+    def _event(self, now, code, value=None):
+        if self.ended or self.truncated:
+            return
+        if len(self.data) > MAX_LOG:
+            self.truncated = True
+            return
+        dt = ticks_diff(now, self.last)
+        self.last = now
+        self._varint((max(0, dt) << 4) | code)
+        if value is not None:
+            self._varint(value)
+        self.events += 1
+
+    def _varint(self, n):
+        data = self.data
+        while n > 0x7F:
+            data.append((n & 0x7F) | 0x80)
+            n >>= 7
+        data.append(n)
+
+    def key(self, now, player, action):
+        self._event(now, KEY + 4 * (player - 1) + ACTIONS.index(action))
+
+    def pause(self, now):
+        self._event(now, PAUSE)
+
+    def gravity(self, now, game):
+        self._event(now, GRAVITY)
+        self.steps += 1
+        if self.checkpoint_every and self.steps % self.checkpoint_every == 0:
+            self._event(now, CHECK, state_hash(game))
+
+    def clear(self, now):
+        self._event(now, CLEAR)
+
+    def end(self, now, game):
+        self._event(now, END, state_hash(game))
+        self.ended = True
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.data)
+
+def replay_lines(data, width=LINE_BYTES):
+    """The log as "REPLAY i/n hex" text lines."""
+    n = (len(data) + width - 1) // width
+    return ["REPLAY %d/%d %s" % (i + 1, n, binascii.hexlify(data[i * width:(i + 1) * width]).decode())
+            for i in range(n)]
+
+# ---------------------------------------------------------------
+# Reading and replay (PC side)
+# ---------------------------------------------------------------
+
+class ReplayReceiver:
+    """Collects "REPLAY i/n hex" lines; feed() returns the log once complete."""
+    def __init__(self):
+        self.parts = []
+
+    def feed(self, line):
+        try:
+            _, part, payload = line.split(" ", 2)
+            index, count = part.split("/")
+            index, count = int(index), int(count)
+            payload = binascii.unhexlify(payload)
+        except ValueError:  # binascii.Error is one too
+            self.parts = []
+            return None
+        if index == 1:
+            self.parts = []
+        if index != len(self.parts) + 1:
+            self.parts = []  # Missed a line: wait for the next log
+            return None
+        self.parts.append(payload)
+        if index == count:
+            data, self.parts = b"".join(self.parts), []
+            return data
+        return None
+
+def read_log(data):
+    """(seed, events) of a log; events is a list of (t_ms, code, value)."""
+    if len(data) < HEADER_SIZE or data[:3] != MAGIC or data[3] != VERSION:
+        raise ValueError("not a version %d replay log" % VERSION)
+    seed = (data[4] << 24) | (data[5] << 16) | (data[6] << 8) | data[7]
+    events = []
+    t = 0
+    i = HEADER_SIZE
+    n = len(data)
+    while i < n:
+        word, i = _read_varint(data, i)
+        code = word & 0x0F
+        t += word >> 4
+        value = None
+        if code in (CHECK, END):
+            value, i = _read_varint(data, i)
+        events.append((t, code, value))
+    return seed, events
+
+def _read_varint(data, i):
+    n = shift = 0
+    while True:
+        if i >= len(data):
+            raise ValueError("log ends inside an event")
+        b = data[i]
+        i += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, i
+        shift += 7
+
+_KEY_ACTIONS = [(1 + k // 4, ACTIONS[k % 4]) for k in range(8)]
+
+def replay(seed, events):
+    """Play the events on TetrisGame(seed). Returns (game, checks, errors):
+    errors lists (event index, t_ms, expected, got) of hashes that differ."""
+    game = TetrisGame(seed)
+    lines = 0
+    checks = 0
+    errors = []
+    step_gravity, handle_input = game.step_gravity, game.handle_input
+    for i, (t, code, value) in enumerate(events):
+        if code == GRAVITY:
+            lines = step_gravity()
+        elif code == CLEAR:
+            if lines:
+                game.finish_line_clear(lines)
+                lines = 0
+        elif KEY <= code < KEY + 8:
+            handle_input(*_KEY_ACTIONS[code - KEY])
+        elif code == CHECK or code == END:
+            checks += 1
+            got = state_hash(game)
+            if got != value:
+                errors.append((i, t, value, got))
+    return game, checks, errors
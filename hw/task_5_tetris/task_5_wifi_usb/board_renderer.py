@@ -0,0 +1,79 @@
+# board_renderer.py
+# Dirty-rect Tetris board drawing for the pygame clients.
+#
+# The background (empty cells, grid lines, frame) is drawn once into a
+# cached surface and each color is a pre-filled block sprite. draw() only
+# blits the cells whose color changed since the last call and returns their
+# rects for pygame.display.update(), instead of clearing the screen and
+# drawing up to 512 rects per frame. Several renderers can share one window
+# (e.g. spectating more than one board) by giving each its own origin.
+
+import pygame
+
+
+class BoardRenderer:
+    def __init__(self, surface, colors, bg_color, origin=(0, 0), cols=16, rows=32,
+                 block=20, border=1, grid_color=None, frame_color=None):
+        self.surface = surface
+        self.cols, self.rows = cols, rows
+        self.pitch = block + border
+        width = self.pitch * cols + border
+        height = self.pitch * rows + border
+        self.rect = pygame.Rect(origin[0], origin[1], width, height)
+
+        # Cached background: empty board with its grid lines and frame
+        self.background = pygame.Surface((width, height)).convert()
+        self.background.fill(bg_color)
+        if grid_color:
+            for x in range(cols + 1):
+                pygame.draw.line(self.background, grid_color, (x * self.pitch, 0), (x * self.pitch, height))
+            for y in range(rows + 1):
+                pygame.draw.line(self.background, grid_color, (0, y * self.pitch), (width, y * self.pitch))
+        if frame_color:
+            pygame.draw.rect(self.background, frame_color, (0, 0, width, height), 2)
+
+        # One sprite per color; color 0 (empty) is copied from the background
+        self.sprites = {}
+        for value, color in colors.items():
+            if value:
+                sprite = pygame.Surface((block, block)).convert()
+                sprite.fill(color)
+                self.sprites[value] = sprite
+
+        # Screen rect of every cell and the matching rect in the background
+        self.cell_rects = []
+        self.bg_rects = []
+        for i in range(cols * rows):
+            x = (i % cols) * self.pitch + border
+            y = (i // cols) * self.pitch + border
+            self.bg_rects.append(pygame.Rect(x, y, block, block))
+            self.cell_rects.append(pygame.Rect(origin[0] + x, origin[1] + y, block, block))
+
+        self.drawn = None  # Colors on screen, None = redraw everything
+        self.rects_updated = 0
+
+    def invalidate(self):
+        """Redraw the whole board next time (after an overlay, resize, ...)."""
+        self.drawn = None
+
+    def draw(self, grid):
+        """Bring the board on screen up to `grid`. Returns the changed rects."""
+        surface, sprites = self.surface, self.sprites
+        if self.drawn is None:
+            surface.blit(self.background, self.rect)
+            self.drawn = [0] * (self.cols * self.rows)
+            dirty = [self.rect]
+        else:
+            dirty = []
+        drawn, cell_rects = self.drawn, self.cell_rects
+        for i, value in enumerate(grid):
+            if value != drawn[i]:
+                sprite = sprites.get(value)
+                if sprite is None:
+                    surface.blit(self.background, cell_rects[i], self.bg_rects[i])
+                else:
+                    surface.blit(sprite, cell_rects[i])
+                drawn[i] = value
+                dirty.append(cell_rects[i])
+        self.rects_updated += len(dirty)
+        return dirty
@@ -0,0 +1,181 @@
+# link_bench.py
+# CPU use and state-delivery latency of the PC client transports against
+# the stand-in Pico (pico_standin.py) on this machine: the asyncio link
+# (pico_link.py) vs replicas of the old polling threads (serial: spin on
+# in_waiting; TCP: 0.1 s recv timeout, one message handed over per recv).
+#
+#   python link_bench.py --seconds 5 --bot 0.5
+#
+# Latency is from the stand-in writing a frame to the GUI loop (60 Hz, as in
+# the client) picking it up. CPU is for the whole process, stand-in included.
+
+import argparse
+import asyncio
+import queue
+import socket
+import statistics
+import threading
+import time
+
+import serial
+
+import pico_standin
+from pico_link import PicoLink
+from tetris_proto import StateDecoder, encode_ack
+
+PORT = 18461
+
+
+class OldSerialThread(threading.Thread):
+    # The USBThread loop before pico_link: no sleep between in_waiting checks
+    def __init__(self, port):
+        super().__init__(daemon=True)
+        self.ser = serial.Serial(port, 115200, timeout=1)
+        self.decoder = StateDecoder()
+        self.q = queue.Queue()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            if self.ser.in_waiting:
+                for state in self.decoder.feed(self.ser.read(self.ser.in_waiting)):
+                    self.q.put(state)
+                    self.ser.write(encode_ack(state["seq"]).encode())
+
+    def get_all(self):
+        out = []
+        while not self.q.empty():
+            out.append(self.q.get())
+        return out
+
+    def close(self):
+        self.running = False
+        self.join(timeout=1)
+        self.ser.close()
+
+
+class OldTcpThread(threading.Thread):
+    # The WiFiThread loop before pico_link: 0.1 s timeouts, one message per recv()
+    def __init__(self, port):
+        super().__init__(daemon=True)
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+        self.sock.settimeout(0.1)
+        self.decoder = StateDecoder()
+        self.backlog = []
+        self.q = queue.Queue()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                self.backlog += self.decoder.feed(self.sock.recv(1024))
+            except socket.timeout:
+                pass
+            except OSError:
+                break
+            if self.backlog:
+                state = self.backlog.pop(0)
+                self.q.put(state)
+                self.sock.sendall(encode_ack(state["seq"]).encode())
+
+    get_all = OldSerialThread.get_all
+
+    def close(self):
+        self.running = False
+        self.join(timeout=1)
+        self.sock.close()
+
+
+def start_standin(kind, bot, seconds):
+    """Stand-in server on its own loop thread. Returns (target, standins)."""
+    standins = []
+    ready = threading.Event()
+    target = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        if kind == "serial":
+            master, path = pico_standin.open_pty()
+            target["port"] = path
+            standin = pico_standin.StandIn(lambda b: _write_all(master, b), bot)
+            standins.append(standin)
+            loop.add_reader(master, lambda: standin.feed(_read(master)))
+            ready.set()
+            loop.run_until_complete(standin.run(seconds))
+        else:
+            loop.run_until_complete(pico_standin.serve_tcp(
+                PORT, bot, 0, seconds, lambda server: ready.set(), standins))
+        loop.close()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return target.get("port"), standins
+
+
+def _write_all(fd, data):
+    import os
+    while data:
+        try:
+            data = data[os.write(fd, data):]
+        except BlockingIOError:
+            time.sleep(0.001)
+
+
+def _read(fd):
+    import os
+    try:
+        return os.read(fd, 256)
+    except OSError:
+        return b""
+
+
+def measure(name, kind, seconds, bot):
+    port, standins = start_standin(kind, bot, seconds + 1)
+    if name == "asyncio":
+        link = PicoLink("usb", [port]) if kind == "serial" else PicoLink("wifi", ("127.0.0.1", PORT))
+        link.start()
+    elif kind == "serial":
+        link = OldSerialThread(port)
+        link.start()
+    else:
+        link = OldTcpThread(PORT)
+        link.start()
+
+    latencies = []
+    cpu = time.process_time()
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        now = time.perf_counter()
+        for state in link.get_all():
+            if "seq" in state and standins:
+                sent = standins[0].sent_at.get(state["seq"])
+                if sent:
+                    latencies.append(now - sent)
+        time.sleep(1 / 60)  # GUI frame
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - start
+    link.close()
+    frames = standins[0].frames if standins else 0
+    time.sleep(1.2)  # let the stand-in finish before the next run
+    return name, kind, frames, len(latencies), cpu / wall, latencies
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare PC client transports against the stand-in Pico")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--bot", type=float, default=0.5, help="stand-in bot keys per loop pass (traffic)")
+    args = ap.parse_args()
+
+    print(f"{'link':10} {'via':6} {'sent':>6} {'got':>6} {'cpu':>6} {'lat avg':>9} {'lat p95':>9} {'lat max':>9}")
+    for kind in ("serial", "tcp"):
+        for name in ("old", "asyncio"):
+            name, kind, sent, got, cpu, lat = measure(name, kind, args.seconds, args.bot)
+            lat = sorted(lat) or [0]
+            p95 = lat[int(len(lat) * 0.95) - 1] if len(lat) > 1 else lat[0]
+            print(f"{name:10} {kind:6} {sent:6} {got:6} {cpu:6.0%} {statistics.mean(lat) * 1e3:7.1f}ms"
+                  f" {p95 * 1e3:7.1f}ms {lat[-1] * 1e3:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
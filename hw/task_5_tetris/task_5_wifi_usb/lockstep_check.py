@@ -0,0 +1,255 @@
+# lockstep_check.py
+# Checks that the PC side follows the Pico's game exactly: the shared engine
+# is deterministic from seed + input log, match logs (tetris_replay.py)
+# replay to the same state, frames carry everything needed to rebuild it,
+# and client-side prediction (tetris_predict.py) agrees with the Pico.
+# Exits non-zero on any failure.
+#
+# Engine, replay and frame checks alternate random-key games with games by
+# tetris_sim's PlacingBot, which stacks flat and clears lines, so the clear
+# and scoring paths are covered too.
+#
+#   python lockstep_check.py --games 20 --seed 1
+#
+# The prediction check runs the unified firmware's loop (pico_standin's
+# StandIn logic: 10 ms passes, keys + trace marks in, dirty-gated frames
+# out) and a client in one process over a link delayed by N passes each
+# way, with bots on both players' keys.
+
+import argparse
+import random
+import sys
+
+from tetris_engine import TetrisGame, ShapeRng, GRAVITY, run_log, TETROMINO_KEYS
+from tetris_proto import StateEncoder, StateDecoder
+from tetris_transport import TraceMarks
+from tetris_predict import Predictor
+from tetris_replay import ReplayWriter, read_log, replay, CLEAR
+from tetris_sim import PlacingBot
+
+KEYS = {'w': (1, 'rotate'), 'a': (1, 'left'), 's': (1, 'down'), 'd': (1, 'right'),
+        'u': (2, 'rotate'), 'l': (2, 'left'), 'n': (2, 'down'), 'r': (2, 'right')}
+BOT_KEYS = "wadwadsulrulrn"
+GRAVITY_PASSES = 50  # 500 ms at 10 ms per pass
+
+# Pieces for seed 1: a change here breaks replays of logs recorded on a Pico
+SEED_1_SHAPES = "IZTLZJOIZJ"
+
+failures = []
+
+
+def check(ok, what):
+    if not ok:
+        failures.append(what)
+        print("FAIL", what)
+
+
+def game_hash(game):
+    return hash((tuple(game.rows), game.piece_states(), game.score, game.game_over,
+                 game.p1.next_shape, game.p2.next_shape))
+
+
+def bot_log(seed, steps):
+    bot = random.Random(seed)
+    log = []
+    for i in range(steps):
+        if i % 4 == 3:
+            log.append((GRAVITY, None))
+        else:
+            log.append(KEYS[bot.choice(BOT_KEYS)])
+    return log
+
+
+def placing_log(seed, steps):
+    # Bots that stack flat, so the log clears lines (random keys never do)
+    game = TetrisGame(seed)
+    bots = (PlacingBot(game, 1), PlacingBot(game, 2))
+    log = []
+    for i in range(steps):
+        if i % 4 == 3:
+            log.append((GRAVITY, None))
+            run_log(None, log[-1:], game)
+        else:
+            player = 1 + i % 2
+            action = bots[player - 1].act()
+            if action:
+                log.append((player, action))
+                game.handle_input(player, action)
+        if game.game_over:
+            break
+    return log
+
+
+def game_log(seed, g, steps):
+    # Odd games use the placing bots, even ones random keys
+    return placing_log(seed + g, steps) if g % 2 else bot_log(seed + g, steps)
+
+
+def check_engine(games, seed):
+    rng = ShapeRng(1)
+    shapes = "".join(rng.next_shape() for _ in range(len(SEED_1_SHAPES)))
+    check(shapes == SEED_1_SHAPES, "ShapeRng(1) gives %s, expected %s" % (shapes, SEED_1_SHAPES))
+    check(ShapeRng(0).next_shape() in TETROMINO_KEYS, "ShapeRng(0) is stuck")
+
+    scores = 0
+    for g in range(games):
+        log = game_log(seed, g, 2000)
+        a = run_log(seed + g, log)
+        scores += a.score
+        b = run_log(seed + g, log)
+        check(game_hash(a) == game_hash(b), "game %d: replay differs" % g)
+        # Replaying in two halves on the same game is the same as in one go
+        c = run_log(seed + g, log[:1000])
+        run_log(None, log[1000:], c)
+        check(game_hash(a) == game_hash(c), "game %d: split replay differs" % g)
+    check(games < 2 or scores > 0, "no engine game cleared a line")
+    print("engine: %d games, total score %d" % (games, scores))
+
+
+def check_replay(games, seed):
+    clears = 0
+    for g in range(games):
+        game = TetrisGame(seed + g)
+        writer = ReplayWriter(game.seed, 0, checkpoint_every=8)
+        for i, (player, action) in enumerate(game_log(seed, g, 2000)):
+            now = i * 37  # Times just have to survive the trip
+            if player == GRAVITY:
+                lines = game.step_gravity()
+                writer.gravity(now, game)
+                if lines:
+                    game.finish_line_clear(lines)
+                    writer.clear(now)
+            else:
+                game.handle_input(player, action)
+                writer.key(now, player, action)
+            if game.game_over:
+                break
+        writer.end(now, game)
+        log_seed, events = read_log(bytes(writer.data))
+        replayed, checks, errors = replay(log_seed, events)
+        check(not errors and checks > 1 and game_hash(replayed) == game_hash(game),
+              "game %d: replay log desyncs (%d of %d hashes)" % (g, len(errors), checks))
+        check(events[-1][0] == now, "game %d: event times do not round-trip" % g)
+        clears += sum(1 for e in events if e[1] == CLEAR)
+    check(games < 2 or clears > 0, "no replay log has a CLEAR event")
+    print("replay: %d logs, %d line clears" % (games, clears))
+
+
+def check_frames(games, seed):
+    for g in range(games):
+        game = TetrisGame(seed + g)
+        encoder, decoder = StateEncoder(), StateDecoder()
+        for i, (player, action) in enumerate(game_log(seed, g, 500)):
+            run_log(None, [(player, action)], game)
+            state = decoder.feed(bytes(encoder.encode(game, trace=(i, 0))))[0]
+            encoder.ack(state["seq"])
+            if state["grid"] != game.cell_grid() or state["pieces"] != game.piece_states():
+                check(False, "game %d step %d: frame does not round-trip" % (g, i))
+                break
+            if game.game_over:
+                break
+
+
+def run_link(seed, delay, passes, key_rate):
+    """Firmware loop and predicting client over a link of `delay` passes."""
+    game = TetrisGame(seed)
+    encoder, marks, reader = StateEncoder(), TraceMarks(), StateDecoder()
+    predictor = Predictor()
+    bot = random.Random(seed ^ 0x5EED)
+    to_pico = [b""] * (delay + 1)  # Keys sent in a pass arrive the next one at best
+    to_client = [b""] * delay
+    next_id = 0
+    shown_ok = True
+    for n in range(passes):
+        # --- Pico pass ---
+        dirty = False
+        for ch in to_pico.pop(0).decode():
+            ch = marks.feed(ch, n)
+            if ch in KEYS:
+                game.handle_input(*KEYS[ch])
+                dirty = True
+        if n % GRAVITY_PASSES == 0:
+            lines = game.step_gravity()
+            if lines:
+                game.finish_line_clear(lines)
+            dirty = True
+        out = bytes(encoder.encode(game, False, marks.take(n))) if dirty else b""
+        if game.game_over:
+            break
+        to_client.append(out)
+
+        # --- Client pass ---
+        sent = ""
+        frames = reader.split(to_client.pop(0))
+        for frame in frames:
+            state = reader.decode(frame)
+            if state["trace"]:
+                predictor.echo(state["trace"][0])
+        if frames:
+            predictor.frame(state)
+            encoder.ack(state["seq"])
+            # Nothing in flight: the view must be exactly the Pico's
+            if not predictor.pending and predictor.grid != state["grid"]:
+                shown_ok = False
+        if bot.random() < key_rate:
+            ch = bot.choice(BOT_KEYS)
+            next_id = (next_id + 1) & 0xFFFF
+            sent += ch + "!%04x" % next_id
+            predictor.input(next_id, *KEYS[ch])
+        to_pico.append(sent.encode())
+    return predictor, shown_ok
+
+
+def check_echo():
+    # The client marks 'p' (and keys sent with prediction off) without
+    # telling the predictor; an echo of such a mark still confirms every
+    # input sent before it, across the 16-bit wrap of mark ids too
+    game = TetrisGame(1)
+    state = StateDecoder().feed(bytes(StateEncoder().encode(game)))[0]
+    for first in (1, 0xFFFF):
+        predictor = Predictor()
+        predictor.frame(state)
+        predictor.input(first, 1, 'left')
+        pause_id = (first + 1) & 0xFFFF  # 'p' sent next, not predicted
+        predictor.echo(pause_id)
+        check(not predictor.pending, "echo of unpredicted mark %04x left %s pending" % (pause_id, predictor.pending))
+        check(predictor.frame(state) == state["grid"], "view after echo of %04x is not the Pico's" % pause_id)
+
+
+def check_prediction(games, seed, delays, passes, key_rate):
+    print("%-7s %8s %8s %10s %9s" % ("delay", "inputs", "checked", "mismatches", "rate"))
+    for delay in delays:
+        predicted = checked = mismatches = 0
+        for g in range(games):
+            p, shown_ok = run_link(seed + g, delay, passes, key_rate)
+            predicted += p.predicted
+            checked += p.checked
+            mismatches += p.mismatches
+            check(shown_ok, "delay %d game %d: settled view differs from the Pico's" % (delay, g))
+        if delay == 0:
+            check(mismatches == 0, "no delay but %d mismatches" % mismatches)
+        print("%-7s %8d %8d %10d %8.1f%%" % ("%d ms" % (delay * 10), predicted, checked, mismatches,
+                                           100.0 * mismatches / max(1, checked)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check engine / frame / prediction lockstep")
+    ap.add_argument("--games", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--passes", type=int, default=3000, help="10 ms loop passes per linked game")
+    ap.add_argument("--key-rate", type=float, default=0.1, help="chance per pass of a key")
+    args = ap.parse_args()
+
+    check_engine(args.games, args.seed)
+    check_replay(args.games, args.seed)
+    check_frames(args.games, args.seed)
+    check_echo()
+    check_prediction(args.games, args.seed, (0, 1, 3, 5, 10), args.passes, args.key_rate)
+    if failures:
+        print("%d check(s) failed" % len(failures))
+        sys.exit(1)
+    print("all lockstep checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,20 +5,23 @@
 # 1. USB serial connection (primary)
 # 2. Wi-Fi fallback
 # 3. Manual Wi-Fi credentials entry
+# The connection itself runs on asyncio in pico_link.py.
+# Match logs the Pico sends at game over are saved as replay_<seed>.trl
+# (check them with replay_tool.py).
 #
 # Requirements:
 #   pip install pygame pyserial
 # ---------------------------------------------------------------
 
 import pygame
-import socket
-import serial
 import sys
-import json
-import threading
-import queue
 import time
 
+from pico_link import PicoLink
+from board_renderer import BoardRenderer
+from latency_trace import LatencyTrace
+from tetris_predict import Predictor
+
 # ---------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------
@@ -46,6 +49,9 @@ COLOR_BG = (10, 10, 10)
 COLOR_ERROR = (120, 0, 0)
 COLOR_OK = (0, 150, 0)
 COLOR_MAP = {0: COLOR_BG, 1: COLOR_P1, 2: COLOR_P2, 3: COLOR_STATIC}
+# Key commands as the Pico applies them, for client-side prediction
+PLAYER_KEYS = {'w':(1,'rotate'),'a':(1,'left'),'s':(1,'down'),'d':(1,'right'),
+               'u':(2,'rotate'),'l':(2,'left'),'n':(2,'down'),'r':(2,'right')}
 
 TETROMINOES = {
     'O': [(0,0),(1,0),(0,1),(1,1)],
@@ -57,116 +63,10 @@ TETROMINOES = {
     'T': [(1,1),(0,1),(2,1),(1,0)]
 }
 
-# ---------------------------------------------------------------
-# Communication Threads
-# ---------------------------------------------------------------
-class USBThread(threading.Thread):
-    """Handles serial USB communication."""
-    def __init__(self, in_q, out_q):
-        super().__init__(daemon=True)
-        self.in_q, self.out_q = in_q, out_q
-        self.ser = None
-        self.running = True
-
-    def connect(self):
-        for port in USB_PORTS:
-            try:
-                self.ser = serial.Serial(port, 115200, timeout=1)
-                print(f"Connected via USB: {port}")
-                return True
-            except serial.SerialException:
-                continue
-        return False
-
-    def run(self):
-        if not self.connect():
-            self.in_q.put({"error": "USB_FAILED"})
-            return
-
-        while self.running:
-            try:
-                # Read data
-                if self.ser.in_waiting:
-                    line = self.ser.readline().decode("utf-8").strip()
-                    if not line:
-                        continue
-                    if line in ["USB_FAILED", "WIFI_FAILED"]:
-                        self.in_q.put({"error": line})
-                    else:
-                        try:
-                            js = json.loads(line)
-                            self.in_q.put(js)
-                        except json.JSONDecodeError:
-                            print("Pico debug:", line)
-            except Exception as e:
-                print("USB error:", e)
-                self.in_q.put({"error": "USB_FAILED"})
-                break
-            # Send queued inputs
-            try:
-                while not self.out_q.empty():
-                    msg = self.out_q.get_nowait()
-                    self.ser.write(msg.encode("utf-8"))
-            except Exception:
-                pass
-        if self.ser:
-            self.ser.close()
-        print("USBThread stopped.")
-
-class WiFiThread(threading.Thread):
-    """Handles Wi-Fi TCP communication."""
-    def __init__(self, ip, port, in_q, out_q):
-        super().__init__(daemon=True)
-        self.ip, self.port = ip, port
-        self.in_q, self.out_q = in_q, out_q
-        self.sock = None
-        self.running = True
-
-    def connect(self):
-        try:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.settimeout(5)
-            self.sock.connect((self.ip, self.port))
-            self.sock.settimeout(0.1)
-            print(f"Wi-Fi connected: {self.ip}:{self.port}")
-            return True
-        except Exception as e:
-            print("Wi-Fi connection failed:", e)
-            return False
-
-    def run(self):
-        if not self.connect():
-            self.in_q.put({"error": "WIFI_FAILED"})
-            return
-        buffer = ""
-        while self.running:
-            try:
-                while not self.out_q.empty():
-                    msg = self.out_q.get_nowait()
-                    self.sock.sendall(msg.encode("utf-8"))
-            except Exception:
-                break
-            try:
-                data = self.sock.recv(1024).decode("utf-8")
-                buffer += data
-                if "\n" in buffer:
-                    line, buffer = buffer.split("\n", 1)
-                    line = line.strip()
-                    if line in ["USB_FAILED", "WIFI_FAILED"]:
-                        self.in_q.put({"error": line})
-                        continue
-                    try:
-                        js = json.loads(line)
-                        self.in_q.put(js)
-                    except json.JSONDecodeError:
-                        print("Pico debug:", line)
-            except socket.timeout:
-                pass
-            except Exception:
-                break
-        if self.sock:
-            self.sock.close()
-        print("Wi-Fi thread stopped.")
+def save_replay(log):
+    path="replay_%08x.trl"%int.from_bytes(log[4:8],"big")  # header: "TRL", version, seed
+    with open(path,"wb") as f: f.write(log)
+    return path
 
 # ---------------------------------------------------------------
 # Main GUI
@@ -179,18 +79,30 @@ class TetrisClient:
         self.font_big = pygame.font.SysFont(None, 50)
         self.font_med = pygame.font.SysFont(None, 30)
         self.font_small = pygame.font.SysFont(None, 22)
+        self.font_mono = pygame.font.SysFont("monospace", 13)
         self.clock = pygame.time.Clock()
 
         self.state = {"grid":[0]*(GRID_WIDTH*GRID_HEIGHT),"score":0,"p1_next":"","p2_next":"","paused":False,"game_over":False}
-        self.in_q, self.out_q = queue.Queue(), queue.Queue()
         self.comm = None
         self.error = None
+        self.board = BoardRenderer(self.screen, COLOR_MAP, COLOR_BG, cols=GRID_WIDTH, rows=GRID_HEIGHT,
+                                   block=BLOCK_SIZE, border=BORDER_SIZE)
+        self.drawn_state = None
+        self.score_rect = None
+        self.predict = None
+        self.predicting = True    # F5: draw local moves before the Pico confirms them
+        self.grid = self.state["grid"]  # Drawn board: the Pico's, or predicted
+        self.drawn_grid = None
+        self.trace = None
+        self.show_trace = False   # F3: latency overlay, F4: latency CSV
+        self.trace_key = None
+        self.trace_rect = None
         self.phase = "usb_try"   # usb_try → wifi_try → wifi_manual → game
 
     # ---------- GUI Phases ----------
     def usb_phase(self):
         """Try USB connection first."""
-        self.comm = USBThread(self.in_q, self.out_q)
+        self.comm = PicoLink("usb", USB_PORTS)
         self.comm.start()
         start = time.time()
         while time.time()-start < 3:
@@ -201,17 +113,19 @@ class TetrisClient:
             self.draw_text("Connecting via USB...", COLOR_WHITE, WINDOW_WIDTH//2, WINDOW_HEIGHT//2)
             pygame.display.flip()
             self.clock.tick(30)
-            while not self.in_q.empty():
-                msg = self.in_q.get()
-                if "error" in msg and msg["error"] == "USB_FAILED":
-                    self.phase = "wifi_try"
-                    return
+            if self.comm.error == "USB_FAILED":
+                self.phase = "wifi_try"
+                return
+            if self.comm.connected and self.comm.frames_in:
+                self.phase = "game"
+                return
         # timeout
+        self.comm.close()
         self.phase = "wifi_try"
 
     def wifi_phase(self):
         """Try connecting over Wi-Fi."""
-        self.comm = WiFiThread(DEFAULT_PICO_IP, PICO_PORT, self.in_q, self.out_q)
+        self.comm = PicoLink("wifi", (DEFAULT_PICO_IP, PICO_PORT))
         self.comm.start()
         start = time.time()
         while time.time()-start < 4:
@@ -222,11 +136,11 @@ class TetrisClient:
             self.draw_text("Connecting via Wi-Fi...", COLOR_WHITE, WINDOW_WIDTH//2, WINDOW_HEIGHT//2)
             pygame.display.flip()
             self.clock.tick(30)
-            while not self.in_q.empty():
-                msg = self.in_q.get()
-                if "error" in msg and msg["error"] == "WIFI_FAILED":
-                    self.phase = "wifi_manual"
-                    return
+            if self.comm.error == "WIFI_FAILED":
+                self.phase = "wifi_manual"
+                return
+            if self.comm.connected:
+                break
         # success (if no fail)
         self.phase = "game"
 
@@ -244,11 +158,8 @@ class TetrisClient:
                     elif e.key == pygame.K_RETURN:
                         # Send credentials
                         cred_msg = f"SSID={ssid},PASS={password}\n"
-                        try:
-                            if self.comm and self.comm.sock:
-                                self.comm.sock.sendall(cred_msg.encode())
-                        except Exception:
-                            pass
+                        if self.comm and self.comm.connected:
+                            self.comm.send(cred_msg)
                         self.phase = "wifi_try"
                         return
                     elif e.key == pygame.K_BACKSPACE:
@@ -270,17 +181,29 @@ class TetrisClient:
     # ---------- Game Phase ----------
     def game_phase(self):
         running=True
+        self.drawn_state=None  # The connect screens drew over everything
+        self.trace=LatencyTrace(f"unified-{self.comm.kind}")
+        self.predict=Predictor()
         while running:
             for e in pygame.event.get():
                 if e.type==pygame.QUIT: running=False
                 if e.type==pygame.KEYDOWN: self.key(e.key)
-            while not self.in_q.empty():
-                msg=self.in_q.get()
+                if e.type==pygame.VIDEOEXPOSE: self.drawn_state=None
+            for msg in self.comm.get_all():
                 if "error" in msg:
                     self.error=msg["error"]; running=False
-                else: self.state=msg
+                elif "grid" in msg: self.state=msg; self.grid=self.predict.frame(msg)
+                elif "trace" in msg:
+                    self.trace.echo(msg["trace"],msg["received"]); self.predict.echo(msg["trace"][0])
+                elif "replay" in msg: print("Replay saved:",save_replay(msg["replay"]))
             self.draw_game()
+            self.trace.shown()  # This pass drew the state that carried any echo above
+            self.draw_trace()
             self.clock.tick(60)
+        self.comm.close()
+        c=self.comm; print(f"Link: {c.frames_in} frames, {c.decoded} decoded, {c.mailbox.dropped} superseded")
+        if self.trace.count(): print(self.trace.summary())
+        print(self.predict.report())
         self.phase="wifi_try" if self.error=="WIFI_FAILED" else "usb_try"
 
     # ---------- Drawing ----------
@@ -290,23 +213,44 @@ class TetrisClient:
         self.screen.blit(surf,rect)
 
     def draw_game(self):
-        self.screen.fill(COLOR_BG)
-        grid=self.state["grid"]
-        for i,v in enumerate(grid):
-            if v:
-                x=i%GRID_WIDTH; y=i//GRID_HEIGHT
-                pygame.draw.rect(self.screen,COLOR_MAP[v],
-                    ((BLOCK_SIZE+BORDER_SIZE)*(i%GRID_WIDTH)+BORDER_SIZE,
-                     (BLOCK_SIZE+BORDER_SIZE)*(i//GRID_WIDTH)+BORDER_SIZE,
-                     BLOCK_SIZE,BLOCK_SIZE))
-        self.draw_text(f"Score: {self.state['score']}",COLOR_WHITE,WINDOW_WIDTH-120,80)
-        pygame.display.flip()
+        # Only cells that changed since the last frame, and the score when it changes
+        state=self.state
+        if state is self.drawn_state and self.grid is self.drawn_grid: return
+        if self.drawn_state is None:
+            self.screen.fill(COLOR_BG); self.board.invalidate(); pygame.display.flip()
+            self.trace_key=self.trace_rect=None
+        rects=self.board.draw(self.grid)
+        if self.drawn_state is None or state["score"]!=self.drawn_state["score"]:
+            if self.score_rect: self.screen.fill(COLOR_BG,self.score_rect); rects.append(self.score_rect)
+            surf=self.font_med.render(f"Score: {state['score']}",True,COLOR_WHITE)
+            self.score_rect=surf.get_rect(center=(WINDOW_WIDTH-120,80))
+            self.screen.blit(surf,self.score_rect); rects.append(self.score_rect)
+        self.drawn_state=state; self.drawn_grid=self.grid
+        if rects: pygame.display.update(rects)
+
+    def draw_trace(self):
+        # Latency overlay at the bottom of the info panel, redrawn when a sample comes in
+        key=(self.show_trace,self.trace.count())
+        if key==self.trace_key: return
+        self.trace_key=key; rects=[]
+        if self.trace_rect: self.screen.fill(COLOR_BG,self.trace_rect); rects.append(self.trace_rect)
+        self.trace_rect=None
+        if self.show_trace:
+            self.trace_rect=self.trace.draw(self.screen,self.font_mono,(GAME_AREA_WIDTH+8,WINDOW_HEIGHT-250)); rects.append(self.trace_rect)
+        if rects: pygame.display.update(rects)
 
     def key(self,k):
         m={pygame.K_w:'w',pygame.K_a:'a',pygame.K_s:'s',pygame.K_d:'d',
            pygame.K_UP:'u',pygame.K_LEFT:'l',pygame.K_DOWN:'n',pygame.K_RIGHT:'r',
            pygame.K_p:'p'}
-        if k in m:self.out_q.put(m[k])
+        if k in m:
+            self.comm.send(m[k]+self.trace.mark())  # the Pico echoes the mark for latency tracing
+            # The mark id is also the input's sequence number for reconciling predictions
+            if self.predicting and m[k] in PLAYER_KEYS and self.predict.input(self.trace.next_id,*PLAYER_KEYS[m[k]]):
+                self.grid=self.predict.grid
+        elif k==pygame.K_F3: self.show_trace=not self.show_trace
+        elif k==pygame.K_F5: self.predicting=not self.predicting; print("Prediction","on" if self.predicting else "off")
+        elif k==pygame.K_F4: print("Latency samples written to",self.trace.write_csv())
 
     # ---------- Run Controller ----------
     def run(self):
@@ -0,0 +1,249 @@
+# pico_link.py
+# asyncio transport between the PC client and the Pico, replacing the
+# polling USB / Wi-Fi threads. One event loop runs in a background thread
+# and wakes only when bytes arrive: serial through the port's non-blocking
+# file descriptor, Wi-Fi as a plain asyncio TCP connection.
+#
+# The GUI thread only calls send() and get_all(). The loop thread splits
+# the byte stream into CRC-checked frames (tetris_proto) and posts each raw
+# frame to a latest-value Mailbox (state_mailbox), so a stalled GUI costs
+# one slot, not a growing queue. get_all() decodes and acks only the frame
+# it takes; the ones it replaced are counted in mailbox.dropped and never
+# decoded. Errors, line clears and latency-trace echoes go through a
+# bounded EventQueue. So do match logs (tetris_replay), which the Pico
+# sends as REPLAY text lines at game over.
+
+import asyncio
+import os
+import threading
+import time
+
+import serial
+
+from state_mailbox import Mailbox, EventQueue
+from tetris_proto import StateDecoder, encode_ack, frame_score, frame_trace
+from tetris_replay import ReplayReceiver
+
+
+class _LinkProtocol(asyncio.Protocol):
+    def __init__(self, link):
+        self.link = link
+
+    def connection_made(self, transport):
+        self.link._made(transport)
+
+    def data_received(self, data):
+        self.link._received(data)
+
+    def connection_lost(self, exc):
+        self.link._lost(exc)
+
+
+class SerialTransport:
+    """The asyncio transport calls we need, over a pyserial port.
+
+    Reads are driven by loop.add_reader() on the port's fd. Where the loop
+    cannot watch serial fds (Windows) a reader task polls the port instead.
+    """
+    def __init__(self, loop, ser, protocol, poll_s=0.005):
+        self.loop, self.ser, self.protocol = loop, ser, protocol
+        self.poll_s = poll_s
+        self.closed = False
+        self.task = None
+        try:
+            self.fd = ser.fileno()
+            os.set_blocking(self.fd, False)
+            loop.add_reader(self.fd, self._read_ready)
+        except (AttributeError, NotImplementedError, OSError):
+            self.fd = None
+            self.task = loop.create_task(self._poll())
+        protocol.connection_made(self)
+
+    def _read_ready(self):
+        try:
+            data = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._close(e)
+            return
+        if data:
+            self.protocol.data_received(data)
+        else:
+            self._close(None)  # Port went away
+
+    async def _poll(self):
+        while not self.closed:
+            try:
+                data = self.ser.read(self.ser.in_waiting)
+            except serial.SerialException as e:
+                self._close(e)
+                return
+            if data:
+                self.protocol.data_received(data)
+                continue
+            await asyncio.sleep(self.poll_s)
+
+    def write(self, data):
+        self.ser.write(data)
+
+    def close(self):
+        self._close(None)
+
+    def _close(self, exc):
+        if self.closed:
+            return
+        self.closed = True
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+        if self.task:
+            self.task.cancel()
+        self.ser.close()
+        self.protocol.connection_lost(exc)
+
+
+class PicoLink:
+    """Connection to the Pico over USB serial ("usb") or TCP ("wifi").
+
+    usb target: list of port names to try; wifi target: (host, port).
+    GUI side: start(), send(text), get_all(), close(), and the
+    connected / error attributes.
+    """
+    def __init__(self, kind, target, max_events=32):
+        self.kind = kind
+        self.target = target
+        self.fail = "USB_FAILED" if kind == "usb" else "WIFI_FAILED"
+        self.mailbox = Mailbox()  # (raw frame, arrival time)
+        self.events = EventQueue(max_events)
+        self.decoder = StateDecoder()
+        self.replay = ReplayReceiver()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.transport = None
+        self.connected = False
+        self.error = None
+        self.last_score = 0
+        # Stats
+        self.bytes_in = 0
+        self.frames_in = 0
+        self.decoded = 0
+
+    # ---------- GUI thread ----------
+    def start(self):
+        self.thread.start()
+
+    def send(self, text):
+        """Queue text (key commands, credentials, acks) for the Pico."""
+        try:
+            self.loop.call_soon_threadsafe(self._write, text.encode("utf-8"))
+        except RuntimeError:
+            pass  # Link already closed
+
+    def get_all(self):
+        """Events since the last call ({"error": ...}, {"lines": score},
+        {"trace": (id, hold), "received": t}, {"replay": log bytes}), then
+        the newest state dict if a frame arrived."""
+        out = self.events.get_all()
+        taken = self.mailbox.take()
+        if taken:
+            frame, received = taken
+            state = self.decoder.decode(frame)
+            if state is not None:
+                state["received"] = received
+                self.decoded += 1
+                out.append(state)
+                self.send(encode_ack(state["seq"]))
+        return out
+
+    def close(self):
+        if self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self._shutdown)
+            self.thread.join(timeout=1)
+
+    # ---------- Event loop thread ----------
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            if self.loop.run_until_complete(self._connect()):
+                self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    async def _connect(self):
+        try:
+            if self.kind == "wifi":
+                host, port = self.target
+                await asyncio.wait_for(
+                    self.loop.create_connection(lambda: _LinkProtocol(self), host, port), 5)
+                print(f"Wi-Fi connected: {host}:{port}")
+            else:
+                for port in self.target:
+                    try:
+                        ser = serial.Serial(port, 115200, timeout=0)
+                    except serial.SerialException:
+                        continue
+                    SerialTransport(self.loop, ser, _LinkProtocol(self))
+                    ser.write(b"\n")  # The Pico waits for any byte to pick USB mode
+                    print(f"Connected via USB: {port}")
+                    break
+                else:
+                    raise OSError("no USB port")
+            return True
+        except Exception as e:
+            print(f"{self.kind} connection failed:", e)
+            self.error = self.fail
+            self.events.put({"error": self.fail})
+            return False
+
+    def _made(self, transport):
+        self.transport = transport
+        self.connected = True
+
+    def _received(self, data):
+        self.bytes_in += len(data)
+        now = time.perf_counter()
+        for frame in self.decoder.split(data):
+            self.frames_in += 1
+            # The score only goes up on a line clear, so it is read here,
+            # where every frame is seen, rather than from decoded states
+            score = frame_score(frame)
+            if score > self.last_score:
+                self.events.put({"lines": score})
+            self.last_score = score
+            # Latency echoes too: the frame carrying one may be superseded
+            trace = frame_trace(frame)
+            if trace:
+                self.events.put({"trace": trace, "received": now})
+            self.mailbox.put((frame, now))
+        for line in self.decoder.lines:
+            if line in ["USB_FAILED", "WIFI_FAILED"]:
+                self.events.put({"error": line})
+            elif line.startswith("REPLAY "):
+                log = self.replay.feed(line)
+                if log:
+                    self.events.put({"replay": log})
+            else:
+                print("Pico debug:", line)
+        del self.decoder.lines[:]
+
+    def _write(self, data):
+        if self.transport:
+            try:
+                self.transport.write(data)
+            except Exception as e:
+                print("Send error:", e)
+
+    def _lost(self, exc):
+        self.connected = False
+        self.transport = None
+        if not self.error:
+            self.error = self.fail
+            self.events.put({"error": self.fail})
+        self.loop.stop()
+
+    def _shutdown(self):
+        self.error = self.error or "CLOSED"
+        if self.transport:
+            self.transport.close()
+        else:
+            self.loop.stop()
@@ -0,0 +1,364 @@
+# pico_relay.py
+# Fan-out relay: one connection to the Pico, many watchers. The firmware
+# serves a single TCP client (listen(1)) or the USB port, so a match can only
+# be watched by whoever holds that link; the relay holds it instead and
+# re-serves the game to any number of clients on this PC's event loop.
+#
+#   python pico_relay.py --wifi 192.168.4.1:8080     # or --usb /dev/ttyACM0
+#       players:     TCP 8081, keys go to the Pico (the unified client works
+#                    unchanged with DEFAULT_PICO_IP = this PC, port 8081)
+#       spectators:  TCP 8082 and WebSocket 8083, input ignored
+#
+# Upstream, the relay decodes every frame and acks it like a client would.
+# Downstream, each client has its own acks: a frame sent to it is a DELTA
+# against the newest frame that client acked, or FULL if it has not acked
+# one the relay still remembers (a client that never acks, like a browser,
+# always gets FULL frames). The relay numbers frames itself and encodes each
+# one once per distinct base, so hundreds of spectators cost a few encodes.
+#
+# Every client has a bounded send queue. When a slow client's queue is full
+# the oldest frame is dropped and counted; acks make that safe, since no
+# frame depends on one the client has not acknowledged. The upstream link
+# is read as fast as the Pico writes, whatever the clients do.
+#
+# Only connections on the player port may send input: their keys go
+# upstream, their latency marks get relay-wide ids there and the echo comes
+# back only to the player that sent the mark, with its own id.
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import socket
+from collections import deque
+
+import serial
+
+from pico_link import SerialTransport
+from tetris_proto import StateDecoder, CommandReader, encode_ack, pack_grid, build_frame
+from tetris_transport import TraceMarks
+
+# DELTA bases kept, as many as the firmware's StateEncoder: clients keep
+# twice that, so an acked base is still there when the DELTA arrives
+HISTORY = 8
+SEND_BUFFER = 8192  # Kernel send buffer per client, bytes
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class RelayClient:
+    """One downstream connection."""
+    def __init__(self, relay, writer, player=False, ws=False, max_queue=8):
+        self.relay = relay
+        self.writer = writer
+        self.player = player
+        self.ws = ws
+        self.name = "%s:%s" % writer.get_extra_info("peername")[:2]
+        self.queue = deque(maxlen=max_queue)
+        # Block in drain() early, so a slow client's backlog stays in the
+        # queue, where newer frames replace it, not in socket buffers
+        writer.transport.set_write_buffer_limits(high=2048)
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        self.ready = asyncio.Event()
+        self.acked = -1  # Newest relay seq this client acked
+        self.reader = CommandReader(self)
+        self.marks = TraceMarks()
+        # Stats
+        self.sent = 0
+        self.dropped = 0
+
+    def ack(self, seq):
+        self.acked = seq
+
+    def push(self, frame):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(frame)
+        self.ready.set()
+
+    def feed(self, data):
+        """Input from the client: acks for everyone, keys and marks for players."""
+        keys = []
+        for ch in data.decode("latin-1"):
+            ch = self.marks.feed(ch, 0)
+            if self.marks.pending is not None:
+                mark = self.marks.pending[0]
+                self.marks.pending = None
+                if self.player:
+                    keys.append(self.relay.mark(self, mark))
+                continue
+            if ch:
+                ch = self.reader.feed(ch)
+            if ch and self.player:
+                keys.append(ch)
+        if keys:
+            self.relay.send_upstream("".join(keys))
+
+    async def write_loop(self):
+        writer = self.writer
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                while self.queue:
+                    frame = self.queue.popleft()
+                    writer.write(ws_frame(frame) if self.ws else frame)
+                    self.sent += 1
+                await writer.drain()
+        except ConnectionError:
+            pass  # serve() notices on its next read
+
+
+class Relay:
+    def __init__(self, kind, target, max_queue=8):
+        self.kind = kind
+        self.target = target
+        self.max_queue = max_queue
+        self.decoder = StateDecoder()
+        self.transport = None
+        self.clients = set()
+        self.seq = 0  # Relay frame numbering, independent of the Pico's
+        self.rows = {}  # relay seq -> packed grid, the last HISTORY frames
+        self.state = None  # Newest state, sent FULL to new clients
+        self.next_mark = 0
+        self.marks = {}  # relay mark id -> (player client, its own id)
+        # Stats
+        self.frames_in = 0
+        self.frames_out = 0
+        self.encodes = 0
+        self.log = print  # Per-connection messages
+
+    # ---------- Upstream ----------
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        if self.kind == "wifi":
+            host, port = self.target
+            await loop.create_connection(lambda: _Upstream(self), host, port)
+            print(f"Upstream Wi-Fi: {host}:{port}")
+        else:
+            for port in self.target:
+                try:
+                    ser = serial.Serial(port, 115200, timeout=0)
+                except serial.SerialException:
+                    continue
+                SerialTransport(loop, ser, _Upstream(self))
+                ser.write(b"\n")  # The Pico waits for any byte to pick USB mode
+                print(f"Upstream USB: {port}")
+                break
+            else:
+                raise OSError("no USB port")
+
+    async def keep_connected(self):
+        while True:
+            if self.transport is None:
+                try:
+                    await asyncio.wait_for(self.connect(), 5)
+                except (OSError, asyncio.TimeoutError) as e:
+                    print("Upstream connection failed:", e)
+            await asyncio.sleep(2)
+
+    def send_upstream(self, text):
+        if self.transport:
+            self.transport.write(text.encode())
+
+    def mark(self, client, mark_id):
+        """Relay-wide mark id for a player's mark, to send upstream."""
+        self.next_mark = (self.next_mark + 1) & 0xFFFF
+        self.marks[self.next_mark] = (client, mark_id)
+        if len(self.marks) > 256:
+            del self.marks[next(iter(self.marks))]
+        return "!%04x" % self.next_mark
+
+    def _received(self, data):
+        decoder = self.decoder
+        newest = None
+        for frame in decoder.split(data):
+            self.frames_in += 1
+            state = decoder.decode(frame)
+            if state is not None:
+                self.publish(state)
+                newest = state["seq"]
+        if newest is not None:
+            self.send_upstream(encode_ack(newest))
+        for line in decoder.lines:
+            print("Pico debug:", line)
+        del decoder.lines[:]
+
+    def _lost(self):
+        print("Upstream lost")
+        self.transport = None
+
+    # ---------- Downstream ----------
+    def publish(self, state):
+        """Number the state and queue it for every client."""
+        self.seq = seq = (self.seq + 1) & 0xFFFF
+        rows = pack_grid(state["grid"])
+        self.rows[seq] = rows
+        self.rows.pop((seq - HISTORY) & 0xFFFF, None)
+        self.state = state
+
+        echo = self.marks.pop(state["trace"][0], None) if state["trace"] else None
+        frames = {}  # base seq -> frame, shared by clients with the same base
+        for client in self.clients:
+            base = client.acked if client.acked in self.rows and client.acked != seq else None
+            if echo is not None and echo[0] is client:
+                frame = self._encode(seq, state, rows, base, (echo[1], state["trace"][1]))
+            else:
+                frame = frames.get(base)
+                if frame is None:
+                    frame = frames[base] = self._encode(seq, state, rows, base)
+            client.push(frame)
+            self.frames_out += 1
+
+    def _encode(self, seq, state, rows, base, trace=None):
+        self.encodes += 1
+        if base is None:
+            return build_frame(seq, state, rows, trace=trace)
+        return build_frame(seq, state, rows, self.rows[base], base, trace)
+
+    async def serve(self, reader, writer, player=False, ws=False):
+        try:
+            if ws and not await ws_handshake(reader, writer):
+                raise ConnectionError("not a WebSocket request")
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        client = RelayClient(self, writer, player, ws, self.max_queue)
+        self.log("%s %s connected" % ("Player" if player else "Spectator", client.name))
+        self.clients.add(client)
+        if self.state is not None:
+            client.push(build_frame(self.seq, self.state, self.rows[self.seq]))
+        task = asyncio.ensure_future(client.write_loop())
+        try:
+            while True:
+                data = await (ws_read(reader, writer) if ws else reader.read(256))
+                if not data:
+                    break
+                client.feed(data)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients.discard(client)
+            task.cancel()
+            writer.close()
+            self.log("%s gone: %d frames sent, %d dropped" % (client.name, client.sent, client.dropped))
+
+    def stats(self):
+        spectators = [c for c in self.clients if not c.player]
+        return ("in %d  out %d  encodes %d  players %d  spectators %d  dropped %d" % (
+            self.frames_in, self.frames_out, self.encodes, len(self.clients) - len(spectators),
+            len(spectators), sum(c.dropped for c in self.clients)))
+
+
+class _Upstream(asyncio.Protocol):
+    def __init__(self, relay):
+        self.relay = relay
+
+    def connection_made(self, transport):
+        self.relay.transport = transport
+
+    def data_received(self, data):
+        self.relay._received(data)
+
+    def connection_lost(self, exc):
+        self.relay._lost()
+
+
+# ---------------------------------------------------------------
+# Minimal WebSocket server side (RFC 6455): binary frames out,
+# client text/binary messages in, ping answered, close ends it
+# ---------------------------------------------------------------
+
+async def ws_handshake(reader, writer):
+    request = await reader.readuntil(b"\r\n\r\n")
+    key = None
+    for line in request.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"sec-websocket-key":
+            key = value.strip()
+    if key is None:
+        writer.write(b"HTTP/1.1 426 Upgrade Required\r\nContent-Length: 0\r\n\r\n")
+        return False
+    accept = base64.b64encode(hashlib.sha1(key + WS_GUID).digest())
+    writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                 b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+    return True
+
+
+def ws_frame(payload, opcode=2):
+    n = len(payload)
+    if n < 126:
+        head = bytes((0x80 | opcode, n))
+    elif n < 0x10000:
+        head = bytes((0x80 | opcode, 126, n >> 8, n & 0xFF))
+    else:
+        head = bytes((0x80 | opcode, 127)) + n.to_bytes(8, "big")
+    return head + payload
+
+
+async def ws_read(reader, writer):
+    """Payload of the next data message; b"" once the client closes."""
+    while True:
+        b0, b1 = await reader.readexactly(2)
+        n = b1 & 0x7F
+        if n == 126:
+            n = int.from_bytes(await reader.readexactly(2), "big")
+        elif n == 127:
+            n = int.from_bytes(await reader.readexactly(8), "big")
+        mask = await reader.readexactly(4) if b1 & 0x80 else b"\0\0\0\0"
+        data = bytes(b ^ mask[i & 3] for i, b in enumerate(await reader.readexactly(n)))
+        opcode = b0 & 0x0F
+        if opcode == 8:
+            writer.write(ws_frame(b"", 8))
+            return b""
+        if opcode == 9:
+            writer.write(ws_frame(data, 10))
+        elif opcode in (0, 1, 2):
+            return data
+
+
+async def run_relay(relay, host, player_port, tcp_port, ws_port, stats_s=0, ready=None):
+    servers = [
+        await asyncio.start_server(lambda r, w: relay.serve(r, w, player=True), host, player_port),
+        await asyncio.start_server(relay.serve, host, tcp_port, backlog=1024),
+        await asyncio.start_server(lambda r, w: relay.serve(r, w, ws=True), host, ws_port, backlog=1024),
+    ]
+    upstream = asyncio.ensure_future(relay.keep_connected())
+    if ready:
+        ready(servers)
+    try:
+        while True:
+            await asyncio.sleep(stats_s or 3600)
+            if stats_s:
+                print(relay.stats())
+    finally:
+        upstream.cancel()
+        for server in servers:
+            server.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fan one Pico Tetris link out to many clients")
+    ap.add_argument("--wifi", metavar="HOST:PORT", help="Pico (or pico_standin.py) over TCP")
+    ap.add_argument("--usb", nargs="+", metavar="PORT", help="serial ports to try")
+    ap.add_argument("--host", default="0.0.0.0", help="address to serve on")
+    ap.add_argument("--player-port", type=int, default=8081)
+    ap.add_argument("--tcp", type=int, default=8082, help="TCP spectator port")
+    ap.add_argument("--ws", type=int, default=8083, help="WebSocket spectator port")
+    ap.add_argument("--queue", type=int, default=8, help="frames queued per client before dropping")
+    ap.add_argument("--stats", type=float, default=10.0, help="seconds between stats lines (0: off)")
+    args = ap.parse_args()
+    if args.usb:
+        relay = Relay("usb", args.usb, args.queue)
+    else:
+        host, _, port = (args.wifi or "192.168.4.1:8080").rpartition(":")
+        relay = Relay("wifi", (host, int(port)), args.queue)
+    try:
+        asyncio.run(run_relay(relay, args.host, args.player_port, args.tcp, args.ws, args.stats))
+    except KeyboardInterrupt:
+        print(relay.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# pico_standin.py
+# Stand-in for the Pico running pico_tetris_unified.py, for developing and
+# measuring the PC client without a board. Same engine, same 10 ms loop with
+# dirty-gated binary frames (tetris_proto), same key / ack / latency-mark
+# input, over TCP or a pseudo-terminal that the client opens like the USB
+# serial port.
+#
+#   python pico_standin.py --tcp 8080          # client: DEFAULT_PICO_IP = "127.0.0.1"
+#   python pico_standin.py --pty               # prints the /dev/pts/N to use as USB port
+#   python pico_standin.py --tcp 8080 --bot 0.2  # bots also play, for more traffic
+#   python pico_standin.py --tcp 8080 --bot 0.2 --replay-dir logs  # keep every game's replay log
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from tetris_engine import TetrisGame
+from tetris_proto import StateEncoder, CommandReader
+from tetris_transport import TraceMarks
+from tetris_replay import ReplayWriter, replay_lines
+
+LOOP_MS = 10
+GAME_TICK_MS = 500
+KEYS = {'w': (1, 'rotate'), 'a': (1, 'left'), 's': (1, 'down'), 'd': (1, 'right'),
+        'u': (2, 'rotate'), 'l': (2, 'left'), 'n': (2, 'down'), 'r': (2, 'right')}
+BOT_KEYS = "wadwadulrulr"  # no drops, so games last
+
+
+def _ticks_us():
+    return int(time.perf_counter() * 1e6)
+
+
+def _ticks_ms():
+    return int(time.perf_counter() * 1000)
+
+
+class StandIn:
+    """Game loop of the unified firmware, writing frames to `write(bytes)`."""
+    def __init__(self, write, bot_rate=0.0, seed=0, tick_ms=GAME_TICK_MS, replay_dir=None):
+        self.write = write
+        self.bot_rate = bot_rate
+        self.bot = random.Random(seed)
+        self.tick_ms = tick_ms
+        self.replay_dir = replay_dir
+        self.game = TetrisGame()
+        self.replay = ReplayWriter(self.game.seed, _ticks_ms())
+        self.encoder = StateEncoder()
+        self.reader = CommandReader(self.encoder)
+        self.marks = TraceMarks()
+        self.paused = False
+        self.dirty = True
+        self.sent_at = {}  # seq -> perf_counter() when the frame was written
+        self.frames = 0
+        self.keys = 0
+
+    def feed(self, data):
+        now = _ticks_us()
+        for ch in data.decode("latin-1"):
+            ch = self.marks.feed(ch, now)
+            if ch:
+                ch = self.reader.feed(ch)
+            if ch == "p":
+                self.paused = not self.paused
+                self.replay.pause(_ticks_ms())
+                self.dirty = True
+            elif ch in KEYS and not self.paused and not self.game.game_over:
+                self.game.handle_input(*KEYS[ch])
+                self.replay.key(_ticks_ms(), *KEYS[ch])
+                self.keys += 1
+                self.dirty = True
+
+    async def run(self, seconds=None):
+        start = last_tick = time.perf_counter()
+        while seconds is None or time.perf_counter() - start < seconds:
+            now = time.perf_counter()
+            game = self.game
+            if self.bot_rate and self.bot.random() < self.bot_rate:
+                self.feed(self.bot.choice(BOT_KEYS).encode())
+            if not self.paused and (now - last_tick) * 1000 >= self.tick_ms:
+                last_tick = now
+                if game.game_over:
+                    self.game = game = TetrisGame()
+                    self.replay = ReplayWriter(game.seed, _ticks_ms())
+                lines = game.step_gravity()
+                self.replay.gravity(_ticks_ms(), game)
+                if lines:
+                    game.finish_line_clear(lines)
+                    self.replay.clear(_ticks_ms())
+                self.dirty = True
+            if self.dirty:
+                self.dirty = False
+                trace = self.marks.take(_ticks_us())
+                frame = bytes(self.encoder.encode(game, self.paused, trace))
+                self.sent_at[self.encoder.seq] = time.perf_counter()
+                self.write(frame)
+                self.frames += 1
+                if game.game_over and not self.replay.ended:
+                    self.end_replay()
+            await asyncio.sleep(LOOP_MS / 1000)
+
+
+    def end_replay(self):
+        """Close the game's log, save it if asked to and send it like the firmware."""
+        replay = self.replay
+        replay.end(_ticks_ms(), self.game)
+        if self.replay_dir:
+            os.makedirs(self.replay_dir, exist_ok=True)
+            path = os.path.join(self.replay_dir, "standin_%08x.trl" % self.game.seed)
+            replay.save(path)
+            print("Replay saved:", path)
+        self.write(("\n".join(replay_lines(replay.data)) + "\n").encode())
+
+
+async def serve_tcp(port, bot_rate, seed, seconds=None, ready=None, standins=None, replay_dir=None):
+    """Accept clients, each with its own game like a fresh firmware run.
+
+    ready(server) is called once listening; each StandIn is appended to
+    `standins` if given.
+    """
+    async def client(reader, writer):
+        print("Client", writer.get_extra_info("peername"))
+        standin = StandIn(writer.write, bot_rate, seed, replay_dir=replay_dir)
+        if standins is not None:
+            standins.append(standin)
+        task = asyncio.ensure_future(standin.run())
+        try:
+            while True:
+                data = await reader.read(256)
+                if not data:
+                    break
+                standin.feed(data)
+        except ConnectionError:
+            pass
+        finally:
+            task.cancel()
+            writer.close()
+            print("Client gone")
+
+    server = await asyncio.start_server(client, "127.0.0.1", port)
+    if ready:
+        ready(server)
+    async with server:
+        if seconds is None:
+            await server.serve_forever()
+        else:
+            await asyncio.sleep(seconds)
+
+
+def open_pty():
+    """Master fd for the stand-in and the slave path for the client."""
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    return master, os.ttyname(slave)
+
+
+async def serve_pty(master, bot_rate, seed, seconds=None, replay_dir=None):
+    loop = asyncio.get_running_loop()
+    os.set_blocking(master, False)
+    standin = StandIn(lambda b: os.write(master, b), bot_rate, seed, replay_dir=replay_dir)
+
+    def readable():
+        try:
+            standin.feed(os.read(master, 256))
+        except (BlockingIOError, OSError):
+            pass
+    loop.add_reader(master, readable)
+    try:
+        await standin.run(seconds)
+    finally:
+        loop.remove_reader(master)
+    return standin
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Stand-in Pico Tetris server on this PC")
+    ap.add_argument("--tcp", type=int, metavar="PORT", help="listen on 127.0.0.1:PORT")
+    ap.add_argument("--pty", action="store_true", help="serve on a pseudo-terminal")
+    ap.add_argument("--bot", type=float, default=0.0, help="chance per loop pass of a bot key")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--replay-dir", metavar="DIR", help="save each game's replay log here")
+    args = ap.parse_args()
+    if args.pty:
+        master, path = open_pty()
+        print("Serial port:", path)
+        asyncio.run(serve_pty(master, args.bot, args.seed, replay_dir=args.replay_dir))
+    else:
+        port = args.tcp or 8080
+        print(f"Listening on 127.0.0.1:{port}")
+        asyncio.run(serve_tcp(port, args.bot, args.seed, replay_dir=args.replay_dir))
+
+
+if __name__ == "__main__":
+    main()
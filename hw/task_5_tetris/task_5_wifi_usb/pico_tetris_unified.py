@@ -2,7 +2,12 @@
 # pico_tetris_unified.py – Auto USB/Wi-Fi Tetris Server (Raspberry Pi Pico W)
 # ---------------------------------------------------------------
 
-import machine, time, sys, random, network, socket, ujson, select
+import machine, time, sys, network, socket, select, errno
+from array import array
+from tetris_engine import TetrisGame  # bitboard rules shared with the PC tools
+from tetris_proto import StateEncoder, CommandReader  # binary state frames
+from tetris_transport import InputRing, UsbInput, SocketInput, TraceMarks  # input drain, latency marks
+from tetris_replay import ReplayWriter, replay_lines  # seed + timed event log of the match
 
 # ---------------- CONFIG ----------------
 WIFI_SSID = "YOUR_WIFI_SSID"
@@ -11,48 +16,92 @@ SERVER_PORT = 8080
 DISPLAY_WIDTH, DISPLAY_HEIGHT = 16, 32
 SPI_BUS, NUM_MATRICES = 0, 8
 SPI_SCK_PIN, SPI_MOSI_PIN, SPI_CS_PIN = machine.Pin(10), machine.Pin(11), machine.Pin(9)
+# Modules: tiles across/down, chain index per tile (row by row), quarter turns & mirror per module
+LAYOUT = dict(tx=2, ty=4, chain=(0,1,2,3,4,5,6,7), rot=0, mirror=False)
 GAME_TICK_RATE = 0.5
-PLAYER_1_COLOR, PLAYER_2_COLOR, STATIC_COLOR = 1, 2, 3
-TETROMINOES = {
-    'O': [(0,0),(1,0),(0,1),(1,1)],
-    'I': [(0,1),(1,1),(2,1),(3,1)],
-    'S': [(1,0),(2,0),(0,1),(1,1)],
-    'Z': [(0,0),(1,0),(1,1),(2,1)],
-    'L': [(0,1),(1,1),(2,1),(2,0)],
-    'J': [(0,1),(1,1),(2,1),(0,0)],
-    'T': [(1,1),(0,1),(2,1),(1,0)]
-}
-T_KEYS = list(TETROMINOES.keys())
+LOOP_MS = 10       # main loop period
+STATS_MS = 5000    # loop timing report period (0 = off)
+REPLAY_FILE = "replay.trl"  # last match's log, saved at game over ("" = off)
+KEYS = {'w':(1,'rotate'),'a':(1,'left'),'s':(1,'down'),'d':(1,'right'),
+        'u':(2,'rotate'),'l':(2,'left'),'n':(2,'down'),'r':(2,'right')}
 
 # ---------------- DISPLAY ----------------
+REV = bytes(sum(((i>>k)&1)<<(7-k) for k in range(8)) for i in range(256))
+class Layout:
+    # Compiled once: per pixel (byte offset, bit mask) into the chain buffer
+    # (8 row bytes per module, MSB=left), plus a byte plan for whole frames
+    def __init__(l,tx,ty,chain=None,rot=0,mirror=False):
+        l.w,l.h=8*tx,8*ty; t=tx*ty
+        chain=chain or range(t)
+        if isinstance(rot,int):rot=(rot,)*t
+        if isinstance(mirror,bool):mirror=(mirror,)*t
+        l.off=array('H',[0]*(l.w*l.h)); l.mask=bytearray(l.w*l.h)
+        for y in range(l.h):
+            for x in range(l.w):
+                k=(y//8)*tx+x//8; lx,ly=x%8,y%8; r=rot[k]&3
+                c,rw=((lx,ly),(ly,7-lx),(7-lx,7-ly),(7-ly,lx))[r]
+                if mirror[k]:c=7-c
+                l.off[y*l.w+x]=chain[k]*8+rw; l.mask[y*l.w+x]=0x80>>c
+        # MONO_HLSB frame byte -> buffer byte (copy / bit-reversed), -1 = per pixel
+        l.dst=array('h',[-1]*(l.w*l.h//8)); l.rev=bytearray(len(l.dst))
+        for j in range(len(l.dst)):
+            i=j*8; o=l.off[i]
+            if any(l.off[i+k]!=o for k in range(8)):continue
+            m=bytes(l.mask[i:i+8])
+            if m==bytes(0x80>>k for k in range(8)):l.dst[j]=o
+            elif m==bytes(1<<k for k in range(8)):l.dst[j]=o;l.rev[j]=1
+    def blit(l,frame,buf):
+        for j in range(len(l.dst)):
+            v=frame[j];o=l.dst[j]
+            if o>=0:buf[o]=REV[v] if l.rev[j] else v
+            else:
+                for k in range(8):
+                    i=j*8+k
+                    if v&(0x80>>k):buf[l.off[i]]|=l.mask[i]
+                    else:buf[l.off[i]]&=~l.mask[i]
+
 class MAX7219Display:
-    def __init__(self, spi, cs_pin, n):
+    def __init__(self, spi, cs_pin, n, layout=None):
         self.spi, self.cs, self.n = spi, cs_pin, n
         self.cs.init(cs_pin.OUT, value=1)
         self.buf = bytearray(8*n)
-        self._SCAN, self._DECODE, self._INTENSITY, self._SHUTDOWN, self._TEST = 0xB,0x9,0xA,0xC,0xF
+        self.lay = layout or Layout(**LAYOUT)
+        self.shadow, self.shadow_ok = bytearray(8*n), False  # last sent rows
+        self.tx = bytearray(2*n)  # one chain transaction, reused
+        self.bytes_sent = 0
+        self._NOOP, self._SCAN, self._DECODE, self._INTENSITY, self._SHUTDOWN, self._TEST = 0x0,0xB,0x9,0xA,0xC,0xF
         self.init()
+    def _send(self):
+        self.cs(0); self.spi.write(self.tx); self.cs(1)
+        self.bytes_sent += len(self.tx)
     def _cmd(self,r,d):
-        self.cs(0)
-        for _ in range(self.n): self.spi.write(bytearray([r,d]))
-        self.cs(1)
+        for i in range(0,2*self.n,2): self.tx[i]=r; self.tx[i+1]=d
+        self._send()
     def init(self):
         for r,d in [(self._SHUTDOWN,1),(self._TEST,0),(self._SCAN,7),(self._DECODE,0),(self._INTENSITY,7)]:
             self._cmd(r,d)
+        self.shadow_ok = False
         self.clear(); self.show()
     def clear(self): self.buf[:] = b'\x00'*len(self.buf)
     def set_pixel(self,x,y,v):
         if not(0<=x<DISPLAY_WIDTH and 0<=y<DISPLAY_HEIGHT): return
-        mx,my=x//8,y//8; idx=my*2+mx; off=idx*8+(y%8); b=1<<(7-(x%8))
-        if v:self.buf[off]|=b
-        else:self.buf[off]&=~b
-    def show(self):
+        i=y*DISPLAY_WIDTH+x; off=self.lay.off[i]
+        if v:self.buf[off]|=self.lay.mask[i]
+        else:self.buf[off]&=~self.lay.mask[i]
+    def blit(self,frame): self.lay.blit(frame,self.buf)  # MONO_HLSB, whole display
+    def show(self,force=False):
+        # Send only changed rows; unchanged modules in a sent row get a no-op
+        buf,sh,tx,n=self.buf,self.shadow,self.tx,self.n
+        force=force or not self.shadow_ok
         for r in range(8):
-            self.cs(0)
-            for i in reversed(range(self.n)):
-                o=i*8+r
-                self.spi.write(bytearray([r+1,self.buf[o]]))
-            self.cs(1)
+            ch=False
+            for k in range(n):
+                o=(n-1-k)*8+r  # farthest module first
+                v=buf[o]
+                if force or v!=sh[o]: sh[o]=v; tx[2*k]=r+1; tx[2*k+1]=v; ch=True
+                else: tx[2*k]=self._NOOP; tx[2*k+1]=0
+            if ch: self._send()
+        self.shadow_ok=True
     def text(self,t):
         self.clear()
         if t=="USB": self.set_pixel(2,2,1)
@@ -60,77 +109,12 @@ class MAX7219Display:
         elif t=="FAIL": [self.set_pixel(i,2,1) for i in range(4)]
         self.show()
 
-# ---------------- GAME ----------------
-class Tetris:
-    def __init__(s):
-        s.w,s.h=DISPLAY_WIDTH,DISPLAY_HEIGHT
-        s.g=[[0]*s.w for _ in range(s.h)]
-        s.score=0; s.over=False
-        s.p1=s.P(s,PLAYER_1_COLOR,s.w//2-4)
-        s.p2=s.P(s,PLAYER_2_COLOR,s.w//2+1)
-        s.p1.n=s.rand(); s.p2.n=s.rand(); s.spawn()
-    def rand(s):return random.choice(T_KEYS)
-    def spawn(s):
-        for p in [s.p1,s.p2]:
-            p.spawn(p.n); p.n=s.rand()
-        if not s.p1.valid() or not s.p2.valid(): s.over=True
-    class P:
-        def __init__(p,g,c,x): p.g,g.c,p.x0=g,c,x; p.s=[]; p.x=p.y=0; p.isp=False;p.k=''
-        def spawn(p,k):p.k=k;p.s=TETROMINOES[k];p.x,p.y=p.x0,0;p.isp=False
-        def valid(p,s=None,x=None,y=None):
-            s=s or p.s;x=x or p.x;y=y or p.y
-            for px,py in s:
-                nx,ny=x+px,y+py
-                if not(0<=nx<p.g.w and 0<=ny<p.g.h):return False
-                if p.g.g[ny][nx]==STATIC_COLOR:return False
-            return True
-        def mv(p,dx,dy):
-            if p.isp:return False
-            if p.valid(x=p.x+dx,y=p.y+dy):p.x+=dx;p.y+=dy;return True
-            return False
-        def rot(p):
-            if p.isp or p.k=='O':return
-            c=p.s[1];n=[(-(py-c[1])+c[0],(px-c[0])+c[1]) for px,py in p.s]
-            if p.valid(s=n):p.s=n
-    def grav(s):
-        if s.over:return
-        if not s.p1.mv(0,1): s.place(s.p1)
-        if not s.p2.mv(0,1): s.place(s.p2)
-        if s.p1.isp and s.p2.isp:
-            l=s.lines()
-            if l: s.clear(l)
-            else: s.spawn()
-    def place(s,p):
-        if p.isp:return
-        p.isp=True
-        for px,py in p.s:
-            nx,ny=p.x+px,p.y+py
-            if 0<=nx<s.w and 0<=ny<s.h:s.g[ny][nx]=STATIC_COLOR
-    def lines(s):
-        L=[y for y in range(s.h) if all(s.g[y][x]==STATIC_COLOR for x in range(s.w))]
-        if L:s.score+=len(L)**2
-        return L
-    def clear(s,L):
-        for y in L:del s.g[y];s.g.insert(0,[0]*s.w)
-    def inp(s,n,a):
-        if s.over:return
-        p=s.p1 if n==1 else s.p2
-        if p.isp:return
-        if a=="left":p.mv(-1,0)
-        elif a=="right":p.mv(1,0)
-        elif a=="down":
-            while p.mv(0,1):pass
-            s.place(p)
-        elif a=="rotate":p.rot()
-    def state(s,pause=False):
-        g=[r[:] for r in s.g]
-        for p in [s.p1,s.p2]:
-            if not p.isp:
-                for px,py in p.s:
-                    nx,ny=p.x+px,p.y+py
-                    if 0<=nx<s.w and 0<=ny<s.h:g[ny][nx]=p.c
-        flat=[c for r in g for c in r]
-        return ujson.dumps({"grid":flat,"score":s.score,"p1_next":s.p1.n,"p2_next":s.p2.n,"game_over":s.over,"paused":pause})
+# Board rows from the engine -> MONO_HLSB frame (left module = high byte)
+ROWS=array('H',[0]*DISPLAY_HEIGHT); FRAME=bytearray(DISPLAY_WIDTH//8*DISPLAY_HEIGHT)
+def draw(d,g):
+    r=g.display_rows(ROWS)
+    for y in range(DISPLAY_HEIGHT): FRAME[2*y]=r[y]>>8; FRAME[2*y+1]=r[y]&0xFF
+    d.blit(FRAME); d.show()
 
 # ---------------- CONNECTIONS ----------------
 def usb_try():
@@ -161,9 +145,33 @@ def wifi_try(ssid,psk):
     s=socket.socket();s.bind(("0.0.0.0",SERVER_PORT));s.listen(1);s.setblocking(False)
     print("WiFi OK",ip);return s,ip
 
+def accept(s):
+    try:
+        c,a=s.accept();c.setblocking(False);print("Client",a);return c
+    except OSError: return None
+
 # ---------------- MAIN LOOP ----------------
+def apply_key(g,ch,paused,rl,now):
+    # -> (paused, state changed); every change goes to the replay log too
+    if ch=="p": rl.pause(now);return not paused,True
+    k=KEYS.get(ch)
+    if k and not paused and not g.game_over: g.handle_input(*k);rl.key(now,*k);return paused,True
+    return paused,False
+
+def end_replay(rl,g,now,out,c):
+    # Game over: close the log, keep it in flash, and send it after the frames as REPLAY text lines
+    rl.end(now,g)
+    if REPLAY_FILE:
+        try: rl.save(REPLAY_FILE);print("Replay saved:",REPLAY_FILE,len(rl.data),"bytes")
+        except OSError as e: print("Replay save failed:",e)
+    text=("\n".join(replay_lines(rl.data))+"\n").encode()
+    if out: out.write(text)
+    elif c:
+        try: c.setblocking(True);c.sendall(text);c.setblocking(False)  # once per match
+        except OSError: pass
+
 def loop(d):
-    g=Tetris();paused=False;lt=time.ticks_ms()
+    g=TetrisGame();paused=False;lt=time.ticks_ms();c=None
     mode="USB" if usb_try() else "WIFI"
     if mode=="WIFI":
         try:
@@ -174,22 +182,52 @@ def loop(d):
         c=None
     else: print("Running via USB")
 
+    enc=StateEncoder();cmd=CommandReader(enc);tm=TraceMarks()
+    rl=ReplayWriter(g.seed,lt)  # event times count from game creation
+    out=sys.stdout.buffer if mode=="USB" else None
+    ring=InputRing();src=UsbInput(ring) if mode=="USB" else None
+    # Redraw and push a frame only when gravity, input, a line clear or a new client changed something
+    dirty=True
+    busy=idle=passes=draws=0;ts=nxt=time.ticks_ms()
     while True:
-        if mode=="USB":
-            if sys.stdin in select.select([sys.stdin],[],[],0)[0]:
-                data=sys.stdin.read(1)
-                if data=="p":paused=not paused
+        t0=time.ticks_us()
+        # Drain everything pending, then apply every command this pass
+        if mode=="USB": src.drain()
         else:
-            if not c:c=accept(s)
+            if not c:
+                c=accept(s)
+                if c:enc.reset();dirty=True;src=SocketInput(ring,c)
+            if c and src.drain()<0: c.close();c=None;print("Client gone")
         now=time.ticks_ms()
-        if not paused and not g.over and time.ticks_diff(now,lt)>GAME_TICK_RATE*1000:
-            lt=now;g.grav()
-        js=g.state(paused)
-        d.clear()
-        for i,v in enumerate(ujson.loads(js)["grid"]):
-            if v:d.set_pixel(i%DISPLAY_WIDTH,i//DISPLAY_WIDTH,1)
-        d.show()
-        time.sleep_ms(10)
+        while ring.count:
+            ch=tm.feed(chr(ring.get()),ring.last_stamp)
+            if ch:ch=cmd.feed(ch)
+            if ch:
+                paused,ch=apply_key(g,ch,paused,rl,now)
+                if ch:dirty=True;ring.applied()
+        if not paused and not g.game_over and time.ticks_diff(now,lt)>GAME_TICK_RATE*1000:
+            lt=now;L=g.step_gravity();rl.gravity(now,g);dirty=True
+            if L:g.finish_line_clear(L);rl.clear(now)
+        if dirty:
+            dirty=False;draws+=1
+            draw(d,g)
+            f=enc.encode(g,paused,tm.take(time.ticks_us()))  # echoes the client's newest latency mark
+            if out:out.write(f)
+            elif c:
+                try:c.send(f)
+                except OSError as e:
+                    # Client not reading: skip the frame, the next is a delta against its last ack
+                    if e.args[0]!=errno.EAGAIN:c.close();c=None
+            if g.game_over and not rl.ended: end_replay(rl,g,now,out,c)
+        # Loop timing: work time vs time left to sleep until the next period
+        passes+=1;busy+=time.ticks_diff(time.ticks_us(),t0)
+        nxt=time.ticks_add(nxt,LOOP_MS);w=time.ticks_diff(nxt,time.ticks_ms())
+        if w>0: idle+=w*1000;time.sleep_ms(w)
+        else: nxt=time.ticks_ms()  # overran: restart the schedule, don't catch up
+        if STATS_MS and time.ticks_diff(time.ticks_ms(),ts)>=STATS_MS:
+            print("loop: busy %d us/pass, idle %d%%, %d passes, %d draws"%(busy//passes,100*idle//max(1,busy+idle),passes,draws))
+            print(ring.report());ring.reset_stats()
+            busy=idle=passes=draws=0;ts=time.ticks_ms()
 
 # ---------------- START ----------------
 def init_disp():
@@ -0,0 +1,105 @@
+# proto_bench.py
+# Bytes per frame and encode / parse time of the binary state frames
+# (tetris_proto) against the old JSON lines, on states from bot games.
+#
+#   python proto_bench.py --frames 5000 --seed 1
+
+import argparse
+import json
+import random
+import time
+
+from tetris_engine import TetrisGame
+from tetris_proto import StateEncoder, StateDecoder, encode_ack
+from tetris_sim import ACTIONS
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def record(frames, seed):
+    """Game snapshots, one per Pico loop pass (10 loop passes per gravity tick)."""
+    bot = random.Random(seed ^ 0x5EED)
+    games = []
+    game = TetrisGame(seed)
+    tick = 0
+    while len(games) < frames:
+        if game.game_over:
+            game = TetrisGame(seed + tick)
+        for player in (1, 2):
+            if bot.random() < 0.05:
+                action = bot.choice(ACTIONS)
+                if action:
+                    game.handle_input(player, action)
+        tick += 1
+        if tick % 10 == 0:
+            cleared = game.step_gravity()
+            if cleared:
+                game.finish_line_clear(cleared)
+        snap = TetrisGame.__new__(TetrisGame)
+        snap.__dict__.update(game.__dict__)
+        snap.rows = game.rows[:]
+        snap.p1 = _copy_player(game.p1)
+        snap.p2 = _copy_player(game.p2)
+        games.append(snap)
+    return games
+
+
+def _copy_player(p):
+    q = TetrisGame.Player.__new__(TetrisGame.Player)
+    q.__dict__.update(p.__dict__)
+    return q
+
+
+def bench_json(games, loads, name):
+    start = time.perf_counter()
+    lines = [(g.get_game_state() + "\n").encode() for g in games]
+    enc = time.perf_counter() - start
+    start = time.perf_counter()
+    for line in lines:
+        loads(line)
+    dec = time.perf_counter() - start
+    return name, sum(map(len, lines)), enc, dec
+
+
+def bench_binary(games, acks, name):
+    encoder, decoder = StateEncoder(), StateDecoder()
+    frames = []
+    start = time.perf_counter()
+    for g in games:
+        frames.append(bytes(encoder.encode(g)))
+        if acks:
+            encoder.ack(encoder.seq)  # client acks every frame in time
+    enc = time.perf_counter() - start
+    start = time.perf_counter()
+    for f in frames:
+        for state in decoder.feed(f):
+            encode_ack(state["seq"])
+    dec = time.perf_counter() - start
+    assert decoder.frames == len(games)
+    return name, sum(map(len, frames)), enc, dec
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare JSON and binary Tetris state frames")
+    ap.add_argument("--frames", type=int, default=5000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    games = record(args.frames, args.seed)
+    results = [bench_json(games, json.loads, "json")]
+    if ujson:
+        results.append(bench_json(games, ujson.loads, "ujson"))
+    results.append(bench_binary(games, False, "binary full"))
+    results.append(bench_binary(games, True, "binary delta"))
+
+    n = len(games)
+    print(f"{'format':14} {'bytes/frame':>12} {'encode us':>10} {'parse us':>10}")
+    for name, size, enc, dec in results:
+        print(f"{name:14} {size / n:12.1f} {enc / n * 1e6:10.1f} {dec / n * 1e6:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
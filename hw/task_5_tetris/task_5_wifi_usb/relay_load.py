@@ -0,0 +1,185 @@
+# relay_load.py
+# Load test for pico_relay.py on this machine: the stand-in Pico
+# (pico_standin.py) in its own process, the relay in this one, and a swarm
+# of spectators in a third.
+#
+#   python relay_load.py --spectators 300 --ws 50 --slow 20 --seconds 10
+#
+# Runs once with no spectators and once with the swarm. The Pico side must
+# not notice the swarm: compare the frames/s the relay takes from the
+# stand-in and the relay's event loop lag (how late it could be reading the
+# upstream socket). The swarm side reports frames received, frames the relay
+# dropped for slow clients (they read 1 KB/s and never ack, so they get FULL
+# frames at up to 7 KB/s), and the delay from the relay publishing a frame
+# to the last spectator reading it. Every tenth spectator decodes every
+# frame, so a DELTA against a base the client lacks shows up as an error;
+# the rest only CRC-check, since the swarm shares the CPU with the relay.
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from pico_relay import Relay, run_relay, ws_read
+from tetris_proto import StateDecoder, encode_ack, frame_seq
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STANDIN_PORT = 18470
+PLAYER_PORT, TCP_PORT, WS_PORT = 18471, 18472, 18473
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+# ---------------------------------------------------------------
+# Swarm (child process)
+# ---------------------------------------------------------------
+
+async def spectator(port, ws, slow, decode, seen, totals):
+    sock = socket.socket()
+    if slow:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2048)  # Like a phone on poor Wi-Fi
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, ("127.0.0.1", port))
+    reader, writer = await asyncio.open_connection(sock=sock, limit=512 if slow else 2 ** 16)
+    if ws:
+        writer.write(b"GET / HTTP/1.1\r\nHost: relay\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n")
+        await reader.readuntil(b"\r\n\r\n")
+    decoder = StateDecoder()
+    try:
+        while True:
+            data = await (ws_read(reader, writer) if ws else reader.read(512 if slow else 4096))
+            if not data:
+                break
+            now = time.perf_counter()
+            newest = None
+            for frame in decoder.split(data):
+                if decode and decoder.decode(frame) is None:
+                    totals["errors"] += 1
+                    continue
+                totals["frames"] += 1
+                newest = frame_seq(frame)
+                if not slow:
+                    first_last = seen.setdefault(newest, [now, now])
+                    first_last[1] = now
+            if newest is not None and not ws and not slow:
+                writer.write(encode_ack(newest).encode())  # WS clients are like browsers: no acks
+            if slow:
+                await asyncio.sleep(0.5)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    totals["crc_errors"] += decoder.crc_errors
+    writer.close()
+
+
+async def swarm(tcp, ws, slow, decode_every, seconds):
+    seen = {}
+    totals = {"frames": 0, "errors": 0, "crc_errors": 0}
+    tasks = [asyncio.ensure_future(spectator(TCP_PORT, False, i < slow, i % decode_every == 0, seen, totals))
+             for i in range(tcp)]
+    tasks += [asyncio.ensure_future(spectator(WS_PORT, True, False, i % decode_every == 0, seen, totals))
+              for i in range(ws)]
+    await asyncio.sleep(seconds)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    totals["cpu"] = time.process_time() / seconds * 100
+    totals["seen"] = seen
+    print(json.dumps(totals))
+
+
+# ---------------------------------------------------------------
+# Relay side (this process)
+# ---------------------------------------------------------------
+
+async def measure(args, tcp, ws, slow):
+    standin = subprocess.Popen([sys.executable, os.path.join(HERE, "pico_standin.py"), "--tcp", str(STANDIN_PORT),
+                                "--bot", str(args.bot), "--seed", "1"], stdout=subprocess.DEVNULL)
+    await asyncio.sleep(0.5)
+    relay = Relay("wifi", ("127.0.0.1", STANDIN_PORT), args.queue)
+    relay.log = lambda *a: None
+    published = {}
+    publish = relay.publish
+
+    def timed_publish(state):
+        publish(state)
+        published[relay.seq] = time.perf_counter()
+    relay.publish = timed_publish
+
+    ready = asyncio.Event()
+    task = asyncio.ensure_future(run_relay(relay, "127.0.0.1", PLAYER_PORT, TCP_PORT, WS_PORT,
+                                           ready=lambda servers: ready.set()))
+    await ready.wait()
+    child = None
+    if tcp or ws:
+        child = await asyncio.create_subprocess_exec(
+            sys.executable, __file__, "--swarm", "--spectators", str(tcp), "--ws", str(ws),
+            "--slow", str(slow), "--decode-every", str(args.decode_every), "--seconds", str(args.seconds + 2), stdout=subprocess.PIPE)
+        await asyncio.sleep(1)  # Let the swarm connect
+
+    lags = []
+    frames0, cpu0, start = relay.frames_in, time.process_time(), time.perf_counter()
+    while time.perf_counter() - start < args.seconds:
+        t = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append((time.perf_counter() - t - 0.005) * 1000)
+    elapsed = time.perf_counter() - start
+    result = {
+        "upstream_fps": (relay.frames_in - frames0) / elapsed,
+        "lag_p50": pct(lags, 0.5), "lag_p99": pct(lags, 0.99), "lag_max": max(lags),
+        "cpu": (time.process_time() - cpu0) / elapsed * 100,
+        "encodes": relay.encodes, "frames_in": relay.frames_in,
+        "dropped": sum(c.dropped for c in relay.clients),
+        "clients": len(relay.clients),
+    }
+    if child:
+        out = json.loads((await child.communicate())[0].decode().strip().splitlines()[-1])
+        delays = [(first_last[1] - published[int(seq)]) * 1000
+                  for seq, first_last in out["seen"].items() if int(seq) in published]
+        result.update(swarm_cpu=out["cpu"], frames=out["frames"], errors=out["errors"], crc_errors=out["crc_errors"],
+                      delay_p50=pct(delays, 0.5), delay_p95=pct(delays, 0.95), delay_max=max(delays or [0]))
+    task.cancel()
+    standin.terminate()
+    standin.wait()
+    await asyncio.sleep(0.2)
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load test pico_relay.py with a spectator swarm")
+    ap.add_argument("--spectators", type=int, default=300, help="TCP spectators (they ack)")
+    ap.add_argument("--ws", type=int, default=50, help="WebSocket spectators (they never ack)")
+    ap.add_argument("--slow", type=int, default=20, help="TCP spectators reading 1 KB/s, no acks")
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--bot", type=float, default=0.5, help="stand-in bot key chance per pass")
+    ap.add_argument("--queue", type=int, default=8)
+    ap.add_argument("--decode-every", type=int, default=10,
+                    help="every Nth spectator decodes; the rest only CRC-check, to spare the CPU")
+    ap.add_argument("--swarm", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.swarm:
+        asyncio.run(swarm(args.spectators, args.ws, args.slow, args.decode_every, args.seconds))
+        return
+
+    base = asyncio.run(measure(args, 0, 0, 0))
+    load = asyncio.run(measure(args, args.spectators, args.ws, args.slow))
+    print("%-24s %10s %10s" % ("", "alone", "swarm"))
+    for key, fmt in (("upstream_fps", "%.1f"), ("lag_p50", "%.2f ms"), ("lag_p99", "%.2f ms"),
+                     ("lag_max", "%.2f ms"), ("cpu", "%.1f%%"), ("clients", "%d")):
+        print("%-24s %10s %10s" % (key, fmt % base[key], fmt % load[key]))
+    print("swarm: %d frames received, %d errors, %d CRC errors, %d dropped for slow clients, "
+          "%d encodes for %d upstream frames" % (load["frames"], load["errors"], load["crc_errors"],
+                                                 load["dropped"], load["encodes"], load["frames_in"]))
+    print("publish -> last spectator: p50 %.1f ms, p95 %.1f ms, max %.1f ms (swarm CPU %.0f%%)" % (
+        load["delay_p50"], load["delay_p95"], load["delay_max"], load["swarm_cpu"]))
+
+
+if __name__ == "__main__":
+    main()
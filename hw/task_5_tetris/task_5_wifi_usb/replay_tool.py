@@ -0,0 +1,92 @@
+# replay_tool.py
+# Replays match logs (tetris_replay.py) headlessly on the shared engine and
+# checks every checkpoint and the final state hash against what the Pico
+# recorded. Exits non-zero if any log desyncs.
+#
+#   mpremote cp :replay.trl .              # the log the Pico saved at game over
+#   python replay_tool.py replay.trl       # verify
+#   python replay_tool.py logs/*.trl --bench 20   # regression benchmark
+#   python replay_tool.py replay.trl --dump       # list the events
+#
+# The unified client also saves logs sent over the link (replay_<seed>.trl),
+# and pico_standin.py --replay-dir DIR records every stand-in game.
+#
+# --bench replays each log N times and reports events and game time per
+# second of host time, so changes to the engine can be timed against real
+# matches rather than synthetic ones.
+
+import argparse
+import sys
+import time
+
+from tetris_replay import read_log, replay, GRAVITY, CLEAR, KEY, PAUSE, CHECK, END, ACTIONS
+
+NAMES = {GRAVITY: "gravity", CLEAR: "clear", PAUSE: "pause", CHECK: "check", END: "end"}
+NAMES.update({KEY + k: "p%d %s" % (1 + k // 4, ACTIONS[k % 4]) for k in range(8)})
+
+
+def describe(seed, events):
+    keys = sum(1 for e in events if KEY <= e[1] < KEY + 8)
+    steps = sum(1 for e in events if e[1] == GRAVITY)
+    ended = bool(events) and events[-1][1] == END
+    return "seed %08x, %d events (%d keys, %d gravity steps), %.1f s of play%s" % (
+        seed, len(events), keys, steps, events[-1][0] / 1000 if events else 0,
+        "" if ended else ", no END (cut short)")
+
+
+def dump(events):
+    for t, code, value in events:
+        extra = " %08x" % value if value is not None else ""
+        print("%9.3f  %s%s" % (t / 1000, NAMES.get(code, "code %d" % code), extra))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay and verify Pico Tetris match logs")
+    ap.add_argument("logs", nargs="+", help=".trl files")
+    ap.add_argument("--dump", action="store_true", help="print every event")
+    ap.add_argument("--bench", type=int, default=0, metavar="N", help="replay each log N times and time it")
+    args = ap.parse_args()
+
+    failed = 0
+    total_events = total_ms = total_s = 0.0
+    for path in args.logs:
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            seed, events = read_log(data)
+        except ValueError as e:
+            print("%s: %s" % (path, e))
+            failed += 1
+            continue
+        print("%s: %d bytes, %s" % (path, len(data), describe(seed, events)))
+        if args.dump:
+            dump(events)
+
+        game, checks, errors = replay(seed, events)
+        for i, t, expected, got in errors[:5]:
+            print("  DESYNC at event %d (%.3f s): hash %08x, replay %08x" % (i, t / 1000, expected, got))
+        if errors:
+            failed += 1
+        else:
+            print("  ok: %d hashes match, score %d%s" % (checks, game.score, ", game over" if game.game_over else ""))
+
+        if args.bench:
+            start = time.perf_counter()
+            for _ in range(args.bench):
+                replay(seed, events)
+            elapsed = time.perf_counter() - start
+            total_events += len(events) * args.bench
+            total_ms += (events[-1][0] if events else 0) * args.bench
+            total_s += elapsed
+            print("  bench: %.0f events/s, %.0fx real time" % (
+                len(events) * args.bench / elapsed, (events[-1][0] if events else 0) * args.bench / 1000 / elapsed))
+
+    if args.bench and len(args.logs) > 1 and total_s:
+        print("all logs: %.0f events/s, %.0fx real time" % (total_events / total_s, total_ms / 1000 / total_s))
+    if failed:
+        print("%d of %d log(s) failed" % (failed, len(args.logs)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
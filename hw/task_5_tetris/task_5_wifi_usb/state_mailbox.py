@@ -0,0 +1,62 @@
+# state_mailbox.py
+# Hand-over from a PC client's link thread to its GUI loop.
+#
+# Every state frame from the Pico is a complete picture of the game, so
+# only the newest one matters: Mailbox keeps a single slot that put()
+# overwrites and take() empties, counting the frames that were replaced
+# before the GUI got to them. The link thread posts the raw frame and the
+# GUI decodes only what it takes, so superseded frames are never decoded.
+# Things that must not be lost to a newer state (errors, line clears) go
+# through EventQueue, a bounded FIFO that drops its oldest entry when full.
+
+import threading
+from collections import deque
+
+
+class Mailbox:
+    """Latest-value slot shared by one writer and one reader thread."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = None
+        self._full = False
+        # Stats
+        self.posted = 0
+        self.dropped = 0  # Overwritten before take()
+
+    def put(self, value):
+        with self._lock:
+            if self._full:
+                self.dropped += 1
+            self._value = value
+            self._full = True
+            self.posted += 1
+
+    def take(self, default=None):
+        """The newest value since the last take(), or `default`."""
+        with self._lock:
+            if not self._full:
+                return default
+            value, self._value = self._value, None
+            self._full = False
+            return value
+
+
+class EventQueue:
+    """Bounded FIFO of events; when full the oldest event is dropped."""
+    def __init__(self, maxlen=32):
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=maxlen)
+        self.dropped = 0
+
+    def put(self, event):
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+
+    def get_all(self):
+        """Every event since the last call, oldest first."""
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            return events
@@ -0,0 +1,111 @@
+# tetris_predict.py
+# Client-side prediction for the unified client, on the shared engine.
+#
+# Every key the client sends is followed by a latency-trace mark, and the
+# Pico echoes the newest mark it has applied (see latency_trace.py). Those
+# mark ids double as input sequence numbers: the predicted view is the
+# newest authoritative frame, rebuilt as a TetrisGame from its grid and
+# active pieces, with every input the Pico has not echoed yet applied on
+# top. A local player's move or turn is therefore drawn at once instead of
+# a round trip later, and each frame snaps the view back to the Pico's.
+#
+# When an echo arrives, the piece the prediction expected right after that
+# input is compared with the Pico's in the next frame; a different position
+# or rotation counts as a mismatch (lockstep_check.py measures the rate).
+
+from tetris_engine import TetrisGame, WIDTH, HEIGHT, STATIC_COLOR
+
+PREDICTED = ('left', 'right', 'rotate')  # Drops lock pieces, left to the Pico
+
+
+class Predictor:
+    def __init__(self, players=(1, 2), actions=PREDICTED):
+        self.players = players
+        self.actions = actions
+        self.pending = []  # (id, player, action) sent, not echoed yet, oldest first
+        self.expect = {}  # id -> (player, (shape, rotation, x)) right after it
+        self.echoed = None  # Newest echoed id with an expectation to check
+        self.state = None  # Newest authoritative state
+        self.game = TetrisGame(0)  # Replica: the state plus pending inputs
+        self.grid = None  # What to draw
+        # Stats
+        self.predicted = 0
+        self.checked = 0
+        self.mismatches = 0
+
+    def active(self):
+        state = self.state
+        return state is not None and not state["paused"] and not state["game_over"]
+
+    def input(self, input_id, player, action):
+        """A key sent to the Pico with mark `input_id`. Returns True if the
+        predicted view changed."""
+        self.pending.append((input_id, player, action))
+        if not self.active() or not self._predicts(player, action):
+            return False
+        game = self.game
+        before = game.piece_states()[player - 1]
+        game.handle_input(player, action)
+        after = game.piece_states()[player - 1]
+        self.predicted += 1
+        if after is not None:
+            self.expect[input_id] = (player, after[:3])
+        if after == before:
+            return False
+        self.grid = game.cell_grid()
+        return True
+
+    def echo(self, input_id):
+        """The Pico echoed mark `input_id`: that input and every earlier one
+        are in its frames from now on."""
+        # Marks the client didn't predict (pause, or keys sent with prediction
+        # off) are echoed too, so drop by order rather than exact id
+        self.pending = [e for e in self.pending if (input_id - e[0]) & 0xFFFF >= 0x8000]
+        self.echoed = input_id if input_id in self.expect else None
+
+    def frame(self, state):
+        """New authoritative state. Returns the grid to draw."""
+        self.state = state
+        if self.echoed is not None:
+            player, expected = self.expect[self.echoed]
+            piece = state["pieces"][player - 1]
+            # A piece that gravity locked meanwhile can't be compared
+            if piece is not None and piece[0] == expected[0]:
+                self.checked += 1
+                if piece[:3] != expected:
+                    self.mismatches += 1
+            self.echoed = None
+        pending_ids = [e[0] for e in self.pending]
+        for input_id in [i for i in self.expect if i not in pending_ids]:
+            del self.expect[input_id]
+
+        # Reset the replica to the frame, then replay what the Pico has not applied
+        game = self.game
+        grid = state["grid"]
+        rows = game.rows
+        i = 0
+        for y in range(HEIGHT):
+            bits = 0
+            for x in range(WIDTH):
+                if grid[i] == STATIC_COLOR:
+                    bits |= 1 << (WIDTH - 1 - x)
+                i += 1
+            rows[y] = bits
+        game.set_piece(1, state["pieces"][0])
+        game.set_piece(2, state["pieces"][1])
+        game.game_over = False
+        replayed = False
+        if self.active():
+            for _, player, action in self.pending:
+                if self._predicts(player, action):
+                    game.handle_input(player, action)
+                    replayed = True
+        self.grid = game.cell_grid() if replayed else grid
+        return self.grid
+
+    def _predicts(self, player, action):
+        return player in self.players and action in self.actions
+
+    def report(self):
+        return "prediction: %d inputs, %d checked, %d mismatches" % (
+            self.predicted, self.checked, self.mismatches)
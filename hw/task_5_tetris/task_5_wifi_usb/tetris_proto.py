@@ -0,0 +1,474 @@
+# tetris_proto.py
+# Binary state frames between the Pico and the PC clients. Shared by the
+# firmware and the PC tools; runs unchanged on MicroPython and CPython.
+#
+# Frame (all integers big-endian):
+#   A5 5A | version | type | seq:u16 | length:u16 | payload | crc16:u16
+# The CRC (CCITT, init FFFF) covers version .. payload. The sync bytes never
+# occur in our text prints, so a reader can resync on a stream that mixes
+# debug lines and frames.
+#
+# Payload, both types:
+#   score:u32 | flags:u8 | p1_next:u8 | p2_next:u8
+#   2 x (shape:u8 | rotation:u8 | x:s8 | y:s8)   active pieces, P1 then P2
+#   [trace_id:u16 | hold:u16]    only with FLAG_TRACE
+# FULL:  then HEIGHT rows
+# DELTA: then base_seq:u16 | count:u8 | count x (row:u8, row bytes)
+#
+# A row is two bit planes of WIDTH bits, high plane first, so the 2-bit
+# color of cell x is (hi_bit << 1) | lo_bit. Colors are 1 = player 1,
+# 2 = player 2, 3 = placed, so lo = placed | p1 and hi = placed | p2.
+#
+# A DELTA carries the rows that differ from frame `base_seq`, the newest
+# frame the client has acknowledged with "#xxxx" (seq in hex) on the
+# input channel. Without a usable ack the encoder sends FULL frames.
+#
+# The active pieces (shape index, 0xFF once placed) let a client rebuild
+# the engine state from a frame and predict its own moves (tetris_predict).
+#
+# A trace echoes the newest "!xxxx" latency mark from the client (see
+# TraceMarks in tetris_transport.py) with the time in 0.1 ms the Pico held
+# it before this frame went out.
+
+from array import array
+
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
+
+from tetris_engine import WIDTH, HEIGHT, TETROMINO_KEYS
+
+VERSION = const(3)
+SYNC0 = const(0xA5)
+SYNC1 = const(0x5A)
+FRAME_FULL = const(1)
+FRAME_DELTA = const(2)
+
+FLAG_PAUSED = const(1)
+FLAG_GAME_OVER = const(2)
+FLAG_TRACE = const(4)
+NO_PIECE = const(0xFF)
+
+HEADER_SIZE = const(8)
+COMMON_SIZE = const(15)
+TRACE_SIZE = const(4)
+ROW_BYTES = const(4)  # two 16-bit planes (WIDTH is 16)
+GRID_BYTES = ROW_BYTES * HEIGHT
+MAX_FRAME = HEADER_SIZE + COMMON_SIZE + TRACE_SIZE + 3 + HEIGHT * (1 + ROW_BYTES) + 2
+
+# ---------------------------------------------------------------
+# CRC-16/CCITT-FALSE
+# ---------------------------------------------------------------
+
+def _crc_table():
+    table = array('H', [0] * 256)
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table[i] = crc & 0xFFFF
+    return table
+
+CRC_TABLE = _crc_table()
+
+def crc16(data, start=0, end=None, crc=0xFFFF):
+    table = CRC_TABLE
+    if end is None:
+        end = len(data)
+    for i in range(start, end):
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ data[i]]
+    return crc
+
+def piece_index(key):
+    return TETROMINO_KEYS.index(key) if key else NO_PIECE
+
+def encode_ack(seq):
+    """Input-channel token acknowledging frame `seq`."""
+    return "#%04x" % seq
+
+# ---------------------------------------------------------------
+# Encoder (Pico side)
+# ---------------------------------------------------------------
+
+class StateEncoder:
+    """Builds frames into one preallocated buffer.
+
+    Keeps the packed grids of the last `history` frames so a DELTA can be
+    taken against whichever of them the client acknowledged last.
+    """
+    def __init__(self, history=8):
+        self.history = history
+        self.grids = [bytearray(GRID_BYTES) for _ in range(history)]
+        self.grid_seq = array('l', [-1] * history)
+        self.lo = array('H', [0] * HEIGHT)
+        self.hi = array('H', [0] * HEIGHT)
+        self.changed = bytearray(HEIGHT)
+        self.buf = bytearray(MAX_FRAME)
+        self.seq = 0
+        self.acked = -1
+        self.full_frames = 0
+        self.delta_frames = 0
+        self.bytes_sent = 0
+
+    def ack(self, seq):
+        self.acked = seq
+
+    def reset(self):
+        """Forget acks, e.g. when a new client connects."""
+        self.acked = -1
+
+    def _base(self):
+        # The acked grid, if it is still in the ring and not about to be reused
+        acked = self.acked
+        if acked < 0 or (self.seq - acked) & 0xFFFF >= self.history:
+            return None
+        slot = acked % self.history
+        if self.grid_seq[slot] != acked:
+            return None
+        return self.grids[slot]
+
+    def encode(self, game, paused=False, trace=None):
+        """Frame for the current game state, as a memoryview into self.buf.
+
+        trace: (id, hold) from TraceMarks.take() to echo, or None.
+        """
+        self.seq = seq = (self.seq + 1) & 0xFFFF
+        base = self._base()
+        slot = seq % self.history
+        grid = self.grids[slot]
+        self.grid_seq[slot] = seq
+
+        lo, hi = self.lo, self.hi
+        game.color_planes(lo, hi)
+        i = 0
+        for y in range(HEIGHT):
+            h = hi[y]
+            l = lo[y]
+            grid[i] = h >> 8
+            grid[i + 1] = h & 0xFF
+            grid[i + 2] = l >> 8
+            grid[i + 3] = l & 0xFF
+            i += 4
+
+        buf = self.buf
+        buf[0] = SYNC0
+        buf[1] = SYNC1
+        buf[2] = VERSION
+        buf[4] = seq >> 8
+        buf[5] = seq & 0xFF
+        score = game.score
+        buf[8] = (score >> 24) & 0xFF
+        buf[9] = (score >> 16) & 0xFF
+        buf[10] = (score >> 8) & 0xFF
+        buf[11] = score & 0xFF
+        buf[12] = (FLAG_PAUSED if paused else 0) | (FLAG_GAME_OVER if game.game_over else 0)
+        buf[13] = piece_index(game.p1.next_shape)
+        buf[14] = piece_index(game.p2.next_shape)
+        n = 15  # Active pieces follow the next shapes
+        for player in (game.p1, game.p2):
+            if player.is_placed:
+                buf[n] = NO_PIECE
+                buf[n + 1] = buf[n + 2] = buf[n + 3] = 0
+            else:
+                buf[n] = piece_index(player.shape_key)
+                buf[n + 1] = player.rotation
+                buf[n + 2] = player.x & 0xFF
+                buf[n + 3] = player.y & 0xFF
+            n += 4
+        if trace is not None:
+            buf[12] |= FLAG_TRACE
+            buf[n] = trace[0] >> 8
+            buf[n + 1] = trace[0] & 0xFF
+            buf[n + 2] = trace[1] >> 8
+            buf[n + 3] = trace[1] & 0xFF
+            n += TRACE_SIZE
+
+        changed = 0
+        if base is not None:
+            rows = self.changed
+            for y in range(HEIGHT):
+                i = y * ROW_BYTES
+                if (grid[i] != base[i] or grid[i + 1] != base[i + 1]
+                        or grid[i + 2] != base[i + 2] or grid[i + 3] != base[i + 3]):
+                    rows[changed] = y
+                    changed += 1
+        if base is not None and 3 + changed * (1 + ROW_BYTES) < GRID_BYTES:
+            buf[3] = FRAME_DELTA
+            buf[n] = self.acked >> 8
+            buf[n + 1] = self.acked & 0xFF
+            buf[n + 2] = changed
+            n += 3
+            for k in range(changed):
+                y = rows[k]
+                i = y * ROW_BYTES
+                buf[n] = y
+                buf[n + 1] = grid[i]
+                buf[n + 2] = grid[i + 1]
+                buf[n + 3] = grid[i + 2]
+                buf[n + 4] = grid[i + 3]
+                n += 1 + ROW_BYTES
+            self.delta_frames += 1
+        else:
+            buf[3] = FRAME_FULL
+            buf[n:n + GRID_BYTES] = grid
+            n += GRID_BYTES
+            self.full_frames += 1
+
+        length = n - HEADER_SIZE
+        buf[6] = length >> 8
+        buf[7] = length & 0xFF
+        crc = crc16(buf, 2, n)
+        buf[n] = crc >> 8
+        buf[n + 1] = crc & 0xFF
+        n += 2
+        self.bytes_sent += n
+        return memoryview(buf)[:n]
+
+class CommandReader:
+    """Splits the Pico's input channel into key commands and frame acks."""
+    def __init__(self, encoder):
+        self.encoder = encoder
+        self.digits = -1  # hex digits still expected after '#', -1 when idle
+        self.value = 0
+
+    def feed(self, ch):
+        """Take one input character; returns it if it is a key command."""
+        if self.digits >= 0:
+            try:
+                self.value = (self.value << 4) | int(ch, 16)
+            except ValueError:
+                self.digits = -1  # Broken ack, treat ch as a command
+                return ch
+            self.digits -= 1
+            if self.digits == 0:
+                self.digits = -1
+                self.encoder.ack(self.value)
+            return None
+        if ch == '#':
+            self.digits = 4
+            self.value = 0
+            return None
+        return ch
+
+# ---------------------------------------------------------------
+# Decoder (PC side)
+# ---------------------------------------------------------------
+
+class StateDecoder:
+    """Reassembles frames from a byte stream.
+
+    feed() returns the decoded states as dicts shaped like the old JSON
+    frames (plus "seq"); bytes outside frames are collected as text lines
+    in self.lines for the caller to print or inspect. A DELTA copies its
+    base's cell list and rewrites only the changed rows, so treat the
+    returned grids as read-only.
+
+    feed() is split() followed by decode() on every frame. A client that
+    only shows the newest state can split() in its reader thread and
+    decode() just the frames it takes; the two halves share no state.
+    DELTA bases are frames the client acked, so ack only decoded frames.
+    """
+    def __init__(self, history=16):
+        self.history = history
+        self.buf = bytearray()
+        self.grids = {}  # seq -> cell list, for DELTA bases
+        self.last_seq = -1
+        self.lines = []
+        self._text = bytearray()
+        self.frames = 0
+        self.crc_errors = 0
+        self.missing_base = 0
+
+    def feed(self, data):
+        states = []
+        for frame in self.split(data):
+            state = self.decode(frame)
+            if state is not None:
+                states.append(state)
+        return states
+
+    def split(self, data):
+        """Complete, CRC-checked frames in `data` (plus earlier leftovers),
+        as bytes, without decoding them."""
+        self.buf += data
+        buf = self.buf
+        frames = []
+        i = 0
+        n = len(buf)
+        while i < n:
+            if buf[i] != SYNC0 or (i + 1 < n and buf[i + 1] != SYNC1):
+                self._take_text(buf[i])
+                i += 1
+                continue
+            if n - i < HEADER_SIZE:
+                break
+            length = (buf[i + 6] << 8) | buf[i + 7]
+            end = i + HEADER_SIZE + length
+            if buf[i + 2] != VERSION or length > MAX_FRAME:
+                self._take_text(buf[i])
+                i += 1
+                continue
+            if n < end + 2:
+                break
+            crc = (buf[end] << 8) | buf[end + 1]
+            if crc16(buf, i + 2, end) != crc:
+                self.crc_errors += 1
+                i += 1
+                continue
+            frames.append(bytes(buf[i:end + 2]))
+            i = end + 2
+        del buf[:i]
+        return frames
+
+    def _take_text(self, b):
+        if b == 10:
+            line = self._text.decode("utf-8", "replace").strip()
+            if line:
+                self.lines.append(line)
+            self._text = bytearray()
+        elif len(self._text) < 256:
+            self._text.append(b)
+
+    def decode(self, frame):
+        """State dict of one frame from split(), or None if its DELTA base
+        is gone."""
+        buf, i = frame, 0
+        kind = buf[i + 3]
+        seq = (buf[i + 4] << 8) | buf[i + 5]
+        p = i + HEADER_SIZE
+        score = (buf[p] << 24) | (buf[p + 1] << 16) | (buf[p + 2] << 8) | buf[p + 3]
+        flags = buf[p + 4]
+        p1_next, p2_next = buf[p + 5], buf[p + 6]
+        pieces = (_piece(buf, p + 7), _piece(buf, p + 11))
+        p += COMMON_SIZE
+        trace = None
+        if flags & FLAG_TRACE:
+            trace = ((buf[p] << 8) | buf[p + 1], (buf[p + 2] << 8) | buf[p + 3])
+            p += TRACE_SIZE
+        if kind == FRAME_FULL:
+            cells = []
+            for _ in range(HEIGHT):
+                cells += unpack_row(buf, p)
+                p += ROW_BYTES
+        elif kind == FRAME_DELTA:
+            base = self.grids.get((buf[p] << 8) | buf[p + 1])
+            if base is None:
+                self.missing_base += 1
+                return None
+            cells = base[:]
+            count = buf[p + 2]
+            p += 3
+            for _ in range(count):
+                j = buf[p] * WIDTH
+                cells[j:j + WIDTH] = unpack_row(buf, p + 1)
+                p += 1 + ROW_BYTES
+        else:
+            return None
+        self.grids[seq] = cells
+        if len(self.grids) > self.history:
+            del self.grids[next(iter(self.grids))]
+        self.last_seq = seq
+        self.frames += 1
+        return {
+            "seq": seq,
+            "grid": cells,
+            "score": score,
+            "p1_next": TETROMINO_KEYS[p1_next] if p1_next < len(TETROMINO_KEYS) else "",
+            "p2_next": TETROMINO_KEYS[p2_next] if p2_next < len(TETROMINO_KEYS) else "",
+            "game_over": bool(flags & FLAG_GAME_OVER),
+            "paused": bool(flags & FLAG_PAUSED),
+            "trace": trace,
+            "pieces": pieces,
+        }
+
+
+def frame_seq(frame):
+    return (frame[4] << 8) | frame[5]
+
+def frame_score(frame):
+    """Score field of a frame from StateDecoder.split(), without decoding it."""
+    p = HEADER_SIZE
+    return (frame[p] << 24) | (frame[p + 1] << 16) | (frame[p + 2] << 8) | frame[p + 3]
+
+
+def _piece(buf, i):
+    # (shape, rotation, x, y) as in TetrisGame.piece_states(), or None
+    if buf[i] >= len(TETROMINO_KEYS):
+        return None
+    x, y = buf[i + 2], buf[i + 3]
+    return (TETROMINO_KEYS[buf[i]], buf[i + 1], x - 256 if x > 127 else x, y - 256 if y > 127 else y)
+
+def frame_trace(frame):
+    """(id, hold) echoed by a frame from StateDecoder.split(), or None."""
+    p = HEADER_SIZE + COMMON_SIZE
+    if not frame[HEADER_SIZE + 4] & FLAG_TRACE:
+        return None
+    return (frame[p] << 8) | frame[p + 1], (frame[p + 2] << 8) | frame[p + 3]
+
+
+# Four cells from a high-plane nibble and a low-plane nibble
+_NIBBLES = [tuple(((h >> b) & 1) << 1 | ((l >> b) & 1) for b in (3, 2, 1, 0))
+            for h in range(16) for l in range(16)]
+
+def unpack_row(data, i):
+    """Colors of the packed row at data[i:i + ROW_BYTES], left to right."""
+    nib = _NIBBLES
+    h0, h1, l0, l1 = data[i], data[i + 1], data[i + 2], data[i + 3]
+    return (nib[(h0 & 0xF0) | (l0 >> 4)] + nib[((h0 & 0x0F) << 4) | (l0 & 0x0F)]
+            + nib[(h1 & 0xF0) | (l1 >> 4)] + nib[((h1 & 0x0F) << 4) | (l1 & 0x0F)])
+
+# ---------------------------------------------------------------
+# Re-encoding decoded states (PC side, e.g. pico_relay.py)
+# ---------------------------------------------------------------
+
+def pack_grid(grid):
+    """Packed rows (GRID_BYTES, as in a FULL frame) of a state's grid."""
+    out = bytearray(GRID_BYTES)
+    i = 0
+    for y in range(HEIGHT):
+        h = l = 0
+        for c in grid[y * WIDTH:(y + 1) * WIDTH]:
+            h = (h << 1) | (c >> 1)
+            l = (l << 1) | (c & 1)
+        out[i] = h >> 8
+        out[i + 1] = h & 0xFF
+        out[i + 2] = l >> 8
+        out[i + 3] = l & 0xFF
+        i += ROW_BYTES
+    return bytes(out)
+
+def build_frame(seq, state, rows, base_rows=None, base_seq=0, trace=None):
+    """Frame `seq` for a decoded state whose grid packs to `rows`: a DELTA
+    against `base_rows` (frame `base_seq`) if given and smaller, else FULL."""
+    flags = (FLAG_PAUSED if state["paused"] else 0) | (FLAG_GAME_OVER if state["game_over"] else 0)
+    score = state["score"]
+    body = bytearray((score >> 24, (score >> 16) & 0xFF, (score >> 8) & 0xFF, score & 0xFF, flags,
+                      piece_index(state["p1_next"]), piece_index(state["p2_next"])))
+    for piece in state["pieces"]:
+        if piece is None:
+            body += bytes((NO_PIECE, 0, 0, 0))
+        else:
+            body += bytes((piece_index(piece[0]), piece[1], piece[2] & 0xFF, piece[3] & 0xFF))
+    if trace is not None:
+        body[4] |= FLAG_TRACE
+        body += bytes((trace[0] >> 8, trace[0] & 0xFF, trace[1] >> 8, trace[1] & 0xFF))
+    kind = FRAME_FULL
+    if base_rows is not None:
+        changed = [y for y in range(HEIGHT)
+                   if rows[y * ROW_BYTES:(y + 1) * ROW_BYTES] != base_rows[y * ROW_BYTES:(y + 1) * ROW_BYTES]]
+        if 3 + len(changed) * (1 + ROW_BYTES) < GRID_BYTES:
+            kind = FRAME_DELTA
+            body += bytes((base_seq >> 8, base_seq & 0xFF, len(changed)))
+            for y in changed:
+                body.append(y)
+                body += rows[y * ROW_BYTES:(y + 1) * ROW_BYTES]
+    if kind == FRAME_FULL:
+        body += rows
+    n = len(body)
+    frame = bytearray((SYNC0, SYNC1, VERSION, kind, seq >> 8, seq & 0xFF, n >> 8, n & 0xFF)) + body
+    crc = crc16(frame, 2)
+    frame.append(crc >> 8)
+    frame.append(crc & 0xFF)
+    return bytes(frame)
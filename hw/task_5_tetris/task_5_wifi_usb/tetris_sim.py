@@ -0,0 +1,161 @@
+# tetris_sim.py
+# Headless PC simulator on the shared bitboard engine: plays games with
+# bots as fast as possible and reports engine throughput.
+#
+#   python tetris_sim.py --games 200 --seed 1
+#   python tetris_sim.py --bot random     # key mashing, never clears a line
+#
+# The default bot (PlacingBot) lands each piece where it keeps the stack
+# flat, so games clear lines and the clear and scoring paths run too.
+# lockstep_check.py uses it for the same reason.
+
+import argparse
+import random
+import time
+
+from tetris_engine import TetrisGame, WIDTH, HEIGHT, FULL_ROW
+
+ACTIONS = ('left', 'right', 'rotate', 'down', None, None)
+COLUMN_BITS = [1 << (WIDTH - 1 - x) for x in range(WIDTH)]
+POPCOUNT = bytes(bin(i).count('1') for i in range(256))
+
+
+def evaluate(rows):
+    """Score a board after a placement, higher is better: cleared lines
+    count for it, holes, height and bumpiness against it."""
+    kept = [row for row in rows if row and row != FULL_ROW]  # Empty rows only sit on top
+    lines = sum(1 for row in rows if row == FULL_ROW)
+    heights = [0] * WIDTH
+    covered = holes = 0
+    n = len(kept)
+    for y, row in enumerate(kept):
+        new = row & ~covered
+        if new:
+            for x in range(WIDTH):
+                if new & COLUMN_BITS[x]:
+                    heights[x] = n - y
+            covered |= new
+        gaps = covered & ~row
+        if gaps:
+            holes += POPCOUNT[gaps >> 8] + POPCOUNT[gaps & 0xFF]
+    bumps = sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+    return 3.0 * lines - 0.5 * sum(heights) - 3.5 * holes - 0.2 * bumps
+
+
+class PlacingBot:
+    """Plays one player: picks the landing spot (rotation, x) that keeps
+    the stack flattest, turns the piece, walks it there and drops it.
+    Player 1 keeps to the left half and player 2 to the right one, since a
+    piece that lands on the other player's falling piece locks in mid-air."""
+    def __init__(self, game, player):
+        self.game = game
+        self.player = player
+        half = WIDTH // 2
+        self.columns = (0, half) if player == 1 else (half, WIDTH)
+        self.target = None
+        self.piece = None
+
+    def plan(self, p):
+        rows = list(self.game.rows)
+        tops = [HEIGHT] * WIDTH  # First filled row of each column
+        covered = 0
+        for y, row in enumerate(rows):
+            new = row & ~covered
+            if new:
+                for x in range(WIDTH):
+                    if new & COLUMN_BITS[x]:
+                        tops[x] = y
+                covered |= new
+        best = None
+        for rotation in range(4 if p.shape_key != 'O' else 1):
+            left, top, width, height, masks, cells = p.states[rotation]
+            bottoms = {}  # Column offset -> lowest cell of the piece in it
+            for px, py in cells:
+                bottoms[px] = max(py, bottoms.get(px, py))
+            for x in range(self.columns[0] - left, self.columns[1] - width - left + 1):
+                # Dropped straight down, the piece stops on the highest cell below it
+                y = min(tops[x + px] - 1 - py for px, py in bottoms.items())
+                if y + top < 0:
+                    continue
+                placed = rows[:]
+                shift = x + left
+                for i in range(height):
+                    placed[y + top + i] |= masks[i] >> shift
+                score = evaluate(placed)
+                if best is None or score > best[0]:
+                    best = (score, rotation, x)
+        return best[1:] if best else (p.rotation, p.x)
+
+    def act(self):
+        """The next action towards the planned spot, or None."""
+        p = self.game.p1 if self.player == 1 else self.game.p2
+        if p.is_placed:
+            self.piece = None
+            return None
+        piece = (p.shape_key, p.y)
+        if self.piece is None or piece[0] != self.piece[0] or p.y < self.piece[1]:
+            self.target = self.plan(p)  # A new piece
+        self.piece = piece
+        rotation, x = self.target
+        if p.rotation != rotation:
+            return 'rotate'
+        if p.x != x:
+            return 'left' if p.x > x else 'right'
+        return 'down'
+
+
+def play(seed, max_ticks, input_rate, bot_kind="place"):
+    """One game: each tick both bots may act, then gravity. Returns stats;
+    bot_s is the time the bots spent choosing moves."""
+    bot = random.Random(seed ^ 0x5EED)
+    game = TetrisGame(seed)
+    placers = (PlacingBot(game, 1), PlacingBot(game, 2))
+    ticks = lines = 0
+    bot_s = 0.0
+    while not game.game_over and ticks < max_ticks:
+        for player in (1, 2):
+            if bot.random() < input_rate:
+                if bot_kind == "place":
+                    t = time.perf_counter()
+                    action = placers[player - 1].act()
+                    bot_s += time.perf_counter() - t
+                else:
+                    action = bot.choice(ACTIONS)
+                if action:
+                    game.handle_input(player, action)
+        cleared = game.step_gravity()
+        if cleared:
+            lines += len(cleared)
+            game.finish_line_clear(cleared)
+        ticks += 1
+    return ticks, lines, game.score, bot_s
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run headless Tetris games on the bitboard engine")
+    ap.add_argument("--games", type=int, default=100)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--max-ticks", type=int, default=5000)
+    ap.add_argument("--input-rate", type=float, default=0.8, help="chance per tick that a bot acts")
+    ap.add_argument("--bot", choices=("place", "random"), default="place")
+    args = ap.parse_args()
+
+    total_ticks = total_lines = best = 0
+    bot_s = 0.0
+    start = time.perf_counter()
+    for g in range(args.games):
+        ticks, lines, score, bot = play(args.seed + g, args.max_ticks, args.input_rate, args.bot)
+        bot_s += bot
+        total_ticks += ticks
+        total_lines += lines
+        best = max(best, score)
+    elapsed = time.perf_counter() - start
+
+    print(f"games         {args.games}")
+    print(f"ticks         {total_ticks}   ({total_ticks / (elapsed - bot_s):,.0f} ticks/s, bot time excluded)")
+    print(f"lines         {total_lines}   best score {best}")
+    print(f"time          {elapsed:.2f} s   ({bot_s:.2f} s in the bot)")
+
+
+if __name__ == "__main__":
+    main()
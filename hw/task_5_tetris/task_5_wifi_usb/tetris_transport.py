@@ -0,0 +1,167 @@
+# tetris_transport.py
+# Input side of the Pico transports. Every loop pass drains all pending
+# bytes from USB stdin or the client socket into a ring buffer, then the
+# game loop takes out and applies every command in the same pass, so a
+# burst of keys from both players lands in one tick.
+# Shared by tetris_pico_v3.py and pico_tetris_unified.py; runs on
+# MicroPython and CPython.
+
+import sys
+import select
+import time
+from array import array
+
+try:
+    ticks_diff = time.ticks_diff
+except AttributeError:  # CPython (pico_standin.py): plain microsecond counts
+    def ticks_diff(a, b):
+        return a - b
+
+class InputRing:
+    """Fixed-size byte FIFO, each byte stamped with its arrival time.
+
+    Stats for tuning: depth_max (most bytes waiting at once), dropped
+    (bytes lost to a full ring), and the input-to-apply latency of the
+    commands the loop marks with applied().
+    """
+    def __init__(self, size=128):
+        self.size = size
+        self.buf = bytearray(size)
+        self.stamps = array('L', [0] * size)  # ticks_us on arrival
+        self.head = 0  # next write
+        self.tail = 0  # next read
+        self.count = 0
+        self.last_stamp = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.depth_max = 0
+        self.dropped = 0
+        self.applied_count = 0
+        self.latency_sum = 0
+        self.latency_max = 0
+
+    def put(self, data, now):
+        for b in data:
+            if self.count == self.size:
+                self.dropped += 1
+                continue
+            self.buf[self.head] = b
+            self.stamps[self.head] = now
+            self.head = (self.head + 1) % self.size
+            self.count += 1
+        if self.count > self.depth_max:
+            self.depth_max = self.count
+
+    def clear(self):
+        self.head = self.tail = self.count = 0
+
+    def get(self):
+        """Oldest byte (the ring must not be empty)."""
+        b = self.buf[self.tail]
+        self.last_stamp = self.stamps[self.tail]
+        self.tail = (self.tail + 1) % self.size
+        self.count -= 1
+        return b
+
+    def applied(self):
+        """Record that the byte just taken was applied to the game."""
+        latency = ticks_diff(time.ticks_us(), self.last_stamp)
+        self.applied_count += 1
+        self.latency_sum += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+
+    def report(self):
+        avg = self.latency_sum // self.applied_count if self.applied_count else 0
+        return "input: %d cmds, depth max %d, dropped %d, latency avg %d max %d us" % (
+            self.applied_count, self.depth_max, self.dropped, avg, self.latency_max)
+
+class UsbInput:
+    """Drains USB serial stdin."""
+    def __init__(self, ring, stream=None):
+        self.ring = ring
+        self.stream = stream or sys.stdin
+        self.poller = select.poll()
+        self.poller.register(self.stream, select.POLLIN)
+
+    def drain(self):
+        """Move every pending byte into the ring. Returns the byte count."""
+        ring = self.ring
+        now = time.ticks_us()
+        n = 0
+        while ring.count < ring.size and self.poller.poll(0):
+            ch = self.stream.read(1)
+            if not ch:
+                break
+            ring.put(ch.encode() if isinstance(ch, str) else ch, now)
+            n += 1
+        return n
+
+class SocketInput:
+    """Drains a non-blocking client socket."""
+    def __init__(self, ring, sock, chunk=64):
+        self.ring = ring
+        self.sock = sock
+        self.chunk = chunk
+
+    def drain(self):
+        """Move every pending byte into the ring. Returns the byte count,
+        or -1 if the client has disconnected."""
+        ring = self.ring
+        now = time.ticks_us()
+        n = 0
+        while ring.count < ring.size:
+            try:
+                data = self.sock.recv(min(self.chunk, ring.size - ring.count))
+            except OSError:
+                break  # Nothing more pending
+            if not data:
+                return -1
+            ring.put(data, now)
+            n += len(data)
+        return n
+
+class TraceMarks:
+    """Latency trace marks in the command stream: '!' and a 4-digit hex id.
+
+    The PC client sends one after a key; the Pico echoes the id in the next
+    state it sends, with the time it held the mark, so the client can split
+    its round trip into link and Pico time. feed() swallows marks and
+    returns every other character; take() returns (id, hold in 0.1 ms) of
+    the newest mark since the last take(), or None.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget a half-read mark and any mark not yet taken."""
+        self.digits = -1  # hex digits still expected after '!', -1 when idle
+        self.value = 0
+        self.pending = None  # (id, arrival ticks_us)
+
+    def feed(self, ch, stamp):
+        """Take one input character and its arrival time (ticks_us)."""
+        if self.digits >= 0:
+            try:
+                self.value = (self.value << 4) | int(ch, 16)
+            except ValueError:
+                self.digits = -1  # Broken mark, treat ch as a command
+                return ch
+            self.digits -= 1
+            if self.digits == 0:
+                self.digits = -1
+                self.pending = (self.value, stamp)
+            return None
+        if ch == '!':
+            self.digits = 4
+            self.value = 0
+            return None
+        return ch
+
+    def take(self, now):
+        pending = self.pending
+        if pending is None:
+            return None
+        self.pending = None
+        return pending[0], min(ticks_diff(now, pending[1]) // 100, 0xFFFF)
@@ -36,6 +36,13 @@ class Matrix8x8:
         self.cs.on()  # Set CS high initially
         self.buffer = bytearray(8 * num)
         self.num = num
+        # One (register, data) pair per module: a whole daisy-chain
+        # transaction, reused for every row and command
+        self.tx = bytearray(2 * num)
+        # Last transmitted buffer; show() only sends rows that differ
+        self.shadow = bytearray(8 * num)
+        self.shadow_valid = False
+        self.bytes_sent = 0
         fb = framebuf.FrameBuffer(self.buffer, 8 * num, 8, self.orientation)
         self.framebuf = fb
         # Provide methods for accessing FrameBuffer graphics primitives. This is a workround
@@ -55,10 +62,14 @@ class Matrix8x8:
         self.init()
 
     def _write(self, command, data):
+        tx = self.tx
+        for i in range(0, 2 * self.num, 2):
+            tx[i] = command
+            tx[i + 1] = data
         self.cs(0)
-        for m in range(self.num):
-            self.spi.write(bytearray([command, data]))
+        self.spi.write(tx)
         self.cs(1)
+        self.bytes_sent += len(tx)
 
     def init(self):
         for command, data in (
@@ -69,18 +80,41 @@ class Matrix8x8:
             (_SHUTDOWN, 1),
         ):
             self._write(command, data)
+        self.shadow_valid = False  # digit registers hold power-up garbage
 
     def brightness(self, value):
         if not 0 <= value <= 15:
             raise ValueError("Brightness out of range")
         self._write(_INTENSITY, value)
 
-    def show(self):
+    def show(self, force=False):
+        # Only rows that changed since the last show() are sent; modules
+        # whose part of such a row is unchanged get a no-op instead
+        tx = self.tx
+        buffer = self.buffer
+        shadow = self.shadow
+        num = self.num
+        force = force or not self.shadow_valid
         for y in range(8):
-            self.cs(0)
-            for m in range(self.num):
-                self.spi.write(bytearray([_DIGIT0 + y, self.buffer[(y * self.num) + m]]))
-            self.cs(1)
+            # Payload order matches the old per-module writes: module 0 first
+            row = y * num
+            changed = False
+            for m in range(num):
+                value = buffer[row + m]
+                if force or value != shadow[row + m]:
+                    shadow[row + m] = value
+                    tx[2 * m] = _DIGIT0 + y
+                    tx[2 * m + 1] = value
+                    changed = True
+                else:
+                    tx[2 * m] = _NOOP
+                    tx[2 * m + 1] = 0
+            if changed:
+                self.cs(0)
+                self.spi.write(tx)
+                self.cs(1)
+                self.bytes_sent += len(tx)
+        self.shadow_valid = True
 
     def text_scroll(self, text, delay=0.1):
 
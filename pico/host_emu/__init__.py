@@ -0,0 +1,114 @@
+# host_emu - run our MicroPython programs on CPython.
+#
+#   import host_emu
+#   host_emu.install(seed=1)
+#   display = host_emu.board.attach_spi(host_emu.VirtualMax7219(cs=5, modules=4))
+#   host_emu.board.press(11, at_ms=500)
+#   host_emu.run_file("hw/task_3_wokwiAssignment/pico_game_with_brightness_adjusted.py", seconds=10)
+#
+# See README.md for the command line runner.
+import builtins
+import gc
+import importlib
+import os
+import random
+import runpy
+import sys
+import time as _host_time
+import tracemalloc
+
+from .board import board, EmulationDone, ticks_add, ticks_diff
+from .devices import VirtualMax7219, VirtualSSD1306, VirtualMPU6050
+
+SHIMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shims")
+_installed = False
+
+
+def install(seed=None, stdin=False, trace_allocs=True):
+    """Put the shim modules on sys.path and retarget time/gc at the board.
+
+    stdin=True replaces sys.stdin with a pipe that board.type() feeds.
+    """
+    global _installed
+    if seed is not None:
+        random.seed(seed)
+    if stdin:
+        from .board import VirtualStdin
+        board.stdin = VirtualStdin(board.clock)
+        sys.stdin = board.stdin
+    if _installed:
+        return
+    _installed = True
+    if SHIMS not in sys.path:
+        sys.path.insert(0, SHIMS)
+    builtins.const = lambda value: value  # a builtin on MicroPython
+
+    # `time` is a builtin module on CPython, so it cannot be shadowed;
+    # give it the MicroPython extras and a virtual sleep instead.
+    import utime
+    for name in ("ticks_ms", "ticks_us", "ticks_cpu", "sleep_ms", "sleep_us"):
+        setattr(_host_time, name, getattr(utime, name))
+    _host_time.ticks_add = ticks_add
+    _host_time.ticks_diff = ticks_diff
+    _host_time.sleep = utime.sleep
+
+    # gc.mem_alloc/mem_free report traced Python heap usage
+    if trace_allocs and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    gc.mem_alloc = lambda: tracemalloc.get_traced_memory()[0]
+    gc.mem_free = lambda: max(0, 264 * 1024 - gc.mem_alloc())
+
+
+DISPLAY_DRIVERS = ("max7219", "ssd1306")
+
+
+def count_shows(folder):
+    """Make show() of the display drivers in `folder` count board.shows.
+
+    Drivers that only send changed rows put nothing on the bus for an
+    unchanged frame, so refreshes are counted at the call instead.
+    """
+    for name in DISPLAY_DRIVERS:
+        if not os.path.exists(os.path.join(folder, name + ".py")):
+            continue
+        module = importlib.import_module(name)
+        for cls in vars(module).values():
+            if isinstance(cls, type) and "show" in vars(cls) and not hasattr(cls.show, "_counted"):
+                cls.show = _counted_show(cls.show)
+
+
+def _counted_show(show):
+    def counted(self, *args, **kwargs):
+        board.show_depth += 1  # a subclass show() calling its base counts once
+        try:
+            return show(self, *args, **kwargs)
+        finally:
+            board.show_depth -= 1
+            if not board.show_depth:
+                board.shows += 1
+    counted._counted = True
+    return counted
+
+
+def run_file(path, seconds=None, run_name="__main__"):
+    """Run a firmware file until it returns or `seconds` of virtual time pass.
+
+    Returns the module globals (as far as they got) and whether the
+    time limit stopped it.
+    """
+    path = os.path.abspath(path)
+    folder = os.path.dirname(path)
+    if folder not in sys.path:
+        sys.path.insert(0, folder)  # sibling drivers such as max7219.py
+    count_shows(folder)
+    if seconds is not None:
+        board.clock.limit_us = board.clock.now_us + int(seconds * 1_000_000)
+    stopped = False
+    try:
+        result = runpy.run_path(path, run_name=run_name)
+    except EmulationDone:
+        result = {}
+        stopped = True
+    finally:
+        board.clock.limit_us = None
+    return result, stopped
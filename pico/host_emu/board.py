@@ -0,0 +1,223 @@
+# Shared state of the emulated board: virtual clock, timers, pins, ADC
+# inputs, bus devices and traffic counters. The shim modules (machine,
+# utime, ...) all talk to the single `board` instance defined here.
+import os
+import heapq
+
+TICKS_PERIOD = 1 << 30  # MicroPython ticks_ms/ticks_us wrap period
+TICKS_HALF = TICKS_PERIOD >> 1
+IRQ_FALLING = 4  # rp2 Pin.IRQ_* values
+IRQ_RISING = 8
+SPI_CALL_US = 8  # rough cost of one spi.write() call on a 125 MHz Pico
+
+
+class EmulationDone(Exception):
+    """Raised from the clock once the run limit is reached."""
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now_us = 0
+        self.limit_us = None
+        self._events = []  # heap of (due_us, seq, callback)
+        self._seq = 0
+
+    def schedule(self, due_us, callback):
+        # Returns a handle that cancel() accepts
+        self._seq += 1
+        entry = [int(due_us), self._seq, callback]
+        heapq.heappush(self._events, entry)
+        return entry
+
+    def cancel(self, entry):
+        entry[2] = None
+
+    def next_due(self):
+        while self._events and self._events[0][2] is None:
+            heapq.heappop(self._events)
+        return self._events[0][0] if self._events else None
+
+    def advance(self, us):
+        self.advance_to(self.now_us + max(0, int(us)))
+
+    def advance_to(self, target_us):
+        # Fire every event due before target in time order, then land on target
+        while True:
+            due = self.next_due()
+            if due is None or due > target_us:
+                break
+            _, _, callback = heapq.heappop(self._events)
+            self.now_us = max(self.now_us, due)
+            self.check_limit()
+            callback()
+        self.now_us = max(self.now_us, target_us)
+        self.check_limit()
+
+    def check_limit(self):
+        if self.limit_us is not None and self.now_us >= self.limit_us:
+            raise EmulationDone()
+
+    # --- MicroPython ticks arithmetic ---
+    def ticks_ms(self):
+        return (self.now_us // 1000) & (TICKS_PERIOD - 1)
+
+    def ticks_us(self):
+        return self.now_us & (TICKS_PERIOD - 1)
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & (TICKS_PERIOD - 1)
+
+
+def ticks_diff(end, start):
+    return ((end - start + TICKS_HALF) & (TICKS_PERIOD - 1)) - TICKS_HALF
+
+
+class VirtualStdin:
+    # Pipe-backed stdin: select()/poll() see real readiness on the read end,
+    # while blocking reads advance the virtual clock until scripted input
+    # arrives instead of hanging the host.
+    def __init__(self, clock):
+        self.clock = clock
+        self._r, self._w = os.pipe()
+        os.set_blocking(self._r, False)
+        self._pending = ""
+
+    def fileno(self):
+        return self._r
+
+    def feed(self, text):
+        os.write(self._w, text.encode())
+
+    def _fill(self, n=4096):
+        # Take only what the caller asks for, so select()/poll() on the
+        # pipe still see the rest as pending
+        try:
+            data = os.read(self._r, n)
+        except BlockingIOError:
+            return False
+        self._pending += data.decode()
+        return bool(data)
+
+    def _wait(self):
+        # Nothing typed yet: let virtual time pass. The clock raises
+        # EmulationDone at the run limit; with no limit and nothing
+        # scheduled no input can ever arrive, so stop there too.
+        if self.clock.limit_us is None and self.clock.next_due() is None:
+            raise EmulationDone()
+        self.clock.advance(1000)
+
+    def read(self, n=-1):
+        while not self._pending and not self._fill(n if n > 0 else 4096):
+            self._wait()
+        if n < 0:
+            n = len(self._pending)
+        out, self._pending = self._pending[:n], self._pending[n:]
+        return out
+
+    def readline(self):
+        while "\n" not in self._pending:
+            if not self._fill(1):
+                self._wait()
+        i = self._pending.index("\n") + 1
+        out, self._pending = self._pending[:i], self._pending[i:]
+        return out
+
+
+class Board:
+    def __init__(self):
+        self.clock = VirtualClock()
+        self.levels = {}        # pin id -> 0/1
+        self.irqs = {}          # pin id -> (handler, trigger, pin object)
+        self.adc = {}           # pin id / channel -> u16 value
+        self.spi_devices = []   # devices receiving SPI bytes while their CS is low
+        self.i2c_devices = {}   # address -> device
+        self.pin_watchers = {}  # pin id -> [callback(level)]
+        self.pwm = {}           # pin id -> {"freq": .., "duty_u16": ..}
+        self.stdin = None
+        self.spi_bytes = 0
+        self.spi_calls = 0
+        self.spi_us = 0.0       # modelled time spent inside spi.write()
+        self.i2c_bytes = 0
+        self.shows = 0          # display driver show() calls (see host_emu.count_shows)
+        self.show_depth = 0
+        self.tick_cost_us = 1   # every ticks_*() read costs this much virtual time
+
+    def reset(self):
+        self.__init__()
+
+    # --- Pins ---
+    def level(self, pin_id):
+        return self.levels.get(pin_id, 0)
+
+    def drive(self, pin_id, level):
+        # Called by firmware output pins and by scripted inputs alike
+        level = 1 if level else 0
+        old = self.levels.get(pin_id)
+        self.levels[pin_id] = level
+        if old == level:
+            return
+        for callback in self.pin_watchers.get(pin_id, ()):
+            callback(level)
+        irq = self.irqs.get(pin_id)
+        if irq and old is not None:
+            handler, trigger, pin = irq
+            rising = level == 1
+            if (rising and trigger & IRQ_RISING) or (not rising and trigger & IRQ_FALLING):
+                handler(pin)
+
+    def watch_pin(self, pin_id, callback):
+        self.pin_watchers.setdefault(pin_id, []).append(callback)
+
+    # --- Scripted input ---
+    def at(self, ms, callback):
+        # Run callback at virtual time ms (from boot)
+        return self.clock.schedule(int(ms * 1000), callback)
+
+    def press(self, pin_id, at_ms, hold_ms=60, active_low=True):
+        # Press and release a button wired to pin_id
+        down, up = (0, 1) if active_low else (1, 0)
+        self.at(at_ms, lambda: self.drive(pin_id, down))
+        self.at(at_ms + hold_ms, lambda: self.drive(pin_id, up))
+
+    def set_adc(self, pin_id, value, at_ms=None):
+        if at_ms is None:
+            self.adc[pin_id] = value
+        else:
+            self.at(at_ms, lambda: self.adc.__setitem__(pin_id, value))
+
+    def type(self, text, at_ms=0):
+        # Queue characters on the emulated USB serial stdin
+        if self.stdin is None:
+            raise RuntimeError("call host_emu.install(stdin=True) first")
+        self.at(at_ms, lambda: self.stdin.feed(text))
+
+    # --- Buses ---
+    def attach_spi(self, device):
+        self.spi_devices.append(device)
+        return device
+
+    def attach_i2c(self, device):
+        self.i2c_devices[device.addr] = device
+        return device
+
+    def spi_write(self, data, baudrate=1_000_000):
+        # Each call costs a fixed overhead plus the time on the wire, and
+        # blocks the firmware for that long
+        cost = SPI_CALL_US + len(data) * 8 * 1_000_000 / baudrate
+        self.spi_bytes += len(data)
+        self.spi_calls += 1
+        self.spi_us += cost
+        self.clock.advance(cost)
+        for device in self.spi_devices:
+            if self.level(device.cs) == 0:
+                device.spi_write(data)
+
+    def i2c_device(self, addr):
+        device = self.i2c_devices.get(addr)
+        if device is None:
+            raise OSError(19, "ENODEV")  # what MicroPython raises on a NAK
+        return device
+
+
+board = Board()
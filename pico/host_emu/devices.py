@@ -0,0 +1,214 @@
+# Virtual peripherals that decode the bytes our drivers send.
+from .board import board
+
+# MAX7219 registers
+_NOOP = 0x0
+_DIGIT0 = 0x1
+_DIGIT7 = 0x8
+_DECODEMODE = 0x9
+_INTENSITY = 0xA
+_SCANLIMIT = 0xB
+_SHUTDOWN = 0xC
+_DISPLAYTEST = 0xF
+BURST_GAP_US = 200  # latches closer than this belong to the same show()
+
+
+class VirtualMax7219:
+    # A daisy chain of MAX7219s behind one CS pin. Bytes shift through the
+    # chain while CS is low; on the rising edge every module latches the
+    # 16 bits sitting in its shift register. Module 0 is nearest DIN.
+    def __init__(self, cs, modules):
+        self.cs = cs
+        self.modules = modules
+        self.shift = bytearray(2 * modules)
+        self.rows = [bytearray(8) for _ in range(modules)]
+        self.intensity = [0] * modules
+        self.shutdown = [True] * modules
+        self.writes = 0       # register writes latched (no-ops excluded)
+        self.frames = 0       # bursts of row latches, i.e. show() calls that sent rows
+        self.last_latch_us = None
+        # Time-averaged brightness: lit microseconds per pixel, accumulated
+        # whenever a row is replaced
+        self.lit_us = [[0] * 64 for _ in range(modules)]
+        self.row_since = [[0] * 8 for _ in range(modules)]
+        self.duty_start = 0
+        board.watch_pin(cs, self._on_cs)
+
+    def spi_write(self, data):
+        # Shift register: newest byte enters at the end nearest DIN
+        data = bytes(data)
+        n = len(self.shift)
+        if len(data) >= n:
+            self.shift[:] = data[-n:]
+        else:
+            self.shift[:] = self.shift[len(data):] + data
+
+    def _on_cs(self, level):
+        if level != 1:
+            return
+        n = len(self.shift)
+        wrote_row = False
+        for k in range(self.modules):
+            reg = self.shift[n - 2 - 2 * k] & 0x0F
+            data = self.shift[n - 1 - 2 * k]
+            if reg == _NOOP:
+                continue
+            self.writes += 1
+            if _DIGIT0 <= reg <= _DIGIT7:
+                self._account(k, reg - _DIGIT0)
+                self.rows[k][reg - _DIGIT0] = data
+                wrote_row = True
+            elif reg == _INTENSITY:
+                self.intensity[k] = data & 0x0F
+            elif reg == _SHUTDOWN:
+                self.shutdown[k] = not data & 1
+        if wrote_row:
+            # Row diffing skips unchanged rows, so no single register marks
+            # a frame; a gap on the virtual clock between latches does
+            now = board.clock.now_us
+            if self.last_latch_us is None or now - self.last_latch_us > BURST_GAP_US:
+                self.frames += 1
+            self.last_latch_us = now
+
+    def _account(self, module, y):
+        now = board.clock.now_us
+        dt = now - self.row_since[module][y]
+        self.row_since[module][y] = now
+        row = self.rows[module][y]
+        lit = self.lit_us[module]
+        for x in range(8):
+            if (row >> (7 - x)) & 1:
+                lit[y * 8 + x] += dt
+
+    def duty(self, module, x, y):
+        # Fraction of the time since duty_start the pixel was lit
+        for k in range(self.modules):
+            for row in range(8):
+                self._account(k, row)
+        span = board.clock.now_us - self.duty_start
+        return self.lit_us[module][y * 8 + x] / span if span else 0.0
+
+    def reset_duty(self):
+        for k in range(self.modules):
+            for row in range(8):
+                self._account(k, row)
+        self.lit_us = [[0] * 64 for _ in range(self.modules)]
+        self.duty_start = board.clock.now_us
+
+    def pixel(self, module, x, y):
+        # Column 0 is the MSB of the row byte, as in MONO_HLSB
+        return (self.rows[module][y] >> (7 - x)) & 1
+
+    def ascii_duty(self):
+        # Brightness as digits, 9 = lit the whole time, . = never lit
+        lines = []
+        for y in range(8):
+            line = []
+            for k in reversed(range(self.modules)):
+                cells = ""
+                for x in range(8):
+                    d = self.duty(k, x, y)
+                    cells += "." if d == 0 else str(min(9, round(d * 9)))
+                line.append(cells)
+            lines.append(" ".join(line))
+        return "\n".join(lines)
+
+    def ascii(self, on="#", off="."):
+        # Modules left to right from the far end of the chain back to DIN,
+        # which is the order the drivers write them in
+        lines = []
+        for y in range(8):
+            line = []
+            for k in reversed(range(self.modules)):
+                line.append("".join(on if self.pixel(k, x, y) else off for x in range(8)))
+            lines.append(" ".join(line))
+        return "\n".join(lines)
+
+
+class VirtualSSD1306:
+    # SSD1306 on I2C in horizontal addressing mode (what ssd1306.py uses).
+    def __init__(self, width=128, height=64, addr=0x3C):
+        self.addr = addr
+        self.width = width
+        self.pages = height // 8
+        self.ram = bytearray(width * self.pages)
+        self.col0, self.col1 = 0, width - 1
+        self.page0, self.page1 = 0, self.pages - 1
+        self.col, self.page = 0, 0
+        self.on = False
+        self.frames = 0
+        self._cmd_args = []  # pending command awaiting its parameters
+
+    _ARGC = {0x20: 1, 0x21: 2, 0x22: 2, 0x81: 1, 0x8D: 1, 0xA8: 1,
+             0xD3: 1, 0xD5: 1, 0xD9: 1, 0xDA: 1, 0xDB: 1}
+
+    def write(self, data):
+        # One I2C transaction: control byte then payload
+        data = bytes(data)
+        if not data:
+            return
+        if data[0] & 0x40:
+            self._data(data[1:])
+        else:
+            for b in data[1:]:
+                self._command(b)
+
+    def _command(self, b):
+        if self._cmd_args:
+            self._cmd_args.append(b)
+            cmd = self._cmd_args[0]
+            if len(self._cmd_args) - 1 < self._ARGC[cmd]:
+                return
+            args = self._cmd_args[1:]
+            self._cmd_args = []
+            if cmd == 0x21:
+                self.col0, self.col1 = args[0], args[1]
+                self.col = self.col0
+            elif cmd == 0x22:
+                self.page0, self.page1 = args[0], args[1]
+                self.page = self.page0
+            return
+        if b in self._ARGC:
+            self._cmd_args = [b]
+        elif b & 0xFE == 0xAE:
+            self.on = bool(b & 1)
+
+    def _data(self, payload):
+        for b in payload:
+            if 0 <= self.col < self.width and 0 <= self.page < self.pages:
+                self.ram[self.page * self.width + self.col] = b
+            self.col += 1
+            if self.col > self.col1:
+                self.col = self.col0
+                self.page += 1
+                if self.page > self.page1:
+                    self.page = self.page0
+                    self.frames += 1
+
+    def pixel(self, x, y):
+        return (self.ram[(y // 8) * self.width + x] >> (y % 8)) & 1
+
+
+class VirtualMPU6050:
+    # Register-file stand-in for the IMU: reads return stored bytes, so
+    # tests can poke accelerometer/gyro values into `regs`.
+    def __init__(self, addr=0x68):
+        self.addr = addr
+        self.regs = bytearray(128)
+        self.regs[0x75] = 0x68  # WHO_AM_I
+        self.pointer = 0
+
+    def write(self, data):
+        data = bytes(data)
+        if data:
+            self.pointer = data[0]
+            self.write_mem(data[0], data[1:])
+
+    def read(self, n):
+        return self.read_mem(self.pointer, n)
+
+    def write_mem(self, memaddr, data):
+        self.regs[memaddr:memaddr + len(data)] = data
+
+    def read_mem(self, memaddr, n):
+        return bytes(self.regs[memaddr:memaddr + n])
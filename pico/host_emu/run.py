@@ -0,0 +1,149 @@
+# Headless runner: execute a firmware file on the emulated board for a
+# fixed stretch of virtual time and report frame and bus statistics.
+#
+#   python pico/host_emu/run.py hw/task_3_wokwiAssignment/pico_game_with_brightness_adjusted.py \
+#       --max7219 5:4 --press 11@500 --adc 26=32768 --seconds 10 --show
+import argparse
+import gc
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import host_emu
+from host_emu import board, VirtualMax7219, VirtualSSD1306, VirtualMPU6050
+
+
+class CountingStdout(io.TextIOBase):
+    # Swallows firmware prints (state frames, debug) but counts the bytes.
+    # Output past the time limit raises EmulationDone as well, so firmware
+    # that catches everything around input() (bare except, print, retry)
+    # still stops: the exception leaves from inside its except block.
+    def __init__(self, echo=None):
+        self.bytes = 0
+        self.echo = echo
+        self.buffer = CountingBuffer(self)
+
+    def write(self, s):
+        board.clock.check_limit()
+        self.bytes += len(s.encode())
+        if self.echo:
+            self.echo.write(s)
+        return len(s)
+
+
+class CountingBuffer:
+    # sys.stdout.buffer: raw bytes (binary frames), counted but never echoed
+    def __init__(self, owner):
+        self.owner = owner
+
+    def write(self, b):
+        board.clock.check_limit()
+        self.owner.bytes += len(b)
+        return len(b)
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("script")
+    ap.add_argument("--seconds", type=float, default=10.0, help="virtual seconds to run")
+    ap.add_argument("--seed", type=int, default=461)
+    ap.add_argument("--max7219", action="append", default=[], metavar="CS:MODULES")
+    ap.add_argument("--ssd1306", action="append", default=[], metavar="ADDR")
+    ap.add_argument("--mpu6050", action="store_true")
+    ap.add_argument("--press", action="append", default=[], metavar="PIN@MS[:HOLD]")
+    ap.add_argument("--adc", action="append", default=[], metavar="PIN=VALUE[@MS]")
+    ap.add_argument("--type", action="append", default=[], metavar="TEXT@MS",
+                    help="feed USB serial stdin; \\n is a newline")
+    ap.add_argument("--show", action="store_true", help="print the final display contents")
+    ap.add_argument("--duty", type=float, metavar="MS",
+                    help="print time-averaged MAX7219 brightness over the last MS of the run")
+    ap.add_argument("--echo", action="store_true", help="pass firmware output through")
+    return ap.parse_args(argv)
+
+
+def setup(args):
+    # Always swap in the virtual stdin: a firmware input() with nothing
+    # typed then waits in virtual time and ends at --seconds instead of
+    # blocking on the terminal
+    host_emu.install(seed=args.seed, stdin=True)
+    displays = []
+    for spec in args.max7219:
+        cs, modules = spec.split(":")
+        displays.append(board.attach_spi(VirtualMax7219(int(cs), int(modules))))
+    for spec in args.ssd1306:
+        displays.append(board.attach_i2c(VirtualSSD1306(addr=int(spec, 0))))
+    if args.mpu6050:
+        board.attach_i2c(VirtualMPU6050())
+    for spec in args.press:
+        pin, rest = spec.split("@")
+        at, _, hold = rest.partition(":")
+        board.press(int(pin), float(at), float(hold or 60))
+    for spec in args.adc:
+        pin, rest = spec.split("=")
+        value, _, at = rest.partition("@")
+        board.set_adc(int(pin), int(value), float(at) if at else None)
+    if args.duty:
+        for d in displays:
+            if isinstance(d, VirtualMax7219):
+                board.at(args.seconds * 1000 - args.duty, d.reset_duty)
+    for spec in args.type:
+        text, _, at = spec.rpartition("@")
+        board.type(text.replace("\\n", "\n"), float(at))
+    return displays
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    displays = setup(args)
+    real_stdout = sys.stdout
+    sink = CountingStdout(real_stdout if args.echo else None)
+    gen0_before = gc.get_stats()[0]["collections"]
+    heap_before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    wall = time.perf_counter()
+    sys.stdout = sink
+    try:
+        _, stopped = host_emu.run_file(args.script, seconds=args.seconds)
+    finally:
+        sys.stdout = real_stdout
+    wall = time.perf_counter() - wall
+    virtual_s = board.clock.now_us / 1e6
+    # A frame is a display refresh: a driver show() call, whether or not row
+    # diffing left anything to send. Updates are the ones that sent rows.
+    updates = max([d.frames for d in displays] or [0])
+    frames = board.shows or updates
+    per = max(frames, 1)
+
+    print(f"script        {os.path.relpath(args.script)}")
+    print(f"stopped by    {'time limit' if stopped else 'script exit'}")
+    print(f"virtual time  {virtual_s:.2f} s   host time {wall:.2f} s")
+    print(f"frames        {frames}   ({frames / virtual_s if virtual_s else 0:.1f} fps virtual,"
+          f" {frames / wall if wall else 0:.0f} fps host)")
+    print(f"updates       {updates}   (refreshes that sent rows, {updates / virtual_s if virtual_s else 0:.1f} / s)")
+    print(f"spi bytes     {board.spi_bytes}   ({board.spi_bytes / per:.1f} / frame,"
+          f" {board.spi_bytes / virtual_s if virtual_s else 0:.0f} / s)")
+    print(f"spi writes    {board.spi_calls}   ({board.spi_calls / per:.1f} / frame,"
+          f" {board.spi_us / per:.0f} us / frame)")
+    print(f"i2c bytes     {board.i2c_bytes}   ({board.i2c_bytes / per:.1f} / frame)")
+    print(f"stdout bytes  {sink.bytes}   ({sink.bytes / per:.1f} / frame)")
+    heap, peak = tracemalloc.get_traced_memory()
+    print(f"heap          {heap - heap_before:+d} bytes at exit   (peak {peak - heap_before:+d}, traced by tracemalloc)")
+    gen0 = gc.get_stats()[0]["collections"] - gen0_before
+    print(f"gc runs       {gen0} gen0 collections   ({gen0 / per:.3f} / frame)")
+    if args.show:
+        for d in displays:
+            if isinstance(d, VirtualMax7219):
+                print()
+                print(d.ascii())
+    if args.duty:
+        for d in displays:
+            if isinstance(d, VirtualMax7219):
+                print()
+                print(d.ascii_duty())
+
+
+if __name__ == "__main__":
+    main()
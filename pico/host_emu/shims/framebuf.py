@@ -0,0 +1,152 @@
+# Pure-Python `framebuf` with the same buffer layouts as MicroPython, so
+# drivers that read or write the raw buffer behave identically.
+#
+# text() uses a placeholder 5x7 glyph derived from the character code,
+# not the device's 8x8 font: text occupies the right cells but the shapes
+# differ.
+MONO_VLSB = 0
+MONO_VERT = MONO_VLSB
+RGB565 = 1
+GS4_HMSB = 2
+MONO_HLSB = 3
+MONO_HMSB = 4
+GS2_HMSB = 5
+GS8 = 6
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format not in (MONO_VLSB, MONO_HLSB, MONO_HMSB, GS8):
+            raise ValueError("invalid format")
+        self.buf = buffer
+        self.width = width
+        self.height = height
+        self.format = format
+        self.stride = width if stride is None else stride
+
+    # --- raw access ---
+    def _get(self, x, y):
+        buf, fmt = self.buf, self.format
+        if fmt == MONO_VLSB:
+            return (buf[(y >> 3) * self.stride + x] >> (y & 7)) & 1
+        if fmt == GS8:
+            return buf[y * self.stride + x]
+        i = (y * self.stride + x) >> 3
+        if fmt == MONO_HLSB:
+            return (buf[i] >> (7 - (x & 7))) & 1
+        return (buf[i] >> (x & 7)) & 1
+
+    def _set(self, x, y, c):
+        buf, fmt = self.buf, self.format
+        if fmt == GS8:
+            buf[y * self.stride + x] = c & 0xFF
+            return
+        if fmt == MONO_VLSB:
+            i = (y >> 3) * self.stride + x
+            bit = 1 << (y & 7)
+        else:
+            i = (y * self.stride + x) >> 3
+            bit = 1 << (7 - (x & 7)) if fmt == MONO_HLSB else 1 << (x & 7)
+        if c:
+            buf[i] |= bit
+        else:
+            buf[i] &= ~bit & 0xFF
+
+    # --- primitives ---
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        if c is None:
+            return self._get(x, y)
+        self._set(x, y, c)
+
+    def fill(self, c):
+        if self.format == GS8:
+            v = c & 0xFF
+        else:
+            v = 0xFF if c else 0x00
+        for i in range(len(self.buf)):
+            self.buf[i] = v
+
+    def fill_rect(self, x, y, w, h, c):
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.width, x + w), min(self.height, y + h)
+        for yy in range(y0, y1):
+            for xx in range(x0, x1):
+                self._set(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx, dy = abs(x2 - x1), -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        err = dx + dy
+        while True:
+            self.pixel(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                return
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x1 += sx
+            if e2 <= dx:
+                err += dx
+                y1 += sy
+
+    def text(self, s, x, y, c=1):
+        for ch in s:
+            code = ord(ch)
+            if ch != " ":
+                for row in range(7):
+                    bits = ((code * 2654435761) >> (row * 4)) & 0x1F | 0x11
+                    for col in range(5):
+                        if bits & (0x10 >> col):
+                            self.pixel(x + 1 + col, y + row, c)
+            x += 8
+
+    def scroll(self, xstep, ystep):
+        # Like MicroPython, the uncovered strip keeps its old contents
+        w, h = self.width, self.height
+        xs = range(w - 1, -1, -1) if xstep > 0 else range(w)
+        ys = range(h - 1, -1, -1) if ystep > 0 else range(h)
+        for y in ys:
+            for x in xs:
+                sx, sy = x - xstep, y - ystep
+                if 0 <= sx < w and 0 <= sy < h:
+                    self._set(x, y, self._get(sx, sy))
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        if isinstance(fbuf, tuple):
+            fbuf = FrameBuffer(*fbuf)
+        for sy in range(fbuf.height):
+            ty = y + sy
+            if not 0 <= ty < self.height:
+                continue
+            for sx in range(fbuf.width):
+                tx = x + sx
+                if not 0 <= tx < self.width:
+                    continue
+                c = fbuf._get(sx, sy)
+                if c == key:
+                    continue
+                if palette is not None:
+                    c = palette._get(c, 0)
+                self._set(tx, ty, c)
+
+
+def FrameBuffer1(buffer, width, height, format=MONO_VLSB, stride=None):
+    return FrameBuffer(buffer, width, height, format, stride)
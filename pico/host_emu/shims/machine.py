@@ -0,0 +1,221 @@
+# Emulated `machine` module (rp2 flavour) backed by host_emu.board.
+from host_emu.board import board, IRQ_FALLING, IRQ_RISING
+
+
+def _pin_id(pin):
+    return pin.id if isinstance(pin, Pin) else pin
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = IRQ_FALLING
+    IRQ_RISING = IRQ_RISING
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = _pin_id(id)
+        self.mode = self.IN
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.mode = mode
+        if pull == self.PULL_UP and self.id not in board.levels:
+            board.levels[self.id] = 1  # idle-high button
+        if value is not None:
+            board.drive(self.id, value)
+        elif self.mode == self.OUT and self.id not in board.levels:
+            board.levels[self.id] = 0
+
+    def value(self, v=None):
+        if v is None:
+            return board.level(self.id)
+        board.drive(self.id, v)
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def on(self):
+        board.drive(self.id, 1)
+
+    def off(self):
+        board.drive(self.id, 0)
+
+    def high(self):
+        board.drive(self.id, 1)
+
+    def low(self):
+        board.drive(self.id, 0)
+
+    def toggle(self):
+        board.drive(self.id, 1 - board.level(self.id))
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        if handler is None:
+            board.irqs.pop(self.id, None)
+        else:
+            board.irqs[self.id] = (handler, trigger, self)
+
+    def __repr__(self):
+        return "Pin(%d)" % self.id
+
+
+class ADC:
+    CORE_TEMP = 4
+
+    def __init__(self, pin):
+        self.id = _pin_id(pin)
+
+    def read_u16(self):
+        return board.adc.get(self.id, 0) & 0xFFFF
+
+
+class PWM:
+    def __init__(self, pin, freq=None, duty_u16=None):
+        self.id = _pin_id(pin)
+        self.state = board.pwm.setdefault(self.id, {"freq": 0, "duty_u16": 0})
+        if freq is not None:
+            self.freq(freq)
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+
+    def freq(self, value=None):
+        if value is None:
+            return self.state["freq"]
+        self.state["freq"] = value
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self.state["duty_u16"]
+        self.state["duty_u16"] = value
+
+    def deinit(self):
+        self.state["duty_u16"] = 0
+
+
+class SPI:
+    MSB = 0
+    LSB = 1
+
+    def __init__(self, id=0, baudrate=1_000_000, *args, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+
+    def init(self, baudrate=None, *args, **kwargs):
+        if baudrate is not None:
+            self.baudrate = baudrate
+
+    def write(self, buf):
+        board.spi_write(buf, self.baudrate)
+
+    def deinit(self):
+        pass
+
+
+class I2C:
+    def __init__(self, id=0, scl=None, sda=None, freq=400_000):
+        self.id = id
+
+    def scan(self):
+        return sorted(board.i2c_devices)
+
+    def writeto(self, addr, buf, stop=True):
+        board.i2c_bytes += len(buf)
+        board.i2c_device(addr).write(buf)
+        return len(buf)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        board.i2c_bytes += nbytes
+        return board.i2c_device(addr).read(nbytes)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self.readfrom(addr, len(buf), stop)
+
+    def writevto(self, addr, vector, stop=True):
+        data = b"".join(bytes(b) for b in vector)
+        return self.writeto(addr, data, stop)
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        board.i2c_bytes += len(buf) + 1
+        board.i2c_device(addr).write_mem(memaddr, bytes(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        board.i2c_bytes += nbytes + 1
+        return board.i2c_device(addr).read_mem(memaddr, nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        buf[:] = self.readfrom_mem(addr, memaddr, len(buf), addrsize)
+
+
+SoftI2C = I2C
+SoftSPI = SPI
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self._entry = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, freq=-1, period=-1, tick_hz=1000, callback=None):
+        self.deinit()
+        if freq > 0:
+            self._period_us = 1_000_000 / freq
+        else:
+            self._period_us = period * 1_000_000 / tick_hz
+        self._period_us = max(1, int(self._period_us))
+        self._mode = mode
+        self._callback = callback
+        self._arm(board.clock.now_us + self._period_us)
+
+    def _arm(self, due):
+        self._entry = board.clock.schedule(due, lambda: self._fire(due))
+
+    def _fire(self, due):
+        if self._mode == self.PERIODIC:
+            self._arm(due + self._period_us)
+        else:
+            self._entry = None
+        if self._callback:
+            self._callback(self)
+
+    def deinit(self):
+        if self._entry is not None:
+            board.clock.cancel(self._entry)
+            self._entry = None
+
+
+def idle():
+    # Sleep until the next timer or scripted event is due
+    due = board.clock.next_due()
+    board.clock.advance_to(due if due is not None else board.clock.now_us + 1000)
+
+
+def lightsleep(ms=None):
+    board.clock.advance(1000 * (ms or 0))
+
+
+def freq(hz=None):
+    return 125_000_000
+
+
+def reset():
+    raise SystemExit("machine.reset()")
+
+
+def unique_id():
+    return b"\xe6\x61\x04\x61\x00\x00\x00\x01"
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
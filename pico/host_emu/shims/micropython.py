@@ -0,0 +1,29 @@
+# Emulated `micropython` module: compiler hints become no-ops.
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def schedule(func, arg):
+    func(arg)
+
+
+def mem_info(verbose=False):
+    pass
+
+
+def opt_level(level=None):
+    return 0
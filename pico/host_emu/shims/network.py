@@ -0,0 +1,43 @@
+# Emulated `network`: a radio that never associates, so firmware takes its
+# offline / USB fallback paths instead of hanging.
+STA_IF = 0
+AP_IF = 1
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._active = False
+
+    def active(self, state=None):
+        if state is None:
+            return self._active
+        self._active = bool(state)
+
+    def config(self, *args, **kwargs):
+        if args:
+            return None
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def isconnected(self):
+        return False
+
+    def status(self, param=None):
+        return STAT_NO_AP_FOUND
+
+    def ifconfig(self, config=None):
+        return ("0.0.0.0", "0.0.0.0", "0.0.0.0", "0.0.0.0")
+
+    def scan(self):
+        return []
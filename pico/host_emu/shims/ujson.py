@@ -0,0 +1,11 @@
+# Emulated `ujson`, using compact separators like MicroPython does.
+import json
+from json import loads, load
+
+
+def dumps(obj, separators=None):
+    return json.dumps(obj, separators=separators or (", ", ": "))
+
+
+def dump(obj, stream, separators=None):
+    stream.write(dumps(obj, separators))
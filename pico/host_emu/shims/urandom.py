@@ -0,0 +1,2 @@
+# Emulated `urandom`. Seed it (host_emu.install(seed=...)) for repeatable runs.
+from random import choice, getrandbits, randint, random, randrange, seed, uniform
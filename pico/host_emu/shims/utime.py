@@ -0,0 +1,42 @@
+# Emulated `utime` on the virtual clock. host_emu.install() also copies
+# these onto the host `time` module for code that does `import time`.
+from host_emu.board import board, ticks_add, ticks_diff
+
+
+def ticks_ms():
+    board.clock.advance(board.tick_cost_us)
+    return board.clock.ticks_ms()
+
+
+def ticks_us():
+    board.clock.advance(board.tick_cost_us)
+    return board.clock.ticks_us()
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def sleep(seconds):
+    board.clock.advance(seconds * 1_000_000)
+
+
+def sleep_ms(ms):
+    board.clock.advance(ms * 1000)
+
+
+def sleep_us(us):
+    board.clock.advance(us)
+
+
+def time():
+    return board.clock.now_us // 1_000_000
+
+
+def time_ns():
+    return board.clock.now_us * 1000
+
+
+def localtime(secs=None):
+    import time as _host_time
+    return _host_time.localtime(secs)[:8]